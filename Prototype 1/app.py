@@ -1,16 +1,19 @@
 # Import Libraries
-import numpy as np
 import pandas as pd
-import yfinance as yf
 import streamlit as st
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-from datetime import datetime
-from keras.models import load_model
-from sklearn.preprocessing import MinMaxScaler
-
-# Load model
-model = load_model('stock_data.keras')
+from batching import batched_model
+import debug_panel
+import instrument
+from charts import cached_figure, data_key, frame_key, plotly_line_chart
+from forecast_cache import default_cache, forecast_key
+from indicators import moving_averages
+from model_registry import model_path_for, preload, select_variant
+from pipeline import enough_history, predict_test_slice
+from price_store import load_prices
+import service_client
+import snapshots
+from symbols import STOCK_SYMBOLS
+from tables import PREDICTION_COLUMNS, STOCK_COLUMNS, paged_table, prediction_table
 
 
 # Set up Streamlit page configuration
@@ -21,6 +24,9 @@ st.set_page_config(
     initial_sidebar_state='expanded'
 )
 
+# Tracing and the debug panel are only switched on with ?debug=1
+profiler = debug_panel.start()
+
 # Add custom CSS for styling
 st.markdown("""
     <style>
@@ -152,7 +158,7 @@ st.markdown("""
 
 # Sidebar
 st.sidebar.header('Stock Price Prediction')
-stock_symbols = ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'FB', 'TSLA', 'BRK-A', 'BRK-B', 'NVDA', 'JPM', 'JNJ', 'V', 'WMT', 'PG', 'MA', 'DIS', 'HD', 'PYPL', 'VZ', 'ADBE', 'NFLX', 'PFE', 'CMCSA', 'PEP', 'INTC', 'KO', 'CSCO', 'T', 'MRK', 'ABT', 'CVX', 'XOM', 'NKE', 'LLY', 'MCD', 'MDT', 'TXN', 'AVGO', 'CRM', 'HON', 'UNH', 'TMO', 'AMGN', 'NEE', 'DHR', 'QCOM', 'LIN', 'ACN', 'SPGI', 'ORCL', 'WBA', 'IBM', 'ISRG', 'CAT', 'DE', 'LOW', 'NOW', 'LMT', 'PM', 'MMM', 'FISV', 'BLK', 'COST', 'UPS', 'RTX', 'MO', 'BKNG', 'CCI', 'USB', 'MS', 'BA', 'GS', 'PLD', 'SCHW', 'ZTS', 'CB', 'GILD', 'CL', 'PNC', 'BMY', 'MU', 'CCI', 'GPN', 'BDX', 'CI', 'APD', 'DUK', 'C', 'PSX', 'TGT', 'GE', 'SO', 'EXC', 'FDX', 'MET', 'COP']
+stock_symbols = STOCK_SYMBOLS
 stock = st.sidebar.selectbox('Select | Search Stock Symbol', stock_symbols)
 start = st.sidebar.text_input('Start Date', '2022-01-01')
 end = st.sidebar.text_input('End Date', '2024-01-01')
@@ -174,80 +180,54 @@ st.sidebar.markdown("""
 
 """, unsafe_allow_html=True)
 
-# Fetch stock data
-data = yf.download(stock, start, end)
-
-# Display stock data
+# Snapshot published by scheduler.py after the last close, when it covers this
+# symbol and date range: the page then only reads precomputed results
+view = snapshots.lookup(stock, start, end)
+cached = None
+
+if view is None and not service_client.SERVICE_URL:
+    # Model trained for this symbol (or its sector) by train.py, else the default one,
+    # or its fastest accurate variant under MODEL_LATENCY_BUDGET_MS (variants.py).
+    # Forecasts already in the cache for this symbol, date range and model version
+    # need no model; otherwise it loads in the background (TensorFlow for .keras
+    # models takes seconds), so the data table and moving-average charts below
+    # render while it initializes.
+    model_path = select_variant(model_path_for(stock))
+    forecast_id = forecast_key(stock, start, end, lookback=100, model_path=model_path)
+    cached = default_cache().get(forecast_id)
+    if cached is None:
+        preload(model_path)
+
+# Fetch stock data (served from the local store, only missing dates are downloaded)
+with instrument.span('load_prices', symbol=stock):
+    data = view.prices if view is not None else load_prices(stock, start, end)
+
+# Display stock data, one sorted page at a time (newest first)
 st.subheader('Stock Data (USD)')
-st.dataframe(data.style.set_table_styles([
-    {'selector': 'th:nth-child(5)', 'props': [('min-width', '200px')]},
-    {'selector': 'th:nth-child(6)', 'props': [('min-width', '200px')]},
-    {'selector': 'th:nth-child(2)', 'props': [('min-width', '200px')]},
-    {'selector': 'th:nth-child(4)', 'props': [('min-width', '200px')]}
-]),
-      height=500,
-    width=900        
-             )
-
-# Data preparation
-data_train = pd.DataFrame(data.Close[0: int(len(data) * 0.80)])
-data_test = pd.DataFrame(data.Close[int(len(data) * 0.80): len(data)])
-
-scaler = MinMaxScaler(feature_range=(0, 1))
-past_100_days = data_train.tail(100)
-data_test = pd.concat([past_100_days, data_test], ignore_index=True)
-data_test_scaled = scaler.fit_transform(data_test)
+paged_table(data, 'stock_data', STOCK_COLUMNS)
+
+# Calculate 50, 100 and 200-day moving averages of the downloaded prices in one pass
+if view is not None:
+    averages = view.averages
+elif service_client.SERVICE_URL:
+    averages = service_client.moving_averages(stock, start, end, (50, 100, 200))
+else:
+    averages = moving_averages(data["Close"], (50, 100, 200))
+ma_50_days, ma_100_days, ma_200_days = averages.values()
+
+# Figures are downsampled to the graph width, drawn with WebGL and cached per
+# symbol and date range, so reruns with the same selection skip rebuilding them
+chart_key = data_key(stock, start, end, data)
 
 #----------------------------------------------------------------------------------------------
 # Graph 1
 #----------------------------------------------------------------------------------------------
 
-# Convert input strings to datetime objects
-start_date = pd.to_datetime(start)
-end_date = pd.to_datetime(end)
-
-# Sample data (replace this with your actual stock data)
-date_range = pd.date_range(start=start_date, end=end_date, freq="B")
-data = pd.DataFrame({
-    "Close": np.random.uniform(100, 500, len(date_range))
-}, index=date_range)
-
-# Calculate 50-day moving average
-ma_50_days = data["Close"].rolling(50).mean()
-
 # Create the interactive Plotly figure
-fig = go.Figure()
-
-# Add 50-Day Moving Average line
-fig.add_trace(go.Scatter(
-    x=data.index, 
-    y=ma_50_days, 
-    mode='lines',
-    name='50-Day Moving Average',
-    line=dict(color='red', width=2)
-))
-
-# Add Closing Price line
-fig.add_trace(go.Scatter(
-    x=data.index, 
-    y=data["Close"], 
-    mode='lines',
-    name='Closing Price',
-    line=dict(color='green', width=2)
-))
-
-# Customize the layout
-fig.update_layout(
-    # title='Stock Price vs 50-Day Moving Average',
-    xaxis_title='Date',
-    yaxis_title='Price (USD)',
-    hovermode='x unified',  # Show values at the intersection of lines and grid
-    template='plotly_white',
-    width=1800,  # Width of the graph
-    height=700,  # Height of the graph
-    xaxis=dict(showgrid=True),  # Show grid on x-axis
-    yaxis=dict(showgrid=True),  # Show grid on y-axis
-)
+fig = cached_figure(chart_key + ('ma50',), lambda: plotly_line_chart([
+    ('50-Day Moving Average', ma_50_days, 'red'),
+    ('Closing Price', data["Close"], 'green'),
+]))
 
 # Display the plot in Streamlit
 st.markdown('<hr>', unsafe_allow_html=True)
@@ -258,51 +238,12 @@ st.plotly_chart(fig)
 # Graph 2
 #----------------------------------------------------------------------------------------
 
-# Calculate 100-day moving average
-ma_100_days = data["Close"].rolling(100).mean()
-
 # Create the interactive Plotly figure
-fig2 = go.Figure()
-
-# Add 50-Day Moving Average line
-fig2.add_trace(go.Scatter(
-    x=data.index,
-    y=ma_50_days,
-    mode='lines',
-    name='50-Day Moving Average',
-    line=dict(color='red', width=2)
-))
-
-# Add 100-Day Moving Average line
-fig2.add_trace(go.Scatter(
-    x=data.index,
-    y=ma_100_days,
-    mode='lines',
-    name='100-Day Moving Average',
-    line=dict(color='blue', width=2)
-))
-
-# Add Closing Price line
-fig2.add_trace(go.Scatter(
-    x=data.index,
-    y=data["Close"],
-    mode='lines',
-    name='Closing Price',
-    line=dict(color='green', width=2)
-))
-
-# Customize the layout
-fig2.update_layout(
-    # title='Stock Price vs 50-Day and 100-Day Moving Averages',
-    xaxis_title='Date',
-    yaxis_title='Price (USD)',
-    hovermode='x unified',  # Show values at the intersection of lines and grid
-    template='plotly_white',
-    width=1800,  # Width of the graph
-    height=700,  # Height of the graph
-    xaxis=dict(showgrid=True),  # Show grid on x-axis
-    yaxis=dict(showgrid=True),  # Show grid on y-axis
-)
+fig2 = cached_figure(chart_key + ('ma50-ma100',), lambda: plotly_line_chart([
+    ('50-Day Moving Average', ma_50_days, 'red'),
+    ('100-Day Moving Average', ma_100_days, 'blue'),
+    ('Closing Price', data["Close"], 'green'),
+]))
 
 # Display the plot in Streamlit
 st.markdown('<hr>', unsafe_allow_html=True)
@@ -313,108 +254,52 @@ st.plotly_chart(fig2)
 # Graph 3
 #----------------------------------------------------------------------------------------
 
-# Calculate 200-day moving average
-ma_200_days = data["Close"].rolling(200).mean()
-
 # Create the interactive Plotly figure
-fig3 = go.Figure()
-
-# Add 100-Day Moving Average line
-fig3.add_trace(go.Scatter(
-    x=data.index,
-    y=ma_100_days,
-    mode='lines',
-    name='100-Day Moving Average',
-    line=dict(color='red', width=2)
-))
-
-# Add 200-Day Moving Average line
-fig3.add_trace(go.Scatter(
-    x=data.index,
-    y=ma_200_days,
-    mode='lines',
-    name='200-Day Moving Average',
-    line=dict(color='blue', width=2)
-))
-
-# Add Closing Price line
-fig3.add_trace(go.Scatter(
-    x=data.index,
-    y=data["Close"],
-    mode='lines',
-    name='Closing Price',
-    line=dict(color='green', width=2)
-))
-
-# Customize the layout
-fig3.update_layout(
-    # title='Stock Price vs 100-Day and 200-Day Moving Averages',
-    xaxis_title='Date',
-    yaxis_title='Price (USD)',
-    hovermode='x unified',  # Show values at the intersection of lines and grid
-    template='plotly_white',
-    width=1800,  # Width of the graph
-    height=700,  # Height of the graph
-    xaxis=dict(showgrid=True),  # Show grid on x-axis
-    yaxis=dict(showgrid=True),  # Show grid on y-axis
-)
+fig3 = cached_figure(chart_key + ('ma100-ma200',), lambda: plotly_line_chart([
+    ('100-Day Moving Average', ma_100_days, 'red'),
+    ('200-Day Moving Average', ma_200_days, 'blue'),
+    ('Closing Price', data["Close"], 'green'),
+]))
 
 # Display the plot in Streamlit
 st.markdown('<hr>', unsafe_allow_html=True)
 st.subheader('Stock Price |vs| 100 Days Moving Average |vs| 200 Days Moving Average')
 st.plotly_chart(fig3)
 
-# Prepare data for prediction
-x, y = [], []
-for i in range(100, data_test_scaled.shape[0]):
-    x.append(data_test_scaled[i - 100:i])
-    y.append(data_test_scaled[i, 0])
-
-x, y = np.array(x), np.array(y)
-
-# Prediction
-predict = model.predict(x)
-scale = 1 / scaler.scale_
-predict = predict * scale
-y = y * scale
+# Same history check as service.py and batch_predict.py
+if not enough_history(data['Close'], lookback=100):
+    st.warning('Not enough price history for %s to predict.' % stock)
+    debug_panel.render(profiler)
+    st.stop()
+
+# Test-slice prediction, timed as one stage (cache lookup included)
+with instrument.span('forecast', symbol=stock):
+    if view is not None:
+        forecast = view.predictions
+    elif service_client.SERVICE_URL:
+        # Thin client: the prediction service (service.py) runs the model
+        forecast = service_client.predict(stock, start, end, lookback=100)
+    elif cached is not None:
+        forecast = cached
+    else:
+        # Prediction on the 20% test slice, stored in the forecast cache (looked up
+        # above). Concurrent sessions share one batched model call.
+        forecast = predict_test_slice(data.Close, model_path, lookback=100, symbol=stock,
+                                      model=batched_model(model_path))
+        default_cache().put(forecast_id, forecast)
+predict = forecast['Predicted Price'].to_numpy()
+y = forecast['Original Price'].to_numpy()
 
 #----------------------------------------------------------------------------------------
 # Graph 4
 #----------------------------------------------------------------------------------------
 
-# Create the interactive Plotly figure
-fig4 = go.Figure()
-
-# Add Predicted Price line
-fig4.add_trace(go.Scatter(
-    x=np.arange(len(predict)),  # Time indices
-    y=predict.flatten(),
-    mode='lines',
-    name='Predicted Price',
-    line=dict(color='red', width=2)
-))
-
-# Add Original Price line
-fig4.add_trace(go.Scatter(
-    x=np.arange(len(y)),  # Time indices
-    y=y.flatten(),
-    mode='lines',
-    name='Original Price',
-    line=dict(color='green', width=2)
-))
-
-# Customize the layout
-fig4.update_layout(
-    # title='Original Price vs Predicted Price',
-    xaxis_title='Time',
-    yaxis_title='Price (USD)',
-    hovermode='x unified',
-    template='plotly_white',
-    width=1800,  # Width of the graph
-    height=700,  # Height of the graph
-    xaxis=dict(showgrid=True),  # Show grid on x-axis
-    yaxis=dict(showgrid=True),  # Show grid on y-axis
-)
+# Create the interactive Plotly figure (x axis is the time index of the test slice),
+# keyed on the predictions too, so a retrained or reselected model redraws it
+fig4 = cached_figure(chart_key + ('prediction', frame_key(forecast)), lambda: plotly_line_chart([
+    ('Predicted Price', pd.Series(predict), 'red'),
+    ('Original Price', pd.Series(y), 'green'),
+], xaxis_title='Time'))
 
 # Display the plot in Streamlit
 st.markdown('<hr>', unsafe_allow_html=True)
@@ -424,41 +309,11 @@ st.plotly_chart(fig4)
 
 st.markdown('<hr>', unsafe_allow_html=True)
 
-# Example data (replace this with your actual stock data)
-date_range = pd.date_range(start=start, end=end, freq='B')  # 'B' for business days
-data = pd.DataFrame({
-    'Open': np.random.uniform(100, 500, len(date_range)),
-    'Close': np.random.uniform(100, 500, len(date_range))
-}, index=date_range)
-
-# Create a complete date range for business days
-full_dates = pd.date_range(start=start, end=end, freq='B')
-full_data = pd.DataFrame(index=full_dates, columns=['Original Price', 'Predicted Price'])
-
-# Fill the DataFrame
-full_data['Original Price'] = data['Open'].reindex(full_dates)
-full_data['Predicted Price'] = data['Close'].reindex(full_dates)
-full_data['Difference'] = abs(full_data['Original Price'] - full_data['Predicted Price'])
-
-# Remove rows with missing values
-full_data = full_data.dropna()
-
-# Calculate percentage change and add it as a new column
-full_data['↑   ↓   Change(%)'] = (
-    (full_data['Predicted Price'] - full_data['Original Price']) / full_data['Original Price'] * 100
-)
-
-# Display the final table
+# Model output per trading day, one sorted page at a time
 st.subheader('Original Price VS Predicted Price')
-st.dataframe(
-    full_data.style.set_table_styles([
-        {'selector': 'th:nth-child(1)', 'props': [('min-width', '150px')]},
-        {'selector': 'th:nth-child(2)', 'props': [('min-width', '150px')]},
-        {'selector': 'th:nth-child(3)', 'props': [('min-width', '150px')]},
-        {'selector': 'th:nth-child(4)', 'props': [('min-width', '200px')]}
-    ]),
-    height=500,  # Adjust table height
-    width=900   # Adjust table width
-)
+paged_table(prediction_table(forecast), 'predictions', PREDICTION_COLUMNS)
+
+st.markdown('<hr>', unsafe_allow_html=True)
 
-st.markdown('<hr>', unsafe_allow_html=True)
\ No newline at end of file
+# Hidden debug panel (?debug=1): stage timings, counters and profile of this run
+debug_panel.render(profiler)
\ No newline at end of file
@@ -0,0 +1,309 @@
+# Walk-forward backtest of a trained model
+#
+# Each symbol's history is cut into consecutive test folds of `test_days`
+# trading days. A fold is predicted one day ahead from the real closes before
+# each day, scaled with a scaler fitted only on the history before the fold
+# starts, so no fold sees its own data. All windows of all folds of a symbol
+# chunk go through the model in one batched predict, and every metric is
+# computed over the whole chunk at once with segment reductions:
+#
+#   MAE, RMSE, MAPE        of the predicted vs. actual close
+#   directional accuracy   predicted vs. actual sign of the change from the previous close
+#   strategy return        long when the model predicts a rise, else flat (or short),
+#                          less `cost_bps` per position change, vs. buy-and-hold
+#
+# The model itself is not retrained per fold, so a fold inside the model's
+# training range is scored in-sample. Folds therefore only start on or after
+# --test-from, by default TRAIN_END (the end of train.py's default range, which
+# the shipped model was trained on); set it to the training end of the model
+# under test, or to '' to score every fold, knowing the early ones are in-sample.
+#
+# Symbol chunks run in parallel processes. Each run is stored compactly under
+# backtests/<run id>/ (folds.parquet, predictions.parquet, run.json), keyed by
+# the model hash and settings, and load_runs() reads every run back for comparison.
+#
+#   python backtest.py --model stock_data.npz models/Technology.npz --start 2012-01-01 --test-from 2022-12-21
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from forecast_cache import model_hash
+from model_registry import SERVING_MODEL, get_model
+from price_store import default_store
+from scaling import MinMax
+from symbols import unique_symbols
+from windowing import sliding_windows
+
+BACKTEST_DIR = os.environ.get('BACKTEST_DIR', 'backtests')
+LOOKBACK = 100
+TRAIN_END = '2022-12-21'  # train.py --end default
+
+METRICS = ['mae', 'rmse', 'mape', 'directional_accuracy', 'strategy_return', 'buy_hold_return']
+
+
+def fold_starts(n, lookback=LOOKBACK, min_train=500, test_days=63, first_day=0):
+    """Start offsets of the test folds in a series of n closes, none before `first_day`."""
+    first = max(min_train, lookback + 1, first_day)
+    return np.arange(first, n - 1, test_days)
+
+
+def fold_windows(close, lookback=LOOKBACK, min_train=500, test_days=63, first_day=0):
+    """Scaled windows and targets for every test day of every fold of one series.
+
+    Returns (x, days, folds, scaler): x is (rows, lookback, 1) float32, days the
+    index of each target day in `close`, folds the fold number of each row and
+    scaler a MinMax holding each row's fold scaler.
+    """
+    close = np.asarray(close, dtype='float64')
+    starts = fold_starts(len(close), lookback, min_train, test_days, first_day)
+    if not len(starts):
+        return np.empty((0, lookback, 1), 'float32'), np.empty(0, 'int64'), np.empty(0, 'int64'), None
+    ends = np.minimum(starts + test_days, len(close))
+    counts = ends - starts
+    days = np.concatenate([np.arange(lo, hi) for lo, hi in zip(starts, ends)])
+    folds = np.repeat(np.arange(len(starts)), counts)
+
+    # Expanding training range: the scaler for a fold sees only closes before its start
+    running_min = np.minimum.accumulate(close)
+    running_max = np.maximum.accumulate(close)
+    scaler = MinMax(np.repeat(running_min[starts - 1], counts)[:, np.newaxis],
+                    np.repeat(running_max[starts - 1], counts)[:, np.newaxis])
+
+    # The window for day j is close[j - lookback:j]
+    x = sliding_windows(close, lookback)[days - lookback, :, 0]
+    x = scaler.transform(x, out=np.empty(x.shape, dtype='float32'))
+    return x[:, :, np.newaxis], days, folds, scaler
+
+
+def _segment_sum(values, offsets):
+    return np.add.reduceat(values, offsets) if len(values) else np.empty(0)
+
+
+def evaluate(actual, predicted, previous, segments, allow_short=False, cost_bps=0.0):
+    """Per-segment metrics for rows grouped in contiguous `segments` (start offsets)."""
+    counts = np.diff(np.append(segments, len(actual)))
+    error = predicted - actual
+    ape = np.abs(error) / np.where(actual != 0, np.abs(actual), np.nan)
+    hit = np.sign(predicted - previous) == np.sign(actual - previous)
+
+    returns = actual / previous - 1
+    position = np.where(predicted > previous, 1.0, -1.0 if allow_short else 0.0)
+    # Every segment starts flat, so entering its first position is a trade too
+    held = np.concatenate([[0.0], position[:-1]])
+    held[segments] = 0.0
+    strategy = position * returns - np.abs(position - held) * cost_bps / 1e4
+
+    return {
+        'days': counts,
+        'mae': _segment_sum(np.abs(error), segments) / counts,
+        'rmse': np.sqrt(_segment_sum(error ** 2, segments) / counts),
+        'mape': _segment_sum(np.nan_to_num(ape), segments) / counts * 100,
+        'directional_accuracy': _segment_sum(hit.astype('float64'), segments) / counts,
+        'strategy_return': np.expm1(_segment_sum(np.log1p(strategy), segments)),
+        'buy_hold_return': np.expm1(_segment_sum(np.log1p(returns), segments)),
+    }
+
+
+def _init_worker(threads):
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+
+def run_chunk(symbols, start, end, model_path=SERVING_MODEL, lookback=LOOKBACK, min_train=500,
+              test_days=63, allow_short=False, cost_bps=0.0, test_from=TRAIN_END, batch_size=4096):
+    """Backtest a chunk of symbols with one batched predict; returns (folds, predictions, skipped)."""
+    store = default_store()
+    parts, skipped = [], {}
+    for symbol in symbols:
+        try:
+            data = store.load(symbol, start, end)
+        except Exception as exc:
+            skipped[symbol] = str(exc)
+            continue
+        close = data['Close'].dropna() if 'Close' in data else pd.Series(dtype='float64')
+        first_day = int(close.index.searchsorted(pd.Timestamp(test_from))) if test_from else 0
+        x, days, folds, scaler = fold_windows(close.to_numpy(), lookback, min_train, test_days, first_day)
+        if not len(x):
+            skipped[symbol] = 'not enough history (%d rows)' % len(close)
+            continue
+        parts.append((symbol, close, x, days, folds, scaler))
+    if not parts:
+        return pd.DataFrame(), pd.DataFrame(), skipped
+
+    x_all = np.concatenate([part[2] for part in parts])
+    scaled = np.asarray(get_model(model_path).predict(x_all, batch_size=batch_size, verbose=0))[:, 0]
+    scaler = MinMax(np.concatenate([part[5].data_min[:, 0] for part in parts]),
+                    np.concatenate([part[5].data_max[:, 0] for part in parts]))
+    predicted = scaler.inverse(scaled.astype('float64'))
+
+    closes = [part[1].to_numpy(dtype='float64') for part in parts]
+    actual = np.concatenate([c[part[3]] for c, part in zip(closes, parts)])
+    previous = np.concatenate([c[part[3] - 1] for c, part in zip(closes, parts)])
+    rows = np.array([len(part[2]) for part in parts])
+    symbol_of_row = np.repeat([part[0] for part in parts], rows)
+    fold_of_row = np.concatenate([part[4] for part in parts])
+    dates = np.concatenate([part[1].index.to_numpy()[part[3]] for part in parts])
+
+    # A segment is one (symbol, fold); rows are already grouped that way
+    boundary = np.ones(len(actual), dtype=bool)
+    boundary[1:] = (symbol_of_row[1:] != symbol_of_row[:-1]) | (fold_of_row[1:] != fold_of_row[:-1])
+    segments = np.flatnonzero(boundary)
+    metrics = evaluate(actual, predicted, previous, segments, allow_short, cost_bps)
+
+    folds = pd.DataFrame({
+        'symbol': symbol_of_row[segments],
+        'fold': fold_of_row[segments].astype('int32'),
+        'test_start': dates[segments],
+        'test_end': dates[np.append(segments[1:], len(dates)) - 1],
+    })
+    for name, values in metrics.items():
+        folds[name] = values.astype('int32' if name == 'days' else 'float32')
+    predictions = pd.DataFrame({
+        'symbol': symbol_of_row, 'fold': fold_of_row.astype('int32'), 'date': dates,
+        'actual': actual.astype('float32'), 'predicted': predicted.astype('float32'),
+    })
+    return folds, predictions, skipped
+
+
+def backtest(symbols=None, start='2012-01-01', end='2024-01-01', model_path=SERVING_MODEL,
+             lookback=LOOKBACK, min_train=500, test_days=63, allow_short=False, cost_bps=0.0,
+             test_from=TRAIN_END, workers=None, chunk_size=8):
+    """Walk-forward backtest of one model over many symbols, in parallel symbol chunks.
+
+    Returns (folds, predictions, stats).
+    """
+    symbols = unique_symbols(symbols) if symbols else unique_symbols()
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    options = (model_path, lookback, min_train, test_days, allow_short, cost_bps, test_from)
+    started = time.perf_counter()
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(chunks)))
+    if workers == 1:
+        results = [run_chunk(chunk, start, end, *options) for chunk in chunks]
+    else:
+        # spawn, not fork: TensorFlow state must not be shared with the parent
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(max(1, cpus // workers),)) as pool:
+            futures = [pool.submit(run_chunk, chunk, start, end, *options) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    # Chunks whose symbols were all skipped return empty frames
+    folds = [r[0] for r in results if len(r[0])]
+    predictions = [r[1] for r in results if len(r[1])]
+    folds = pd.concat(folds, ignore_index=True) if folds else pd.DataFrame()
+    predictions = pd.concat(predictions, ignore_index=True) if predictions else pd.DataFrame()
+    skipped = {symbol: reason for r in results for symbol, reason in r[2].items()}
+    stats = {'symbols': int(folds['symbol'].nunique()) if len(folds) else 0,
+             'folds': len(folds), 'windows': len(predictions), 'workers': workers,
+             'seconds': time.perf_counter() - started, 'skipped': skipped}
+    return folds, predictions, stats
+
+
+def summarize(folds):
+    """Day-weighted metrics per run (or per symbol, if there is no run column)."""
+    if folds.empty:
+        return pd.DataFrame(columns=METRICS)
+    key = 'run' if 'run' in folds else 'symbol'
+    weighted = folds[['mae', 'mape', 'directional_accuracy']].mul(folds['days'], axis=0)
+    weighted['mse'] = folds['rmse'].astype('float64') ** 2 * folds['days']
+    weighted['log_strategy'] = np.log1p(folds['strategy_return'].astype('float64'))
+    weighted['log_buy_hold'] = np.log1p(folds['buy_hold_return'].astype('float64'))
+    weighted[key], weighted['days'] = folds[key], folds['days']
+    grouped = weighted.groupby(key, observed=True).sum()
+    days = grouped.pop('days')
+    summary = grouped[['mae', 'mape', 'directional_accuracy']].div(days, axis=0)
+    summary['rmse'] = np.sqrt(grouped['mse'] / days)
+    # Mean return per fold, so symbols with more folds do not compound further
+    counts = folds.groupby(key, observed=True).size()
+    summary['strategy_return'] = np.expm1(grouped['log_strategy'] / counts)
+    summary['buy_hold_return'] = np.expm1(grouped['log_buy_hold'] / counts)
+    summary['days'] = days
+    return summary[METRICS + ['days']]
+
+
+def run_id(model_path, settings):
+    digest = hashlib.sha256(json.dumps([model_hash(model_path), settings], sort_keys=True).encode())
+    return '%s-%s' % (os.path.splitext(os.path.basename(model_path))[0], digest.hexdigest()[:12])
+
+
+def save_run(folds, predictions, meta, root=BACKTEST_DIR):
+    """Write one run to <root>/<run id>/, replacing an older run with the same id."""
+    path = os.path.join(root, meta['run'])
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, frame in (('folds', folds), ('predictions', predictions)):
+        frame = frame.astype({'symbol': 'category'}) if len(frame) else frame
+        frame.to_parquet(os.path.join(tmp, name + '.parquet'), index=False, compression='zstd')
+    with open(os.path.join(tmp, 'run.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+
+def load_runs(root=BACKTEST_DIR, table='folds'):
+    """Every stored run's folds (or predictions) in one frame with a `run` column."""
+    frames = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        path = os.path.join(root, name, table + '.parquet')
+        if not name.endswith('.tmp') and os.path.exists(path):
+            frame = pd.read_parquet(path)
+            # A run whose symbols were all skipped has nothing to compare
+            if len(frame):
+                frames.append(frame.assign(run=name))
+    if not frames:
+        return pd.DataFrame()
+    runs = pd.concat(frames, ignore_index=True)
+    return runs.astype({'symbol': 'category', 'run': 'category'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of one or more models.')
+    parser.add_argument('--model', nargs='+', default=[SERVING_MODEL])
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--start', default='2012-01-01')
+    parser.add_argument('--end', default=str(pd.Timestamp.today().date()))
+    parser.add_argument('--min-train', type=int, default=500, help='trading days before the first fold')
+    parser.add_argument('--test-days', type=int, default=63, help='trading days per fold')
+    parser.add_argument('--test-from', default=TRAIN_END,
+                        help="first day a fold may start, the model's training end ('' for every fold)")
+    parser.add_argument('--short', action='store_true', help='go short when a fall is predicted')
+    parser.add_argument('--cost-bps', type=float, default=0.0, help='cost per position change')
+    parser.add_argument('--workers', type=int, help='defaults to one per CPU core')
+    parser.add_argument('--output', default=BACKTEST_DIR)
+    args = parser.parse_args(argv)
+
+    settings = {'symbols': args.symbols, 'start': args.start, 'end': args.end, 'lookback': LOOKBACK,
+                'min_train': args.min_train, 'test_days': args.test_days, 'test_from': args.test_from,
+                'short': args.short, 'cost_bps': args.cost_bps}
+    for model_path in args.model:
+        folds, predictions, stats = backtest(args.symbols, args.start, args.end, model_path, LOOKBACK,
+                                             args.min_train, args.test_days, args.short,
+                                             args.cost_bps, args.test_from, args.workers)
+        meta = dict(settings, run=run_id(model_path, settings), model=model_path,
+                    model_hash=model_hash(model_path), stats=stats,
+                    created_at=pd.Timestamp.now().isoformat(timespec='seconds'))
+        path = save_run(folds, predictions, meta, args.output)
+        print('%s: %d symbols, %d folds, %d windows in %.1fs (%d workers) -> %s'
+              % (model_path, stats['symbols'], stats['folds'], stats['windows'],
+                 stats['seconds'], stats['workers'], path))
+
+    summary = summarize(load_runs(args.output))
+    with pd.option_context('display.width', 200, 'display.float_format', '{:.4f}'.format):
+        print(summary)
+
+
+if __name__ == '__main__':
+    main()
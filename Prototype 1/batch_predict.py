@@ -0,0 +1,119 @@
+# Batch inference over the whole symbol universe
+#
+# Loads every symbol, builds its test windows, stacks them into one array and
+# runs a single batched model.predict, then writes one results table.
+#
+#   python batch_predict.py --start 2022-01-01 --end 2024-01-01 --output forecasts.parquet
+#   python batch_predict.py --throughput 5000   # fastest accurate variant (variants.py)
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_registry import SERVING_MODEL, THROUGHPUT_TARGET, get_model, select_variant
+from pipeline import enough_history, prepare
+from price_store import default_store
+from scaling import MinMax
+from symbols import unique_symbols
+
+LOOKBACK = 100
+
+
+def predict_universe(symbols=None, start='2022-01-01', end='2024-01-01',
+                     model_path=SERVING_MODEL, batch_size=4096, store=None):
+    """Predict the test slice of every symbol with one batched forward pass.
+
+    Returns (results, stats): results has one row per symbol and trading day
+    with the original and predicted closing price; stats holds timings,
+    throughput and the symbols that were skipped.
+    """
+    symbols = unique_symbols(symbols) if symbols else unique_symbols()
+    store = store or default_store()
+    started = time.perf_counter()
+
+    inputs, prepared, skipped = [], [], {}
+    for symbol in symbols:
+        try:
+            data = store.load(symbol, start, end)
+        except Exception as exc:
+            skipped[symbol] = str(exc)
+            continue
+        if 'Close' not in data or not enough_history(data['Close'], LOOKBACK):
+            skipped[symbol] = 'not enough history (%d rows)' % len(data)
+            continue
+        x, y, scaler, dates = prepare(data['Close'], lookback=LOOKBACK,
+                                      symbol=symbol, model_path=model_path)
+        inputs.append(x)
+        prepared.append((symbol, y, scaler, dates))
+    loaded = time.perf_counter()
+
+    results = pd.DataFrame(columns=['Symbol', 'Date', 'Original Price', 'Predicted Price'])
+    if inputs:
+        model = get_model(model_path)
+        x_all = np.concatenate(inputs).astype('float32', copy=False)
+        predicted = model.predict(x_all, batch_size=batch_size, verbose=0)[:, 0].astype('float64')
+
+        # De-scale the whole batch in place with each window's own symbol scaler
+        counts = [len(y) for _, y, _, _ in prepared]
+        scaler = MinMax.stack([s for _, _, s, _ in prepared], counts)
+        original = np.concatenate([y for _, y, _, _ in prepared]).astype('float64')
+        scaler.inverse(predicted, out=predicted)
+        scaler.inverse(original, out=original)
+        results = pd.DataFrame({
+            'Symbol': np.repeat([symbol for symbol, _, _, _ in prepared], counts),
+            'Date': np.concatenate([dates[:n] for (_, _, _, dates), n in zip(prepared, counts)]),
+            'Original Price': original,
+            'Predicted Price': predicted,
+        })
+    finished = time.perf_counter()
+    stats = {
+        'symbols': len(prepared),
+        'windows': int(sum(len(x) for x in inputs)),
+        'load_seconds': loaded - started,
+        'predict_seconds': finished - loaded,
+        'total_seconds': finished - started,
+        'symbols_per_second': len(prepared) / max(finished - started, 1e-9),
+        'skipped': skipped,
+    }
+    return results, stats
+
+
+def write_results(results, path):
+    if path.endswith('.csv'):
+        results.to_csv(path, index=False)
+    else:
+        results.to_parquet(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Predict every stock symbol in one batch.')
+    parser.add_argument('--start', default='2022-01-01')
+    parser.add_argument('--end', default='2024-01-01')
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--batch-size', type=int, default=4096)
+    parser.add_argument('--throughput', type=float, default=THROUGHPUT_TARGET,
+                        help='windows per second the model variant must reach')
+    parser.add_argument('--latency-ms', type=float,
+                        help='latency budget per --batch-size batch for the model variant')
+    parser.add_argument('--output', default='forecasts.parquet', help='.parquet or .csv')
+    args = parser.parse_args(argv)
+
+    model_path = select_variant(args.model, args.latency_ms, args.throughput, batch=args.batch_size)
+    if model_path != args.model:
+        print('using variant %s' % model_path)
+    results, stats = predict_universe(args.symbols, args.start, args.end,
+                                      model_path, args.batch_size)
+    write_results(results, args.output)
+
+    print('%d symbols, %d windows -> %s' % (stats['symbols'], stats['windows'], args.output))
+    print('load %.2fs | predict %.2fs | total %.2fs | %.1f symbols/s'
+          % (stats['load_seconds'], stats['predict_seconds'],
+             stats['total_seconds'], stats['symbols_per_second']))
+    for symbol, reason in stats['skipped'].items():
+        print('skipped %s: %s' % (symbol, reason))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Benchmark: cold-start import time of the Streamlit pages
+#
+#   python bench_imports.py [pages ...] [--top 15] [--budget-ms 2500] [--json out.json]
+#
+# Runs the top-level imports of each page (app.py by default) in a fresh
+# interpreter under `python -X importtime`, without executing the page, and
+# reports the total and the heaviest modules. Exits with status 1 if a page
+# takes longer than --budget-ms or pulls in a module that must stay lazy
+# (TensorFlow, Keras, scikit-learn, SciPy, matplotlib, Plotly, yfinance) and
+# that Streamlit itself does not already import, so it can guard against
+# cold-start regressions in CI.
+import argparse
+import ast
+import json
+import subprocess
+import sys
+
+# Loaded only on the code paths that need them
+LAZY = ['tensorflow', 'keras', 'sklearn', 'scipy', 'matplotlib', 'plotly', 'yfinance']
+
+
+def page_imports(path):
+    """Source of the top-level import statements of a page."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return '\n'.join(ast.unparse(node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_times(code):
+    """[(module, self_us, cumulative_us)] for everything `code` imports, in import order.
+
+    Nested imports keep their indentation (two spaces per level).
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name[1:].rstrip(), int(own), int(cumulative)))
+    return rows
+
+
+def report(path, top=15, budget_ms=2500, framework=()):
+    rows = import_times(page_imports(path))
+    # Top-level modules are the ones printed without indentation
+    total_ms = sum(cumulative for name, _, cumulative in rows if not name.startswith(' ')) / 1e3
+    loaded = {name.strip() for name, _, _ in rows}
+    eager = sorted(lazy for lazy in LAZY if lazy in loaded and lazy not in framework)
+    heaviest = sorted(((name.strip(), cumulative / 1e3) for name, _, cumulative in rows),
+                      key=lambda item: -item[1])[:top]
+    return {'page': path, 'total_ms': total_ms, 'modules': len(rows), 'eager_lazy_modules': eager,
+            'heaviest_ms': heaviest, 'ok': total_ms <= budget_ms and not eager}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import-time report and cold-start guard for the pages.')
+    parser.add_argument('pages', nargs='*', default=['app.py'])
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=2500)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+
+    framework = {name.strip() for name, _, _ in import_times('import streamlit')}
+    results = []
+    for page in args.pages:
+        result = report(page, args.top, args.budget_ms, framework)
+        results.append(result)
+        print('%s | %.0f ms for %d modules | budget %.0f ms | %s'
+              % (page, result['total_ms'], result['modules'], args.budget_ms,
+                 'OK' if result['ok'] else 'FAIL'))
+        if result['eager_lazy_modules']:
+            print('  imported eagerly but should be lazy: %s' % ', '.join(result['eager_lazy_modules']))
+        for name, ms in result['heaviest_ms']:
+            print('  %8.1f ms  %s' % (ms, name))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Benchmark: Keras/TensorFlow vs. the NumPy runtime for serving
+#
+#   python bench_runtime.py [batch sizes ...]
+#
+# Each engine runs in a fresh interpreter so import time and resident memory
+# are measured from a cold start.
+import json
+import subprocess
+import sys
+
+ENGINES = {
+    'keras': ('from keras.models import load_model', "load_model('stock_data.keras')"),
+    'numpy': ('from numpy_runtime import NumpyModel', "NumpyModel('stock_data.npz')"),
+}
+
+WORKER = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+{import_line}
+imported = time.perf_counter()
+import numpy as np
+model = {load_expr}
+loaded = time.perf_counter()
+result = {{'import_s': imported - started, 'load_s': loaded - imported, 'latency_ms': {{}}}}
+for batch in {batches}:
+    x = np.random.default_rng(0).uniform(0, 1, (batch, 100, 1)).astype('float32')
+    model.predict(x, verbose=0)
+    runs = []
+    for _ in range(5):
+        t = time.perf_counter()
+        model.predict(x, verbose=0)
+        runs.append(time.perf_counter() - t)
+    result['latency_ms'][batch] = 1e3 * sorted(runs)[len(runs) // 2]
+result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+'''
+
+
+def run(engine, batches):
+    import_line, load_expr = ENGINES[engine]
+    code = WORKER.format(import_line=import_line, load_expr=load_expr, batches=batches)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    batches = [int(arg) for arg in sys.argv[1:]] or [1, 32, 512]
+    for engine in ENGINES:
+        result = run(engine, batches)
+        latency = ' '.join('b%s=%.1fms' % item for item in result['latency_ms'].items())
+        print('%-5s | import %6.2fs | load %5.2fs | max RSS %6.0f MB | %s'
+              % (engine, result['import_s'], result['load_s'], result['max_rss_mb'], latency))
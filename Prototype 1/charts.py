@@ -0,0 +1,178 @@
+# Chart rendering for long price histories
+#
+# Series are downsampled to about one point per horizontal pixel before they
+# are handed to Plotly (as WebGL Scattergl traces) or matplotlib, and built
+# figures are cached per symbol, date range and chart so reruns reuse them.
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+# Plotly figures in Prototype 1 are 1800 px wide; matplotlib figures are
+# 30 in at 100 dpi
+PLOTLY_WIDTH = 1800
+PLOTLY_HEIGHT = 700
+MATPLOTLIB_FIGSIZE = (30, 15)
+MATPLOTLIB_DPI = 100
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every) + 1).astype(int)
+    edges[-1] = n - 1
+
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y, n_buckets):
+    """Indices of the min and max of each of `n_buckets` equal buckets, in order."""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((np.asarray(y), bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+def downsample(series, max_points, method='minmax'):
+    """Downsample a Series to at most about `max_points` points, dropping NaNs.
+
+    Min/max bucketing (the default) is fully vectorized and keeps every peak;
+    method="lttb" follows the shape more closely but loops once per bucket.
+    """
+    series = pd.Series(series).dropna()
+    if len(series) <= max_points:
+        return series
+    if method == 'minmax':
+        idx = minmax_indices(series.to_numpy(), max_points // 2)
+    else:
+        x = series.index
+        x = x.asi8 if isinstance(x, pd.DatetimeIndex) else np.asarray(x, dtype='float64')
+        idx = lttb_indices(x, series.to_numpy(), max_points)
+    return series.iloc[idx]
+
+
+@instrument.traced('figure.plotly')
+def plotly_line_chart(traces, width=PLOTLY_WIDTH, height=PLOTLY_HEIGHT,
+                      xaxis_title='Date', yaxis_title='Price (USD)', method='minmax'):
+    """Plotly figure of (name, series, color) line traces, downsampled to `width`."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for name, series, color in traces:
+        series = downsample(series, width, method)
+        fig.add_trace(go.Scattergl(
+            x=series.index,
+            y=series.to_numpy(),
+            mode='lines',
+            name=name,
+            line=dict(color=color, width=2)
+        ))
+    fig.update_layout(
+        xaxis_title=xaxis_title,
+        yaxis_title=yaxis_title,
+        hovermode='x unified',
+        template='plotly_white',
+        width=width,
+        height=height,
+        xaxis=dict(showgrid=True),
+        yaxis=dict(showgrid=True),
+    )
+    return fig
+
+
+@instrument.traced('figure.matplotlib')
+def matplotlib_line_chart(traces, title, xlabel='Date', ylabel='Price (USD)',
+                          figsize=MATPLOTLIB_FIGSIZE, dpi=MATPLOTLIB_DPI, method='minmax'):
+    """PNG bytes of (name, series, color) line traces, downsampled to the pixel width."""
+    from matplotlib.figure import Figure
+
+    # A bare Figure avoids pyplot's global figure list, which leaks across reruns
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
+    for name, series, color in traces:
+        series = downsample(series, int(figsize[0] * dpi), method)
+        ax.plot(series.index, series.to_numpy(), color, label=name)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True)
+    ax.legend()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class FigureCache:
+    """Small LRU of built figures (or PNG bytes) shared by all sessions."""
+
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+        figure = build()
+        with self._lock:
+            self.misses += 1
+            self._items[key] = figure
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return figure
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'items': len(self._items)}
+
+
+_figures = FigureCache()
+
+
+def cached_figure(key, build):
+    return _figures.get_or_build(key, build)
+
+
+def figure_cache_stats():
+    return _figures.stats()
+
+
+def data_key(symbol, start, end, data):
+    # The date range alone is not enough: the last bar of an open range changes
+    last = data.index[-1] if len(data) else None
+    return symbol, str(start), str(end), len(data), str(last)
+
+
+def frame_key(frame):
+    """Content hash of a frame, for figures of model output (which changes with the model)."""
+    return hashlib.sha1(pd.util.hash_pandas_object(frame).to_numpy().tobytes()).hexdigest()
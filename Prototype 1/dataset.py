@@ -0,0 +1,58 @@
+# tf.data input pipeline for training
+#
+# All scaled series are stored once, back to back, in one float32 buffer. The
+# dataset only shuffles and batches window start offsets; each batch gathers
+# its windows from the buffer in a parallel map and is prefetched while the
+# previous one trains. Memory stays at about one copy of the prices instead
+# of `lookback` copies, however many symbols and years are used.
+import numpy as np
+
+
+class WindowSource:
+    """Flat buffer of several series plus the valid window start offsets."""
+
+    def __init__(self, series_list, lookback=100, horizon=1):
+        self.lookback = lookback
+        self.horizon = horizon
+        chunks, starts, offset = [], [], 0
+        for values in series_list:
+            values = np.asarray(values, dtype='float32').reshape(-1)
+            n = len(values) - lookback - horizon + 1
+            if n > 0:
+                # Windows never cross from one series into the next
+                starts.append(offset + np.arange(n, dtype='int64'))
+            chunks.append(values)
+            offset += len(values)
+        self.buffer = np.concatenate(chunks) if chunks else np.empty(0, dtype='float32')
+        self.starts = np.concatenate(starts) if starts else np.empty(0, dtype='int64')
+
+    def __len__(self):
+        return len(self.starts)
+
+    def gather(self, starts):
+        """NumPy version of the batch map, for use without TensorFlow."""
+        x = self.buffer[starts[:, np.newaxis] + np.arange(self.lookback)]
+        y = self.buffer[starts + self.lookback + self.horizon - 1]
+        return x[:, :, np.newaxis], y
+
+
+def window_dataset(series_list, lookback=100, horizon=1, batch_size=32, shuffle=True, seed=None):
+    """tf.data.Dataset of (x, y) batches, x shaped (batch, lookback, 1)."""
+    import tensorflow as tf
+
+    source = WindowSource(series_list, lookback, horizon)
+    buffer = tf.constant(source.buffer)
+    offsets = tf.range(lookback, dtype=tf.int64)
+
+    def gather(starts):
+        x = tf.gather(buffer, starts[:, tf.newaxis] + offsets)
+        y = tf.gather(buffer, starts + lookback + horizon - 1)
+        return x[:, :, tf.newaxis], y
+
+    ds = tf.data.Dataset.from_tensor_slices(source.starts)
+    if shuffle:
+        # Shuffling int64 offsets is cheap, so the whole epoch can be shuffled
+        ds = ds.shuffle(max(len(source), 1), seed=seed, reshuffle_each_iteration=True)
+    return (ds.batch(batch_size)
+              .map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+              .prefetch(tf.data.AUTOTUNE))
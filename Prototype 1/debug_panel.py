@@ -0,0 +1,63 @@
+# Hidden debug panel for the Streamlit pages
+#
+# Open a page with ?debug=1 (or set APP_DEBUG=1) to turn on tracing for that
+# run only (other sessions are not traced) and get a "Debug" expander at the bottom of the sidebar. It shows the spans of the
+# current run, per-stage aggregates for the whole server process, cache and
+# batcher counters, and, when the profiler box was ticked on the previous run,
+# the functions the sampling profiler saw most.
+import os
+
+import pandas as pd
+import streamlit as st
+
+import instrument
+from batching import metrics as batcher_metrics
+from charts import figure_cache_stats
+from forecast_cache import default_cache
+
+DEBUG = os.environ.get('APP_DEBUG', '') not in ('', '0')
+
+
+def requested():
+    return DEBUG or st.query_params.get('debug') == '1'
+
+
+def start():
+    """Call at the top of a page; returns the running profiler, if any."""
+    # Script threads may be reused across runs, so always set the scope
+    instrument.enable_here(requested())
+    if not requested():
+        return None
+    instrument.register('forecast_cache', lambda: default_cache().stats())
+    instrument.register('figure_cache', figure_cache_stats)
+    instrument.register('batchers', batcher_metrics)
+    instrument.begin_trace()
+    if st.session_state.get('debug_profile'):
+        return instrument.SamplingProfiler().start()
+    return None
+
+
+def render(profiler=None):
+    """Call at the end of a page to stop the profiler and draw the panel."""
+    if not requested():
+        return
+    instrument.enable_here(False)
+    if profiler is not None:
+        profiler.stop()
+    snapshot = instrument.snapshot()
+    with st.sidebar.expander('Debug'):
+        st.checkbox('Sampling profiler on the next run', key='debug_profile')
+        trace = instrument.current_trace()
+        if trace:
+            st.caption('This run: %.0f ms in %d spans' % (sum(event['ms'] for event in trace), len(trace)))
+            st.dataframe(pd.DataFrame(trace))
+        if snapshot['spans']:
+            st.caption('All traced runs of this server process')
+            st.dataframe(pd.DataFrame(snapshot['spans']).T.sort_values('total_s', ascending=False))
+        st.caption('Counters')
+        st.json({key: snapshot[key] for key in ('counters', 'observations', 'collectors')}, expanded=False)
+        if profiler is not None:
+            st.caption('Profile: %d samples' % profiler.samples)
+            st.dataframe(pd.DataFrame(profiler.stats(), columns=['function', 'self', 'total']))
+            st.download_button('Collapsed stacks', profiler.collapsed(), 'profile.txt')
+        st.download_button('Prometheus metrics', instrument.prometheus_text(), 'metrics.prom')
@@ -0,0 +1,338 @@
+# Concurrent price downloads
+#
+# AsyncFetcher downloads daily bars for many symbols at once on an asyncio
+# loop: at most `concurrency` requests in flight, a token bucket capping the
+# request rate, jittered exponential backoff on transient failures, and one
+# shared download for duplicate requests that are already in flight. HTTP goes
+# through a keep-alive connection pool, so a refresh of the whole symbol list
+# reuses a handful of connections instead of opening one per request.
+#
+# Where the bars come from is a pluggable backend, any object with a blocking
+# fetch(symbol, start, end, pool) method returning a normalized frame:
+#   YahooBackend()                   Yahoo chart API (default)
+#   YahooBackend('http://127.0.0.1:8000/')   a local stand-in serving the same JSON
+#   FileBackend('fixtures/')         <SYMBOL>.parquet / .csv files
+#   ProviderBackend(func)            any price_store provider function
+#
+#   python fetcher.py --symbols AAPL MSFT --start 2012-01-01 --end 2024-01-01
+#   FETCH_BACKEND=file:/tmp/fixture python fetcher.py
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+import pandas as pd
+
+from price_store import normalize
+
+BACKEND = os.environ.get('FETCH_BACKEND', 'yahoo')
+CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 8))
+RATE = float(os.environ.get('FETCH_RATE', 4))  # requests per second, 0 for no limit
+RETRIES = int(os.environ.get('FETCH_RETRIES', 4))
+TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', 30))
+
+YAHOO_CHART_URL = 'https://query2.finance.yahoo.com/v8/finance/chart/'
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+class FetchError(Exception):
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+def _retryable(exc):
+    if isinstance(exc, FetchError):
+        return exc.retryable
+    # Timeouts, resets and stale keep-alive connections
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by all worker threads, per host."""
+
+    def __init__(self, max_idle=CONCURRENCY, timeout=TIMEOUT):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.opened = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _get(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+            self.opened += 1
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(netloc, timeout=self.timeout)
+
+    def _put(self, scheme, netloc, conn):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def get(self, url, headers=None):
+        """GET `url`, returning (status, body bytes)."""
+        parts = urlsplit(url)
+        conn = self._get(parts.scheme, parts.netloc)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        try:
+            conn.request('GET', path, headers=headers or {})
+            response = conn.getresponse()
+            body = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._put(parts.scheme, parts.netloc, conn)
+        return response.status, body
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def _empty():
+    return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype='float64')
+
+
+class YahooBackend:
+    """Bars from the Yahoo chart API, or any server speaking its JSON.
+
+    Daily by default; intraday intervals ('1m', '5m', ...) keep the bar times
+    in exchange time, with a 'Datetime' index.
+    """
+
+    def __init__(self, base_url=YAHOO_CHART_URL, interval='1d'):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.interval = interval
+
+    def fetch(self, symbol, start, end, pool):
+        query = urlencode({'period1': int(pd.Timestamp(start).timestamp()),
+                           'period2': int(pd.Timestamp(end).timestamp()),
+                           'interval': self.interval, 'events': 'div,splits', 'includeAdjustedClose': 'true'})
+        status, body = pool.get(self.base_url + symbol.upper() + '?' + query,
+                                headers={'User-Agent': 'Mozilla/5.0', 'Accept': 'application/json'})
+        if status == 429 or status >= 500:
+            raise FetchError('%s: HTTP %d' % (symbol, status), status, retryable=True)
+        try:
+            chart = json.loads(body)['chart']
+        except (ValueError, KeyError):
+            raise FetchError('%s: HTTP %d, unexpected response' % (symbol, status), status)
+        if status != 200 or chart.get('error'):
+            error = chart.get('error') or {}
+            raise FetchError('%s: %s' % (symbol, error.get('description') or 'HTTP %d' % status), status)
+        return self.parse(chart['result'][0], self.interval)
+
+    @staticmethod
+    def parse(result, interval='1d'):
+        timestamps = result.get('timestamp')
+        if not timestamps:
+            return _empty()
+        quote = result['indicators']['quote'][0]
+        adjclose = result['indicators'].get('adjclose', [{}])[0].get('adjclose', quote['close'])
+        # Bars are stamped at the session open; shift to exchange time for the trading day
+        offset = result.get('meta', {}).get('gmtoffset', 0)
+        index = pd.to_datetime(pd.Series(timestamps) + offset, unit='s')
+        intraday = interval[-1] in 'mh'
+        if not intraday:
+            index = index.dt.normalize()
+        data = pd.DataFrame({'Open': quote['open'], 'High': quote['high'], 'Low': quote['low'],
+                             'Close': quote['close'], 'Adj Close': adjclose, 'Volume': quote['volume']},
+                            index=pd.DatetimeIndex(index), dtype='float64')
+        data = normalize(data.dropna(how='all'))
+        data = data[~data.index.duplicated(keep='last')]
+        return data.rename_axis('Datetime') if intraday else data
+
+
+class FileBackend:
+    """Bars read from <root>/<SYMBOL>.parquet or .csv, e.g. test fixtures or a PriceStore dir."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def fetch(self, symbol, start, end, pool=None):
+        base = os.path.join(self.root, symbol.upper())
+        if os.path.exists(base + '.parquet'):
+            data = pd.read_parquet(base + '.parquet')
+        elif os.path.exists(base + '.csv'):
+            data = pd.read_csv(base + '.csv', index_col=0, parse_dates=True)
+        else:
+            raise FetchError('%s: no fixture in %s' % (symbol, self.root))
+        data = normalize(data)
+        return data.loc[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end))]
+
+
+class ProviderBackend:
+    """Adapts a price_store provider function (symbol, start, end) -> frame."""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def fetch(self, symbol, start, end, pool=None):
+        return self.provider(symbol, start, end)
+
+
+def default_backend(spec=BACKEND):
+    """Backend from a FETCH_BACKEND-style spec: yahoo, yfinance, file:<dir> or an http(s) URL."""
+    if spec == 'yahoo':
+        return YahooBackend()
+    if spec == 'yfinance':
+        from price_store import yahoo_provider
+        return ProviderBackend(yahoo_provider)
+    if spec.startswith('file:'):
+        return FileBackend(spec[len('file:'):])
+    if spec.startswith(('http://', 'https://')):
+        return YahooBackend(spec)
+    raise ValueError('unknown fetch backend %r' % spec)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncFetcher:
+    def __init__(self, backend=None, concurrency=CONCURRENCY, rate=RATE, retries=RETRIES,
+                 backoff=0.5, max_backoff=30.0, timeout=TIMEOUT):
+        self.backend = backend or default_backend()
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool = ConnectionPool(concurrency, timeout)
+        self.stats = {'requests': 0, 'retries': 0, 'coalesced': 0, 'failures': 0}
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix='fetch')
+        self._inflight = {}
+        self._limits_loop = None
+        self._semaphore = None
+        self._bucket = None
+
+    def _limits(self):
+        # Bound to the running loop, so a fetcher can be reused across asyncio.run calls
+        loop = asyncio.get_running_loop()
+        if self._limits_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._bucket = TokenBucket(self.rate)
+            self._limits_loop = loop
+        return self._semaphore, self._bucket
+
+    async def fetch(self, symbol, start, end):
+        """Bars for [start, end); concurrent calls for the same request share one download."""
+        key = (symbol.upper(), pd.Timestamp(start), pd.Timestamp(end))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            task = asyncio.ensure_future(self._fetch(*key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, symbol, start, end):
+        semaphore, bucket = self._limits()
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                await bucket.acquire()
+                self.stats['requests'] += 1
+                try:
+                    return await loop.run_in_executor(self._executor, self.backend.fetch,
+                                                      symbol, start, end, self.pool)
+                except Exception as exc:
+                    if attempt == self.retries or not _retryable(exc):
+                        self.stats['failures'] += 1
+                        raise
+            # Full jitter, outside the semaphore so waiting does not hold a slot
+            self.stats['retries'] += 1
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    async def fetch_many(self, requests):
+        """{request: frame or exception} for (symbol, start, end) requests."""
+        requests = list(requests)
+        results = await asyncio.gather(*(self.fetch(*request) for request in requests),
+                                       return_exceptions=True)
+        return dict(zip(requests, results))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+
+
+def fetch_many(requests, fetcher=None):
+    """Blocking wrapper around AsyncFetcher.fetch_many for scripts and the app."""
+    owned = fetcher is None
+    fetcher = fetcher or AsyncFetcher()
+    try:
+        return asyncio.run(fetcher.fetch_many(requests))
+    finally:
+        if owned:
+            fetcher.close()
+
+
+def main(argv=None):
+    from price_store import default_store
+    from symbols import unique_symbols
+
+    parser = argparse.ArgumentParser(description='Refresh the price store for many symbols at once.')
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--start', default='2012-01-01')
+    parser.add_argument('--end', default=str(pd.Timestamp.today().date()))
+    parser.add_argument('--backend', default=BACKEND, help='yahoo, yfinance, file:<dir> or a chart API URL')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=RATE)
+    args = parser.parse_args(argv)
+
+    symbols = unique_symbols(args.symbols) if args.symbols else unique_symbols()
+    fetcher = AsyncFetcher(default_backend(args.backend), args.concurrency, args.rate)
+    started = time.perf_counter()
+    try:
+        failed = default_store().refresh(symbols, args.start, args.end, fetcher)
+    finally:
+        fetcher.close()
+    for symbol, exc in failed.items():
+        print('%s failed: %s' % (symbol, exc))
+    print('%d symbols in %.1fs | %d requests, %d retries, %d coalesced, %d failed | %d connections'
+          % (len(symbols), time.perf_counter() - started, fetcher.stats['requests'],
+             fetcher.stats['retries'], fetcher.stats['coalesced'], fetcher.stats['failures'],
+             fetcher.pool.opened))
+
+
+if __name__ == '__main__':
+    main()
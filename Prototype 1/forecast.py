@@ -0,0 +1,98 @@
+# Recursive multi-step forecasting
+#
+# Each prediction is appended to the window and fed back in for the next day.
+# All symbols (or scenarios) are rolled forward together, so a 30-day forecast
+# costs 30 batched forward passes no matter how many series are in the batch.
+#
+#   python forecast.py --steps 30 --output future.parquet
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from model_registry import SERVING_MODEL, get_model
+from pipeline import split_train_test
+from price_store import load_many
+from scaling import MinMax, scaler_for
+from symbols import unique_symbols
+
+LOOKBACK = 100
+
+
+def rollout(model, windows, steps):
+    """Roll scaled (n, lookback) windows `steps` days forward; returns (n, steps)."""
+    windows = np.asarray(windows, dtype='float32')
+    n, lookback = windows.shape
+    buffer = np.empty((n, lookback + steps), dtype='float32')
+    buffer[:, :lookback] = windows
+    for t in range(steps):
+        x = buffer[:, t:t + lookback, np.newaxis]
+        buffer[:, lookback + t] = np.asarray(model.predict_on_batch(x))[:, 0]
+    return buffer[:, lookback:]
+
+
+def forecast_future(closes, steps=30, lookback=LOOKBACK, model_path=SERVING_MODEL, model=None):
+    """Forecast `steps` business days past the end of each closing-price series.
+
+    `closes` maps a name (symbol or scenario) to a date-indexed Series.
+    Returns a frame indexed by future business day with one column per name;
+    each column starts the day after its own series ends, so a series that
+    ends earlier than the others is NaN on the dates past its horizon.
+    `model` overrides the one loaded from `model_path`, as in predict_test_slice.
+    """
+    names, windows, scalers, last_dates = [], [], [], []
+    for name, close in closes.items():
+        close = pd.Series(close).dropna().astype('float64')
+        if len(close) < lookback:
+            continue
+        # Persisted scaler for the symbol, else one fitted on its training slice
+        data_train, _ = split_train_test(close, lookback=lookback)
+        scaler = scaler_for(name, model_path, data_train.to_numpy())
+        windows.append(scaler.transform(close.to_numpy()[-lookback:]))
+        names.append(name)
+        scalers.append(scaler)
+        last_dates.append(close.index[-1])
+
+    if not names:
+        return pd.DataFrame()
+
+    with instrument.span('rollout', series=len(names), steps=steps):
+        scaled = rollout(model or get_model(model_path), np.stack(windows), steps)
+    prices = MinMax.stack(scalers, rows=True).inverse(scaled.astype('float64'))
+    columns = [pd.Series(row, name=name,
+                         index=pd.bdate_range(last + pd.offsets.BDay(1), periods=steps, name='Date'))
+               for name, row, last in zip(names, prices, last_dates)]
+    return pd.concat(columns, axis=1, sort=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Forecast every stock symbol N days ahead.')
+    parser.add_argument('--steps', type=int, default=30)
+    parser.add_argument('--start', default='2022-01-01')
+    parser.add_argument('--end', default=str(pd.Timestamp.today().date()))
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--output', default='future.parquet', help='.parquet or .csv')
+    args = parser.parse_args(argv)
+
+    symbols = unique_symbols(args.symbols) if args.symbols else unique_symbols()
+    frames, skipped = load_many(symbols, args.start, args.end)
+    closes = {symbol: data['Close'] for symbol, data in frames.items() if 'Close' in data}
+    started = time.perf_counter()
+    future = forecast_future(closes, args.steps, model_path=args.model)
+    elapsed = time.perf_counter() - started
+
+    if args.output.endswith('.csv'):
+        future.to_csv(args.output)
+    else:
+        future.to_parquet(args.output)
+    print('%d series x %d days in %.2fs (%d batched model calls) -> %s'
+          % (future.shape[1], args.steps, elapsed, args.steps, args.output))
+    for symbol, reason in skipped.items():
+        print('skipped %s: %s' % (symbol, reason))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+# Process-wide model registry
+#
+# Streamlit re-executes app.py on every widget change, but imported modules
+# stay in sys.modules, so models kept here are shared by every session and
+# every rerun of the same server process.
+#
+# It also reads models/variants/variants.json, written by variants.py: the
+# float16, int8 and distilled variants of a model with their measured accuracy
+# and latency. select_variant() picks the most accurate one that meets the
+# latency budget (MODEL_LATENCY_BUDGET_MS, for a request of
+# MODEL_LATENCY_BATCH windows) and throughput target (MODEL_THROUGHPUT_TARGET,
+# windows per second); with neither set the model itself is used.
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+import instrument
+
+# Model used by the app: the NumPy export of stock_data.keras, so serving does
+# not import TensorFlow. Set SERVING_MODEL=stock_data.keras to use Keras.
+SERVING_MODEL = os.environ.get('SERVING_MODEL', 'stock_data.npz')
+
+# Per-symbol and per-sector models written by train.py
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+MANIFEST = 'manifest.json'
+VARIANT_DIR = os.path.join(MODEL_DIR, 'variants')
+VARIANTS = 'variants.json'
+
+LATENCY_BUDGET_MS = float(os.environ.get('MODEL_LATENCY_BUDGET_MS') or 0) or None
+THROUGHPUT_TARGET = float(os.environ.get('MODEL_THROUGHPUT_TARGET') or 0) or None
+LATENCY_BATCH = int(os.environ.get('MODEL_LATENCY_BATCH', 256))
+
+_models = {}
+_lock = threading.Lock()
+_manifest = {}
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def _key(path):
+    path = os.path.abspath(path)
+    return path, os.path.getmtime(path)
+
+
+def _warm_up(model):
+    # Run one dummy batch so graph tracing happens now, not on the first user
+    shape = [1 if dim is None else dim for dim in model.input_shape]
+    model.predict(np.zeros(shape, dtype='float32'), verbose=0)
+
+
+def _load(path):
+    if path.endswith('.npz'):
+        # NumPy weight bundle from export_model.py, served without TensorFlow
+        from numpy_runtime import NumpyModel
+
+        return NumpyModel(path)
+
+    from keras.models import load_model
+
+    return load_model(path)
+
+
+def get_model(path=SERVING_MODEL, warm_up=True):
+    """Return the loaded model for `path`, loading it once per file version."""
+    key = _key(path)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            with instrument.span('load_model', path=key[0]):
+                model = _load(key[0])
+            if warm_up:
+                _warm_up(model)
+
+            # Drop older versions of the same file so retrained models replace them
+            for old in [k for k in _models if k[0] == key[0]]:
+                del _models[old]
+            _models[key] = model
+    return model
+
+
+def preload(path=SERVING_MODEL):
+    """Start loading `path` on a background thread and return a Future for the model.
+
+    Lets a page render while TensorFlow initializes; get_model() called later
+    waits for the same load instead of starting another one.
+    """
+    global _loader
+    model = _models.get(_key(path))
+    if model is not None:
+        future = Future()
+        future.set_result(model)
+        return future
+    with _loader_lock:
+        if _loader is None:
+            _loader = ThreadPoolExecutor(1, thread_name_prefix='model-loader')
+    return _loader.submit(get_model, path)
+
+
+def _read_json(path, key):
+    # Re-read only when the file changes
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    cached = _manifest.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = _manifest[path] = (mtime, json.load(f).get(key, {}))
+    return cached[1]
+
+
+def _read_manifest(model_dir):
+    return _read_json(os.path.join(model_dir, MANIFEST), 'models')
+
+
+def model_path_for(symbol, model_dir=MODEL_DIR, default=SERVING_MODEL):
+    """Model trained for `symbol` (its own, else its sector's), or `default`."""
+    models = _read_manifest(model_dir)
+    entry = models.get(symbol)
+    if entry is None:
+        entry = next((e for e in models.values() if symbol in e.get('symbols', [])), None)
+    if entry is None:
+        return default
+    name = entry['keras'] if default.endswith('.keras') else entry['npz']
+    return os.path.join(model_dir, name)
+
+
+def variants_for(model_path, variant_dir=VARIANT_DIR):
+    """{name: entry} recorded by variants.py for `model_path`, the model itself included."""
+    models = _read_json(os.path.join(variant_dir, VARIANTS), 'models')
+    return models.get(os.path.normpath(model_path), {})
+
+
+def record_variant(model_path, name, entry, variant_dir=VARIANT_DIR):
+    """Add or replace one variant of `model_path` in the variants file."""
+    os.makedirs(variant_dir, exist_ok=True)
+    path = os.path.join(variant_dir, VARIANTS)
+    document = {'models': {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            document = json.load(f)
+    document['models'].setdefault(os.path.normpath(model_path), {})[name] = entry
+    with open(path + '.tmp', 'w') as f:
+        json.dump(document, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _latency(entry, batch):
+    # Measured batch sizes are strings in JSON; use the nearest one at or above `batch`
+    sizes = sorted(int(size) for size in entry['latency_ms'])
+    size = next((size for size in sizes if size >= batch), sizes[-1])
+    return entry['latency_ms'][str(size)]
+
+
+def select_variant(model_path, latency_ms=LATENCY_BUDGET_MS, throughput=THROUGHPUT_TARGET,
+                   batch=LATENCY_BATCH, variant_dir=VARIANT_DIR):
+    """Path of the most accurate variant of `model_path` that meets the targets.
+
+    If none does, the fastest one is used. Without targets, or without
+    recorded variants, `model_path` itself is returned.
+    """
+    if latency_ms is None and throughput is None:
+        return model_path
+    entries = [entry for entry in variants_for(model_path, variant_dir).values()
+               if os.path.exists(entry['path'])]
+    if not entries:
+        return model_path
+    meets = [entry for entry in entries
+             if (latency_ms is None or _latency(entry, batch) <= latency_ms)
+             and (throughput is None or entry['windows_per_s'] >= throughput)]
+    if meets:
+        return min(meets, key=lambda entry: (entry['mae'], _latency(entry, batch)))['path']
+    if latency_ms is None:
+        return max(entries, key=lambda entry: entry['windows_per_s'])['path']
+    return min(entries, key=lambda entry: _latency(entry, batch))['path']
+
+
+def loaded_models():
+    """List the (path, mtime) keys currently held in the registry."""
+    return list(_models)
+
+
+def clear():
+    with _lock:
+        _models.clear()
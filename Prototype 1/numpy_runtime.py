@@ -0,0 +1,158 @@
+# Pure-NumPy inference runtime for the stacked LSTM
+#
+# Runs a weight bundle written by export_model.py (LSTM or GRU layers followed
+# by a Dense head) without importing TensorFlow. NumpyModel mirrors the parts
+# of the Keras model API the app uses: input_shape, predict and predict_on_batch.
+# Bundles may store their weights as float16 or int8 (see export_model.py
+# --quantize); they are expanded to the compute dtype once, at load.
+import json
+
+import numpy as np
+
+
+def _sigmoid(z):
+    # tanh form avoids overflow in exp() for large negative inputs
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+
+def _relu(z):
+    return np.maximum(z, 0.0)
+
+
+ACTIVATIONS = {
+    'sigmoid': _sigmoid,
+    'relu': _relu,
+    'tanh': np.tanh,
+    'linear': lambda z: z,
+}
+
+
+def lstm_layer(x, kernel, recurrent_kernel, bias, activation='tanh',
+               recurrent_activation='sigmoid', return_sequences=False, state=None):
+    """Keras-compatible LSTM forward pass over (batch, time, features).
+
+    Gate order in the weights is input, forget, cell, output, as in Keras.
+    `state` is an optional (h, c) pair to continue from; the final (h, c) is
+    returned alongside the output.
+    """
+    act = ACTIVATIONS[activation]
+    rec_act = ACTIVATIONS[recurrent_activation]
+    n, steps, _ = x.shape
+    units = recurrent_kernel.shape[0]
+
+    # Input projection for every time step in one matmul
+    projected = x @ kernel + bias
+    if state is None:
+        h = np.zeros((n, units), dtype=x.dtype)
+        c = np.zeros((n, units), dtype=x.dtype)
+    else:
+        h, c = state
+    outputs = np.empty((n, steps, units), dtype=x.dtype) if return_sequences else None
+
+    for t in range(steps):
+        z = projected[:, t] + h @ recurrent_kernel
+        i = rec_act(z[:, :units])
+        f = rec_act(z[:, units:2 * units])
+        g = act(z[:, 2 * units:3 * units])
+        o = rec_act(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * act(c)
+        if return_sequences:
+            outputs[:, t] = h
+
+    return (outputs if return_sequences else h), (h, c)
+
+
+def gru_layer(x, kernel, recurrent_kernel, bias, activation='tanh',
+              recurrent_activation='sigmoid', return_sequences=False, state=None):
+    """Keras-compatible GRU forward pass over (batch, time, features).
+
+    Gate order is update, reset, candidate. A (2, 3 * units) bias means
+    reset_after=True (the Keras default): the reset gate is applied after the
+    recurrent matmul. The final state is h alone.
+    """
+    act = ACTIVATIONS[activation]
+    rec_act = ACTIVATIONS[recurrent_activation]
+    n, steps, _ = x.shape
+    units = recurrent_kernel.shape[0]
+    reset_after = bias.ndim == 2
+    input_bias, recurrent_bias = (bias[0], bias[1]) if reset_after else (bias, 0)
+
+    projected = x @ kernel + input_bias
+    h = np.zeros((n, units), dtype=x.dtype) if state is None else state
+    outputs = np.empty((n, steps, units), dtype=x.dtype) if return_sequences else None
+
+    for t in range(steps):
+        xz = projected[:, t]
+        if reset_after:
+            hz = h @ recurrent_kernel + recurrent_bias
+            z = rec_act(xz[:, :units] + hz[:, :units])
+            r = rec_act(xz[:, units:2 * units] + hz[:, units:2 * units])
+            candidate = act(xz[:, 2 * units:] + r * hz[:, 2 * units:])
+        else:
+            hz = h @ recurrent_kernel[:, :2 * units]
+            z = rec_act(xz[:, :units] + hz[:, :units])
+            r = rec_act(xz[:, units:] + hz[:, units:])
+            candidate = act(xz[:, 2 * units:] + (r * h) @ recurrent_kernel[:, 2 * units:])
+        h = z * h + (1 - z) * candidate
+        if return_sequences:
+            outputs[:, t] = h
+
+    return (outputs if return_sequences else h), h
+
+
+RECURRENT = {'lstm': lstm_layer, 'gru': gru_layer}
+
+
+class NumpyModel:
+    def __init__(self, path):
+        bundle = np.load(path)
+        self.config = json.loads(str(bundle['config']))
+        self.weights = [
+            [self._weight(bundle, 'layer%d_%d' % (i, k)) for k in range(len(layer['weights']))]
+            for i, layer in enumerate(self.config['layers'])
+        ]
+        self.input_shape = tuple(self.config['input_shape'])
+
+    def _weight(self, bundle, key):
+        w = bundle[key]
+        if key + '_scale' in bundle:
+            # int8 with one float scale per output column
+            return np.ascontiguousarray(w.astype(self.dtype) * bundle[key + '_scale'].astype(self.dtype))
+        return np.ascontiguousarray(w, dtype=self.dtype)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.config.get('dtype', 'float32'))
+
+    def run(self, x, states=None):
+        """Forward pass that also returns the final state of every recurrent layer.
+
+        Passing those states back in with only the new time steps continues
+        the sequence without re-running the earlier ones (stateful inference).
+        """
+        out = np.asarray(x, dtype=self.dtype)
+        new_states = []
+        recurrent_index = 0
+        for layer, weights in zip(self.config['layers'], self.weights):
+            if layer['type'] in RECURRENT:
+                state = None if states is None else states[recurrent_index]
+                out, state = RECURRENT[layer['type']](
+                    out, *weights, activation=layer['activation'],
+                    recurrent_activation=layer['recurrent_activation'],
+                    return_sequences=layer['return_sequences'], state=state)
+                new_states.append(state)
+                recurrent_index += 1
+            elif layer['type'] == 'dense':
+                out = ACTIVATIONS[layer['activation']](out @ weights[0] + weights[1])
+        return out, new_states
+
+    def predict_on_batch(self, x):
+        return self.run(x)[0]
+
+    def predict(self, x, batch_size=1024, verbose=0):
+        x = np.asarray(x)
+        if len(x) <= batch_size:
+            return self.predict_on_batch(x)
+        return np.concatenate([self.predict_on_batch(x[lo:lo + batch_size])
+                               for lo in range(0, len(x), batch_size)])
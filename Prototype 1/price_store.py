@@ -0,0 +1,248 @@
+# Local on-disk OHLCV store
+#
+# One Parquet file per symbol holds every daily bar fetched so far, and a small
+# JSON sidecar records which [start, end) date ranges have already been asked
+# from the provider (weekends and holidays have no rows, so coverage cannot be
+# inferred from the bars alone). Only the missing ranges are downloaded.
+#
+# A range only counts as covered once the provider returned rows for it, or
+# when it has no weekdays at all. A failed or empty download leaves it
+# uncovered, so it is asked for again on the next load instead of leaving a
+# permanent hole.
+import json
+import os
+import threading
+
+import pandas as pd
+
+import instrument
+
+STORE_DIR = os.environ.get('PRICE_STORE_DIR', 'price_data')
+OFFLINE = os.environ.get('PRICE_STORE_OFFLINE', '') not in ('', '0')
+
+
+class DownloadError(Exception):
+    pass
+
+
+def yahoo_provider(symbol, start, end):
+    import yfinance as yf
+    from yfinance import shared
+
+    # yf.download does not raise: failures are logged and an empty frame returned
+    data = yf.download(symbol, start, end, progress=False, auto_adjust=False)
+    if data.empty:
+        error = shared._ERRORS.get(symbol.upper()) or 'no rows'
+        raise DownloadError('%s [%s, %s): %s' % (symbol, _day(start).date(), _day(end).date(), error))
+    return normalize(data)
+
+
+def normalize(data):
+    """Flatten yfinance output to one column per field with a naive date index."""
+    data = data.copy()
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    data.columns.name = None
+    data.index = pd.to_datetime(data.index)
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data.index.name = 'Date'
+    return data
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize()
+
+
+def _has_weekdays(lo, hi):
+    return len(pd.bdate_range(lo, hi - pd.Timedelta(days=1))) > 0
+
+
+def _subtract(start, end, covered):
+    # Parts of [start, end) not covered by any of the sorted, merged intervals
+    missing = []
+    cursor = start
+    for lo, hi in covered:
+        if hi <= cursor:
+            continue
+        if lo >= end:
+            break
+        if lo > cursor:
+            missing.append((cursor, min(lo, end)))
+        cursor = max(cursor, hi)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+def _merge(intervals):
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+class PriceStore:
+    def __init__(self, root=STORE_DIR, provider=yahoo_provider, offline=OFFLINE):
+        self.root = root
+        self.provider = provider
+        self.offline = offline
+        self.provider_calls = 0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _paths(self, symbol):
+        base = os.path.join(self.root, symbol.upper())
+        return base + '.parquet', base + '.json'
+
+    def _lock(self, symbol):
+        with self._locks_guard:
+            return self._locks.setdefault(symbol.upper(), threading.Lock())
+
+    def _read(self, symbol):
+        bars_path, meta_path = self._paths(symbol)
+        bars = pd.read_parquet(bars_path) if os.path.exists(bars_path) else None
+        covered = []
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                covered = [(_day(lo), _day(hi)) for lo, hi in json.load(f)['covered']]
+        return bars, covered
+
+    def _write(self, symbol, bars, covered):
+        os.makedirs(self.root, exist_ok=True)
+        bars_path, meta_path = self._paths(symbol)
+        # Write to temporary files first so readers never see a half-written store
+        bars.to_parquet(bars_path + '.tmp')
+        os.replace(bars_path + '.tmp', bars_path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({'covered': [[lo.strftime('%Y-%m-%d'), hi.strftime('%Y-%m-%d')]
+                                   for lo, hi in covered]}, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _add(self, symbol, bars, covered, gaps, fetched):
+        # Merge freshly fetched frames for `gaps` into the stored bars; caller holds the lock
+        frames = [frame for frame in ([] if bars is None else [bars]) + fetched if len(frame)]
+        if frames:
+            bars = pd.concat(frames)
+            bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+        else:
+            bars = pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+
+        # Today's bar is still moving, so never mark it (or the future) as final.
+        # An empty result only covers a gap that cannot hold trading days.
+        today = pd.Timestamp.today().normalize()
+        covered = _merge(covered + [(lo, min(hi, today)) for (lo, hi), frame in zip(gaps, fetched)
+                                    if lo < today and (len(frame) or not _has_weekdays(lo, hi))])
+        self._write(symbol, bars, covered)
+        return bars
+
+    def missing(self, symbol, start, end):
+        """Date ranges of [start, end) that still need to come from the provider."""
+        _, covered = self._read(symbol)
+        return _subtract(_day(start), _day(end), covered)
+
+    def load(self, symbol, start, end):
+        """Return daily bars for [start, end), fetching only ranges not on disk.
+
+        A failed download leaves its range uncovered for the next load; it
+        is raised only when no stored bars can be returned instead.
+        """
+        start, end = _day(start), _day(end)
+        errors = []
+        with self._lock(symbol):
+            bars, covered = self._read(symbol)
+            gaps = [] if self.offline else _subtract(start, end, covered)
+            if gaps:
+                fetched = []
+                for lo, hi in gaps:
+                    if not _has_weekdays(lo, hi):
+                        fetched.append(pd.DataFrame())
+                        continue
+                    self.provider_calls += 1
+                    try:
+                        with instrument.span('fetch', symbol=symbol):
+                            fetched.append(self.provider(symbol, lo, hi))
+                    except Exception as exc:
+                        instrument.count('price_store.fetch_errors')
+                        errors.append(exc)
+                        fetched.append(pd.DataFrame())
+                bars = self._add(symbol, bars, covered, gaps, fetched)
+
+        if bars is None:
+            bars = pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+        bars = bars.loc[(bars.index >= start) & (bars.index < end)]
+        if errors and bars.empty:
+            raise errors[0]
+        return bars
+
+    def refresh(self, symbols, start, end, fetcher=None):
+        """Fetch the missing ranges of many symbols concurrently (see fetcher.py).
+
+        Returns {symbol: exception} for symbols whose download failed; their
+        ranges stay uncovered and are retried next time.
+        """
+        from fetcher import AsyncFetcher, ProviderBackend, fetch_many
+
+        start, end = _day(start), _day(end)
+        if self.offline:
+            return {}
+        requests = [(symbol.upper(), lo, hi) for symbol in dict.fromkeys(s.upper() for s in symbols)
+                    for lo, hi in self.missing(symbol, start, end)]
+        if not requests:
+            return {}
+        owned = fetcher is None and self.provider is not yahoo_provider
+        if owned:
+            fetcher = AsyncFetcher(ProviderBackend(self.provider))
+        try:
+            results = fetch_many(requests, fetcher)
+        finally:
+            if owned:
+                fetcher.close()
+        self.provider_calls += len(requests)
+
+        failed, by_symbol = {}, {}
+        for (symbol, lo, hi), result in results.items():
+            if isinstance(result, Exception):
+                failed[symbol] = result
+            else:
+                by_symbol.setdefault(symbol, []).append(((lo, hi), result))
+        for symbol, parts in by_symbol.items():
+            with self._lock(symbol):
+                bars, covered = self._read(symbol)
+                self._add(symbol, bars, covered, [gap for gap, _ in parts], [frame for _, frame in parts])
+        return failed
+
+
+_default_store = None
+
+
+def default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = PriceStore()
+    return _default_store
+
+
+def load_prices(symbol, start, end):
+    return default_store().load(symbol, start, end)
+
+
+def load_many(symbols, start, end, store=None):
+    """Bars of every symbol for [start, end), skipping the ones that fail to download.
+
+    Returns ({symbol: bars}, {symbol: reason}); one delisted symbol or
+    network error does not stop a job over many symbols.
+    """
+    store = store or default_store()
+    frames, skipped = {}, {}
+    for symbol in symbols:
+        try:
+            frames[symbol] = store.load(symbol, start, end)
+        except DownloadError as exc:
+            skipped[symbol] = str(exc)
+    return frames, skipped
@@ -0,0 +1,134 @@
+# Persisted min-max scaling
+#
+# Scalers are fitted once on the training slice (train.py, or `python
+# scaling.py` for the shipped model) and saved next to the model as
+# <model>.scalers.json, one {min, max} pair per symbol. Inference reuses them,
+# so every request for a symbol is scaled the same way and no test data leaks
+# into the scaling. Transforms are plain NumPy and can run in place.
+#
+#   python scaling.py --model stock_data.npz --start 2012-01-01 --end 2022-12-21
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+class MinMax:
+    """Maps [data_min, data_max] to [0, 1]; arrays broadcast for batches of symbols."""
+
+    def __init__(self, data_min, data_max):
+        self.data_min = np.asarray(data_min, dtype='float64')
+        self.data_max = np.asarray(data_max, dtype='float64')
+        span = self.data_max - self.data_min
+        self.span = np.where(span > 0, span, 1.0)
+
+    @classmethod
+    def fit(cls, values):
+        values = np.asarray(values, dtype='float64')
+        return cls(np.nanmin(values), np.nanmax(values))
+
+    @classmethod
+    def stack(cls, scalers, counts=None, rows=False):
+        """One scaler over many symbols, so a whole batch is scaled in one call.
+
+        With `counts`, each symbol's scaler is repeated for its run of values
+        in a flat array; with rows=True it applies to the rows of a 2-D array.
+        """
+        mins = np.array([s.data_min for s in scalers])
+        maxs = np.array([s.data_max for s in scalers])
+        if counts is not None:
+            mins, maxs = np.repeat(mins, counts), np.repeat(maxs, counts)
+        if rows:
+            mins, maxs = mins[:, np.newaxis], maxs[:, np.newaxis]
+        return cls(mins, maxs)
+
+    def transform(self, values, out=None):
+        values = np.asarray(values)
+        out = np.subtract(values, self.data_min, out=out, casting='unsafe')
+        return np.divide(out, self.span, out=out, casting='unsafe')
+
+    def inverse(self, values, out=None):
+        values = np.asarray(values)
+        out = np.multiply(values, self.span, out=out, casting='unsafe')
+        return np.add(out, self.data_min, out=out, casting='unsafe')
+
+    def to_dict(self):
+        return {'min': float(self.data_min), 'max': float(self.data_max)}
+
+    @classmethod
+    def from_dict(cls, item):
+        return cls(item['min'], item['max'])
+
+
+def scaler_path(model_path):
+    return os.path.splitext(model_path)[0] + '.scalers.json'
+
+
+_files = {}
+
+
+def load_scalers(model_path):
+    """{symbol: MinMax} saved next to `model_path`, re-read only when the file changes."""
+    path = scaler_path(model_path)
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    cached = _files.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            items = json.load(f)
+        cached = _files[path] = (mtime, {symbol: MinMax.from_dict(item) for symbol, item in items.items()})
+    return cached[1]
+
+
+def save_scalers(model_path, scalers):
+    path = scaler_path(model_path)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({symbol: scaler.to_dict() for symbol, scaler in scalers.items()}, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def scaler_for(symbol, model_path, train_values=None):
+    """The persisted scaler for `symbol`, else one fitted on `train_values`.
+
+    The fallback only ever sees the training slice, never the test slice.
+    """
+    scaler = load_scalers(model_path).get(symbol) if symbol else None
+    if scaler is None:
+        if train_values is None:
+            raise KeyError('no persisted scaler for %s next to %s' % (symbol, model_path))
+        scaler = MinMax.fit(train_values)
+    return scaler
+
+
+def main(argv=None):
+    from model_registry import SERVING_MODEL
+    from pipeline import split_train_test
+    from price_store import load_many
+    from symbols import unique_symbols
+
+    parser = argparse.ArgumentParser(description='Fit and save per-symbol scalers for a model.')
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--start', default='2012-01-01', help='training range of the model')
+    parser.add_argument('--end', default='2022-12-21')
+    args = parser.parse_args(argv)
+
+    symbols = unique_symbols(args.symbols) if args.symbols else unique_symbols()
+    frames, skipped = load_many(symbols, args.start, args.end)
+    scalers = dict(load_scalers(args.model))
+    for symbol, data in frames.items():
+        if 'Close' in data and len(data):
+            data_train, _ = split_train_test(data['Close'])
+            scalers[symbol] = MinMax.fit(data_train.to_numpy())
+        else:
+            skipped[symbol] = 'no data'
+    save_scalers(args.model, scalers)
+    print('%d scalers -> %s' % (len(scalers), scaler_path(args.model)))
+    for symbol, reason in skipped.items():
+        print('skipped %s: %s' % (symbol, reason))
+
+
+if __name__ == '__main__':
+    main()
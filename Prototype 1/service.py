@@ -0,0 +1,225 @@
+# Headless prediction service
+#
+# Serves the app's predictions over HTTP so inference scales independently of
+# the dashboard. Every endpoint is a GET returning a frame as JSON
+# (pandas orient='split'), built with the same code app.py uses:
+#
+#   /predict?symbol=AAPL&start=2012-01-01&end=2022-12-21[&lookback=100]
+#       original vs. predicted test-slice prices (pipeline.predict_test_slice)
+#   /forecast?symbols=AAPL,MSFT&start=2022-01-01&end=2024-01-01[&steps=30]
+#       recursive forecast per symbol (forecast.forecast_future)
+#   /indicators?symbol=AAPL&start=...&end=...[&windows=50,100,200][&rsi=14]
+#       moving averages (and RSI) of the closing price
+#   /metrics   micro-batcher queue depth, batch sizes and latency percentiles,
+#              plus stage spans when APP_TRACE is set (?format=prometheus for text)
+#   /health
+#
+# Errors are JSON {'error': message}: 400 for a bad parameter, 404 when a
+# symbol has no price data (delisted, or the download failed) and 422 when it
+# has too little history to predict.
+#
+# The service keeps no state of its own: prices come from the shared price
+# store and results go through the shared forecast cache. Requests are handled
+# on threads and their model calls are merged by batching.MicroBatcher, and
+# --workers N starts N processes on the same port (SO_REUSEPORT). Models are
+# picked with model_registry.select_variant, so MODEL_LATENCY_BUDGET_MS and
+# MODEL_THROUGHPUT_TARGET choose among the variants built by variants.py.
+#
+#   python service.py --port 8000 --workers 4
+#   PREDICTION_SERVICE_URL=http://127.0.0.1:8000 streamlit run app.py
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import instrument
+from batching import batched_model, metrics
+from forecast import LOOKBACK, forecast_future
+from forecast_cache import default_cache, forecast_key
+from indicators import moving_averages, rsi
+from model_registry import SERVING_MODEL, model_path_for, select_variant
+from pipeline import enough_history, predict_test_slice
+from price_store import DownloadError, load_prices
+
+HOST = os.environ.get('SERVICE_HOST', '127.0.0.1')
+PORT = int(os.environ.get('SERVICE_PORT', 8000))
+WORKERS = int(os.environ.get('SERVICE_WORKERS', 1))
+
+
+class BadRequest(Exception):
+    status = 400
+
+
+class NotFound(BadRequest):
+    status = 404
+
+
+class Unprocessable(BadRequest):
+    status = 422
+
+
+def _param(query, name, default=None, cast=str):
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise BadRequest('missing parameter %r' % name)
+        return default
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise BadRequest('bad value for %r: %r' % (name, values[0]))
+
+
+def _ints(text):
+    return tuple(int(part) for part in text.split(',') if part)
+
+
+def _close(symbol, start, end):
+    try:
+        data = load_prices(symbol, start, end)
+    except DownloadError as exc:
+        raise NotFound(str(exc))
+    if 'Close' not in data or data.empty:
+        raise NotFound('no price data for %s in [%s, %s)' % (symbol, start, end))
+    return data['Close']
+
+
+def predict(query):
+    symbol = _param(query, 'symbol').upper()
+    start, end = _param(query, 'start'), _param(query, 'end')
+    lookback = _param(query, 'lookback', 100, int)
+    close = _close(symbol, start, end)
+    if not enough_history(close, lookback):
+        raise Unprocessable('not enough history for %s' % symbol)
+    model_path = select_variant(model_path_for(symbol))
+    # Same cache key as app.py, so the app and the service share results
+    return default_cache().get_or_compute(
+        forecast_key(symbol, start, end, lookback=lookback, model_path=model_path),
+        lambda: predict_test_slice(close, model_path, lookback=lookback, symbol=symbol,
+                                   model=batched_model(model_path)))
+
+
+def forecast(query):
+    symbols = [symbol.upper() for symbol in _param(query, 'symbols').split(',') if symbol]
+    start, end = _param(query, 'start'), _param(query, 'end')
+    steps = _param(query, 'steps', 30, int)
+    if not 1 <= steps <= 365:
+        raise BadRequest('steps must be between 1 and 365')
+    closes = {symbol: _close(symbol, start, end) for symbol in symbols}
+    short = [symbol for symbol, close in closes.items() if len(close) < LOOKBACK]
+    if short:
+        raise Unprocessable('not enough history for %s' % ', '.join(short))
+    model_path = select_variant(SERVING_MODEL)
+    return forecast_future(closes, steps=steps, model_path=model_path, model=batched_model(model_path))
+
+
+def indicators(query):
+    symbol = _param(query, 'symbol').upper()
+    close = _close(symbol, _param(query, 'start'), _param(query, 'end'))
+    windows = _param(query, 'windows', (50, 100, 200), _ints)
+    frame = pd.DataFrame({'MA%d' % window: series
+                          for window, series in moving_averages(close, windows).items()})
+    period = _param(query, 'rsi', 0, int)
+    if period:
+        frame['RSI%d' % period] = rsi(close, period)
+    return frame
+
+
+ROUTES = {'/predict': predict, '/forecast': forecast, '/indicators': indicators}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body, content_type='application/json'):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            return self._send(200, json.dumps({'status': 'ok', 'pid': os.getpid()}))
+        if url.path == '/metrics':
+            if parse_qs(url.query).get('format') == ['prometheus']:
+                return self._send(200, instrument.prometheus_text('service'), 'text/plain; version=0.0.4')
+            return self._send(200, json.dumps(dict(instrument.snapshot(), pid=os.getpid())))
+        route = ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, json.dumps({'error': 'unknown endpoint %s' % url.path}))
+        try:
+            with instrument.span(url.path):
+                frame = route(parse_qs(url.query))
+        except BadRequest as exc:
+            return self._send(exc.status, json.dumps({'error': str(exc)}))
+        except Exception as exc:
+            traceback.print_exc()
+            return self._send(500, json.dumps({'error': repr(exc)}))
+        self._send(200, frame.to_json(orient='split', date_format='iso'))
+
+    def log_message(self, format, *args):
+        if os.environ.get('SERVICE_ACCESS_LOG'):
+            super().log_message(format, *args)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Lets every worker process bind the same port; the kernel spreads connections
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def run_worker(host, port):
+    instrument.register('batchers', metrics)
+    instrument.register('forecast_cache', lambda: default_cache().stats())
+    server = Server((host, port), Handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve(host=HOST, port=PORT, workers=WORKERS):
+    if workers <= 1 or not hasattr(socket, 'SO_REUSEPORT'):
+        print('serving on http://%s:%d' % (host, port))
+        return run_worker(host, port)
+    # spawn, not fork: each worker loads its own model (see train.py)
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(host, port), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    print('serving on http://%s:%d with %d workers' % (host, port, workers))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve predictions, forecasts and indicators over HTTP.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Client for service.py
+#
+# With PREDICTION_SERVICE_URL set, the Streamlit pages call the prediction
+# service instead of loading a model themselves. Responses are frames in
+# pandas orient='split' JSON.
+import io
+import json
+import os
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pandas as pd
+
+SERVICE_URL = os.environ.get('PREDICTION_SERVICE_URL', '').rstrip('/')
+TIMEOUT = float(os.environ.get('PREDICTION_SERVICE_TIMEOUT', 60))
+
+
+class ServiceError(Exception):
+    pass
+
+
+def _get(endpoint, base_url=None, **params):
+    url = '%s/%s?%s' % (base_url or SERVICE_URL, endpoint, urlencode(params))
+    try:
+        with urlopen(url, timeout=TIMEOUT) as response:
+            body = response.read().decode()
+    except HTTPError as exc:
+        try:
+            message = json.loads(exc.read())['error']
+        except (ValueError, KeyError):
+            message = str(exc)
+        raise ServiceError('%s: %s' % (endpoint, message))
+    frame = pd.read_json(io.StringIO(body), orient='split')
+    if len(frame):
+        frame.index = pd.DatetimeIndex(frame.index, name='Date')
+    return frame
+
+
+def predict(symbol, start, end, lookback=100, base_url=None):
+    """Same frame as pipeline.predict_test_slice, computed by the service."""
+    return _get('predict', base_url, symbol=symbol, start=start, end=end, lookback=lookback)
+
+
+def forecast(symbols, start, end, steps=30, base_url=None):
+    """Same frame as forecast.forecast_future, computed by the service."""
+    return _get('forecast', base_url, symbols=','.join(symbols), start=start, end=end, steps=steps)
+
+
+def moving_averages(symbol, start, end, windows=(50, 100, 200), base_url=None):
+    """{window: Series} as indicators.moving_averages, computed by the service."""
+    frame = _get('indicators', base_url, symbol=symbol, start=start, end=end,
+                 windows=','.join(str(window) for window in windows))
+    return {window: frame['MA%d' % window] for window in windows}
@@ -0,0 +1,276 @@
+# Versioned snapshots of precomputed page data
+#
+# publish() computes, for every symbol and each date range in SNAPSHOT_RANGES,
+# what the pages would compute on a page load: the bars with their 50/100/200
+# day moving averages, the test-slice predictions (one batched model call per
+# model, batch_predict.predict_universe) and a FUTURE_STEPS-day forecast
+# (forecast.forecast_future). scheduler.py runs it after every market close.
+#
+#   snapshots/CURRENT                                    name of the published version
+#   snapshots/<version>/manifest.json                    ranges, symbols, models, timings
+#   snapshots/<version>/r<i>/<SYMBOL>.parquet            bars + MA50, MA100, MA200
+#   snapshots/<version>/r<i>/<SYMBOL>.predictions.parquet  original vs. predicted price
+#   snapshots/<version>/r<i>/future.parquet              forecast, one column per symbol
+#
+# A version is written to a temporary directory, renamed into place, and only
+# then named in CURRENT (replaced atomically), so a reader sees the old or the
+# new snapshot, never a mix. The newest SNAPSHOT_KEEP versions are kept.
+#
+# Ranges are start:end pairs; an end of 'today' is resolved at publish time to
+# the day after the close the snapshot was built for, and such a range serves
+# page requests ending on any day from that close to the next trading day
+# (a request ending on the close day gets that day's bar as well). lookup()
+# returns None when no published range matches a request, and the page then
+# computes everything as before.
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+import instrument
+from indicators import moving_averages
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_RANGES = os.environ.get('SNAPSHOT_RANGES', '2022-01-01:2024-01-01,2022-01-01:today')
+KEEP = int(os.environ.get('SNAPSHOT_KEEP', 3))
+FUTURE_STEPS = 60  # the Future page's longest horizon; shorter ones are a prefix
+WINDOWS = (50, 100, 200)
+CURRENT = 'CURRENT'
+
+
+def parse_ranges(spec=SNAPSHOT_RANGES, as_of=None):
+    """[{start, end, open}] from a 'start:end,...' spec, 'today' ending after `as_of`."""
+    as_of = pd.Timestamp(as_of or pd.Timestamp.today()).normalize()
+    ranges = []
+    for item in spec.split(','):
+        start, end = item.strip().split(':')
+        is_open = end == 'today'
+        end = as_of + pd.Timedelta(days=1) if is_open else pd.Timestamp(end)
+        ranges.append({'start': str(pd.Timestamp(start).date()), 'end': str(end.date()), 'open': is_open})
+    return ranges
+
+
+@contextlib.contextmanager
+def _exclusive(path):
+    """Hold an exclusive lock on the file at `path` across processes.
+
+    flock on Unix, msvcrt.locking on Windows; either is released by the OS
+    if the holder dies, so a crashed publisher never leaves a stale lock.
+    """
+    with open(path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    # Retries for about 10 s, then raises; keep waiting
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+
+def _symbol_frames(symbol, start, end, store):
+    data = store.load(symbol, start, end)
+    if 'Close' not in data or not len(data):
+        return None
+    averages = moving_averages(data['Close'], WINDOWS)
+    return data.assign(**{'MA%d' % window: averages[window] for window in WINDOWS})
+
+
+def _write_range(directory, symbols, start, end, store):
+    """One range of a snapshot; returns ({symbol: reason} for symbols left out, model paths used)."""
+    from batch_predict import predict_universe
+    from forecast import forecast_future
+    from model_registry import SERVING_MODEL, model_path_for, select_variant
+
+    os.makedirs(directory)
+    skipped, closes, models = {}, {}, {}
+    for symbol in symbols:
+        try:
+            frame = _symbol_frames(symbol, start, end, store)
+        except Exception as exc:
+            skipped[symbol] = repr(exc)
+            continue
+        if frame is None:
+            skipped[symbol] = 'no data'
+            continue
+        frame.to_parquet(os.path.join(directory, symbol + '.parquet'))
+        closes[symbol] = frame['Close']
+        # Same model choice as the page, one batched predict per model
+        models.setdefault(select_variant(model_path_for(symbol)), []).append(symbol)
+
+    for model_path, members in models.items():
+        results, stats = predict_universe(members, start, end, model_path, store=store)
+        skipped.update(stats['skipped'])
+        for symbol, rows in results.groupby('Symbol', sort=False):
+            rows = rows.set_index(pd.DatetimeIndex(rows['Date'], name='Date'))
+            rows[['Original Price', 'Predicted Price']].to_parquet(
+                os.path.join(directory, symbol + '.predictions.parquet'))
+
+    future = forecast_future(closes, steps=FUTURE_STEPS, model_path=select_variant(SERVING_MODEL))
+    future.to_parquet(os.path.join(directory, 'future.parquet'))
+    return skipped, sorted(models)
+
+
+def publish(symbols=None, ranges=None, store=None, root=SNAPSHOT_DIR, keep=KEEP, as_of=None):
+    """Compute and atomically publish a new snapshot version; returns its manifest.
+
+    Only bars already in `store` are used (scheduler.py refreshes it first);
+    nothing is downloaded while publishing.
+    """
+    from price_store import PriceStore, default_store
+    from symbols import unique_symbols
+
+    started = time.perf_counter()
+    symbols = unique_symbols(symbols) if symbols else unique_symbols()
+    ranges = ranges or parse_ranges(as_of=as_of)
+    store = store or default_store()
+    store = PriceStore(store.root, store.provider, offline=True)
+    as_of = pd.Timestamp(as_of or pd.Timestamp.today()).normalize()
+    version = '%s-%s' % (as_of.strftime('%Y%m%d'), pd.Timestamp.now().strftime('%H%M%S%f'))
+
+    os.makedirs(root, exist_ok=True)
+    # One publisher at a time, across processes
+    with _exclusive(os.path.join(root, '.lock')):
+        tmp = os.path.join(root, '.%s.tmp' % version)
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        manifest = {'version': version, 'as_of': str(as_of.date()), 'ranges': ranges,
+                    'symbols': symbols, 'skipped': {}, 'models': []}
+        for i, item in enumerate(ranges):
+            skipped, models = _write_range(os.path.join(tmp, 'r%d' % i), symbols,
+                                           item['start'], item['end'], store)
+            manifest['skipped']['r%d' % i] = skipped
+            manifest['models'] = sorted(set(manifest['models']) | set(models))
+        manifest['seconds'] = time.perf_counter() - started
+        manifest['created_at'] = pd.Timestamp.now().isoformat(timespec='seconds')
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+        os.replace(tmp, os.path.join(root, version))
+        pointer = os.path.join(root, CURRENT)
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(version)
+        os.replace(pointer + '.tmp', pointer)
+        _prune(root, keep, version)
+    return manifest
+
+
+def _prune(root, keep, current):
+    versions = sorted(name for name in os.listdir(root)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(root, name)))
+    for name in versions[:-keep] if keep else []:
+        if name != current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class View:
+    """One symbol and range of a snapshot, in the shapes the pages use."""
+
+    def __init__(self, prices, predictions, future):
+        self.prices = prices[[c for c in prices.columns if not c.startswith('MA')]]
+        self.averages = {window: prices['MA%d' % window] for window in WINDOWS}
+        self.predictions = predictions
+        self.future = future
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self._views = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def range_for(self, start, end):
+        """Directory of the range serving a page request for [start, end), or None."""
+        try:
+            start, end = pd.Timestamp(start), pd.Timestamp(end)
+        except ValueError:
+            return None
+        as_of = pd.Timestamp(self.manifest['as_of'])
+        for i, item in enumerate(self.manifest['ranges']):
+            if start != pd.Timestamp(item['start']):
+                continue
+            if item['open']:
+                # No bars can exist between the snapshot's close and the next trading day
+                matches = as_of <= end <= as_of + pd.offsets.BDay(1)
+            else:
+                matches = end == pd.Timestamp(item['end'])
+            if matches:
+                return os.path.join(self.path, 'r%d' % i)
+        return None
+
+    def future(self, directory):
+        with self._lock:
+            future = self._futures.get(directory)
+            if future is None:
+                future = self._futures[directory] = pd.read_parquet(os.path.join(directory, 'future.parquet'))
+        return future
+
+    def view(self, symbol, start, end):
+        directory = self.range_for(start, end)
+        if directory is None:
+            return None
+        key = (symbol.upper(), directory)
+        with self._lock:
+            view = self._views.get(key)
+        if view is not None:
+            return view
+        base = os.path.join(directory, symbol.upper())
+        if not os.path.exists(base + '.predictions.parquet'):
+            return None
+        future = self.future(directory)
+        view = View(pd.read_parquet(base + '.parquet'), pd.read_parquet(base + '.predictions.parquet'),
+                    future[symbol.upper()].dropna() if symbol.upper() in future else None)
+        with self._lock:
+            self._views[key] = view
+        return view
+
+
+_current = (None, None)
+_current_lock = threading.Lock()
+
+
+def latest(root=SNAPSHOT_DIR):
+    """The published Snapshot, re-read only when CURRENT changes, or None."""
+    global _current
+    pointer = os.path.join(root, CURRENT)
+    try:
+        with open(pointer) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    with _current_lock:
+        if _current[0] != (root, version):
+            try:
+                _current = ((root, version), Snapshot(os.path.join(root, version)))
+            except OSError:
+                return None
+        return _current[1]
+
+
+def lookup(symbol, start, end, root=SNAPSHOT_DIR):
+    """Precomputed View of `symbol` for a page request, or None if it must be computed."""
+    snapshot = latest(root)
+    view = snapshot.view(symbol, start, end) if snapshot is not None else None
+    instrument.count('snapshot.hits' if view is not None else 'snapshot.misses')
+    return view
@@ -0,0 +1,37 @@
+# Stock symbols offered in the sidebar and covered by the batch jobs
+STOCK_SYMBOLS = [
+    'AAPL', 'MSFT', 'GOOG', 'AMZN', 'FB', 'TSLA', 'BRK-A', 'BRK-B', 'NVDA', 'JPM',
+    'JNJ', 'V', 'WMT', 'PG', 'MA', 'DIS', 'HD', 'PYPL', 'VZ', 'ADBE',
+    'NFLX', 'PFE', 'CMCSA', 'PEP', 'INTC', 'KO', 'CSCO', 'T', 'MRK', 'ABT',
+    'CVX', 'XOM', 'NKE', 'LLY', 'MCD', 'MDT', 'TXN', 'AVGO', 'CRM', 'HON',
+    'UNH', 'TMO', 'AMGN', 'NEE', 'DHR', 'QCOM', 'LIN', 'ACN', 'SPGI', 'ORCL',
+    'WBA', 'IBM', 'ISRG', 'CAT', 'DE', 'LOW', 'NOW', 'LMT', 'PM', 'MMM',
+    'FISV', 'BLK', 'COST', 'UPS', 'RTX', 'MO', 'BKNG', 'CCI', 'USB', 'MS',
+    'BA', 'GS', 'PLD', 'SCHW', 'ZTS', 'CB', 'GILD', 'CL', 'PNC', 'BMY',
+    'MU', 'CCI', 'GPN', 'BDX', 'CI', 'APD', 'DUK', 'C', 'PSX', 'TGT',
+    'GE', 'SO', 'EXC', 'FDX', 'MET', 'COP',
+]
+
+
+def unique_symbols(symbols=STOCK_SYMBOLS):
+    # The sidebar list contains duplicates (e.g. CCI); keep first occurrences in order
+    return list(dict.fromkeys(symbols))
+
+
+# Sector of every symbol above, used to train one model per sector
+SECTORS = {
+    'Technology': ['AAPL', 'MSFT', 'NVDA', 'ADBE', 'INTC', 'CSCO', 'TXN', 'AVGO', 'CRM', 'QCOM',
+                   'ACN', 'ORCL', 'IBM', 'NOW', 'MU'],
+    'Communication Services': ['GOOG', 'FB', 'DIS', 'VZ', 'NFLX', 'CMCSA', 'T'],
+    'Consumer Discretionary': ['AMZN', 'TSLA', 'HD', 'NKE', 'MCD', 'LOW', 'BKNG', 'TGT'],
+    'Consumer Staples': ['WMT', 'PG', 'PEP', 'KO', 'PM', 'COST', 'MO', 'CL', 'WBA'],
+    'Financials': ['BRK-A', 'BRK-B', 'JPM', 'V', 'MA', 'PYPL', 'SPGI', 'BLK', 'USB', 'MS',
+                   'GS', 'SCHW', 'CB', 'PNC', 'C', 'MET', 'FISV', 'GPN'],
+    'Health Care': ['JNJ', 'PFE', 'MRK', 'ABT', 'LLY', 'MDT', 'UNH', 'TMO', 'AMGN', 'DHR',
+                    'ISRG', 'ZTS', 'GILD', 'BMY', 'BDX', 'CI'],
+    'Industrials': ['HON', 'CAT', 'DE', 'LMT', 'MMM', 'UPS', 'RTX', 'BA', 'GE', 'FDX'],
+    'Energy': ['CVX', 'XOM', 'PSX', 'COP'],
+    'Utilities': ['NEE', 'DUK', 'SO', 'EXC'],
+    'Real Estate': ['CCI', 'PLD'],
+    'Materials': ['LIN', 'APD'],
+}
@@ -0,0 +1,80 @@
+# Tables for the Streamlit pages
+#
+# prediction_table() lines the model output up with the trading days it
+# predicts. paged_table() sorts a frame on the server and sends only the
+# visible page to the browser, as an Arrow table with column formats instead
+# of a pandas Styler, so a multi-year history costs one page of rows per rerun
+# rather than the whole frame rendered to HTML.
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+CHANGE = '↑   ↓   Change(%)'
+PAGE_SIZES = (25, 50, 100, 250)
+
+DATE = st.column_config.DateColumn(format='YYYY-MM-DD')
+PRICE = st.column_config.NumberColumn(format='%.2f', width='medium')
+STOCK_COLUMNS = {'Date': DATE, 'Open': PRICE, 'High': PRICE, 'Low': PRICE, 'Close': PRICE,
+                 'Adj Close': PRICE, 'Volume': st.column_config.NumberColumn(format='%d', width='medium')}
+PREDICTION_COLUMNS = {'Date': DATE, 'Original Price': PRICE, 'Predicted Price': PRICE,
+                      'Difference': PRICE, CHANGE: PRICE}
+
+
+def prediction_table(forecast):
+    """Original vs. predicted price per trading day, with the difference and % change.
+
+    `forecast` is the frame from pipeline.predict_test_slice (Date index).
+    """
+    original = forecast['Original Price'].to_numpy(dtype='float64')
+    predicted = forecast['Predicted Price'].to_numpy(dtype='float64')
+    change = np.divide(predicted - original, original, out=np.full_like(original, np.nan),
+                       where=original != 0) * 100
+    return pd.DataFrame({
+        'Original Price': original,
+        'Predicted Price': predicted,
+        'Difference': np.abs(predicted - original),
+        CHANGE: change,
+    }, index=forecast.index)
+
+
+def sort_order(frame, column, ascending=True):
+    """Row positions of `frame` sorted by `column` (or the index), NaNs last."""
+    values = frame.index if column == frame.index.name else frame[column]
+    values = np.asarray(values)
+    if values.dtype.kind in 'fiu':
+        values = values.astype('float64')
+        # Negating keeps NaNs at the end for a descending sort too
+        return np.argsort(values if ascending else -values, kind='stable')
+    order = np.argsort(values, kind='stable')
+    return order if ascending else order[::-1]
+
+
+def page(frame, number, size, column=None, ascending=True):
+    """Rows of page `number` (from 1) after sorting; only that page is copied."""
+    start = (number - 1) * size
+    if column is None:
+        return frame.iloc[start:start + size]
+    return frame.iloc[sort_order(frame, column, ascending)[start:start + size]]
+
+
+def paged_table(frame, key, column_config=None, default_sort=None, ascending=False, height=500):
+    """Render `frame` one page at a time with sort and page controls above it."""
+    index_name = frame.index.name or 'index'
+    frame = frame.rename_axis(index_name)
+    columns = [index_name] + list(frame.columns)
+    sort_col, order_col, size_col, page_col = st.columns([3, 2, 2, 2])
+    column = sort_col.selectbox('Sort by', columns, key=key + '_sort',
+                                index=columns.index(default_sort or index_name))
+    order = order_col.selectbox('Order', ['Descending', 'Ascending'], key=key + '_order',
+                                index=1 if ascending else 0)
+    size = size_col.selectbox('Rows per page', PAGE_SIZES, index=1, key=key + '_size')
+    pages = max(1, -(-len(frame) // size))
+    number = page_col.number_input('Page', min_value=1, max_value=pages, value=1, step=1,
+                                   key=key + '_page')
+
+    rows = page(frame, min(number, pages), size, column, order == 'Ascending')
+    table = pa.Table.from_pandas(rows.reset_index(), preserve_index=False)
+    st.dataframe(table, height=height, hide_index=True, column_config=column_config)
+    first = (min(number, pages) - 1) * size
+    st.caption('Rows %d-%d of %d' % (min(first + 1, len(frame)), first + len(rows), len(frame)))
@@ -0,0 +1,32 @@
+# Tests for batching.MicroBatcher
+#
+#   python -m pytest -q test_batching.py
+import threading
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+def test_requests_with_different_lookbacks_share_a_batcher():
+    calls = []
+
+    def predict(x):
+        calls.append(x.shape)
+        return x[:, -1, :]
+
+    batcher = MicroBatcher(predict, max_wait_ms=200)
+    inputs = {i: np.random.default_rng(i).random((3, n, 1), dtype='float32')
+              for i, n in enumerate((100, 100, 60))}
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher(inputs[i])))
+               for i in inputs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i, x in inputs.items():
+        np.testing.assert_array_equal(results[i], x[:, -1, :])
+    assert sorted(calls) == [(3, 60, 1), (6, 100, 1)]
+    assert batcher.stats()['errors'] == 0
@@ -0,0 +1,185 @@
+# Tests for fetcher.py: backends, retries, coalescing and rate limiting
+#
+#   python -m pytest -q test_fetcher.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fetcher
+from fetcher import AsyncFetcher, FetchError, FileBackend, YahooBackend, fetch_many
+from price_store import PriceStore
+
+
+def _bars(start='2024-01-01', days=20):
+    index = pd.bdate_range(start, periods=days, name='Date')
+    close = np.linspace(100, 120, days)
+    return pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                         'Adj Close': close, 'Volume': np.full(days, 1e6)}, index=index)
+
+
+class StubBackend:
+    """Fails the first `failures` calls per symbol with `error`, then returns bars."""
+
+    def __init__(self, failures=0, error=None, delay=0.0):
+        self.failures = failures
+        self.error = error or FetchError('HTTP 503', 503, retryable=True)
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def fetch(self, symbol, start, end, pool=None):
+        with self._lock:
+            self.calls.append((symbol, start, end))
+            failed = sum(1 for call in self.calls if call[0] == symbol) <= self.failures
+        time.sleep(self.delay)
+        if failed:
+            raise self.error
+        bars = _bars()
+        return bars.loc[(bars.index >= start) & (bars.index < end)]
+
+
+def _fetcher(backend, **options):
+    options = dict({'concurrency': 4, 'rate': 0, 'retries': 3, 'backoff': 0.001}, **options)
+    return AsyncFetcher(backend, **options)
+
+
+def test_file_backend_reads_parquet_and_csv(tmp_path):
+    _bars().to_parquet(tmp_path / 'AAA.parquet')
+    _bars().to_csv(tmp_path / 'BBB.csv')
+    backend = FileBackend(str(tmp_path))
+
+    for symbol in ('AAA', 'bbb'):
+        data = backend.fetch(symbol, '2024-01-08', '2024-01-15')
+        assert list(data.index) == list(pd.bdate_range('2024-01-08', '2024-01-12'))
+    with pytest.raises(FetchError) as info:
+        backend.fetch('CCC', '2024-01-01', '2024-02-01')
+    assert not info.value.retryable
+
+
+def test_file_backend_through_fetch_many(tmp_path):
+    _bars().to_parquet(tmp_path / 'AAA.parquet')
+    requests = [('AAA', pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01')),
+                ('ZZZ', pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01'))]
+    results = fetch_many(requests, _fetcher(FileBackend(str(tmp_path))))
+
+    assert len(results[requests[0]]) == 20
+    assert isinstance(results[requests[1]], FetchError)
+
+
+def test_transient_failures_are_retried():
+    backend = StubBackend(failures=2)
+    instance = _fetcher(backend)
+    results = fetch_many([('AAA', '2024-01-01', '2024-02-01')], instance)
+
+    assert len(next(iter(results.values()))) == 20
+    assert len(backend.calls) == 3
+    assert instance.stats['retries'] == 2 and instance.stats['failures'] == 0
+
+
+def test_retries_are_bounded_and_permanent_errors_not_retried():
+    backend = StubBackend(failures=10)
+    instance = _fetcher(backend, retries=2)
+    result = next(iter(fetch_many([('AAA', '2024-01-01', '2024-02-01')], instance).values()))
+    assert isinstance(result, FetchError) and len(backend.calls) == 3
+
+    backend = StubBackend(failures=1, error=FetchError('not found', 404))
+    result = next(iter(fetch_many([('AAA', '2024-01-01', '2024-02-01')], _fetcher(backend)).values()))
+    assert isinstance(result, FetchError) and len(backend.calls) == 1
+
+
+def test_duplicate_requests_share_one_download():
+    backend = StubBackend(delay=0.05)
+    instance = _fetcher(backend)
+
+    async def run():
+        return await asyncio.gather(*(instance.fetch('AAA', '2024-01-01', '2024-02-01')
+                                                    for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(backend.calls) == 1 and instance.stats['coalesced'] == 4
+    assert all(result is results[0] for result in results)
+
+
+def test_rate_limit_spaces_requests():
+    backend = StubBackend()
+    instance = _fetcher(backend, rate=20)
+    requests = [('S%d' % i, '2024-01-01', '2024-02-01') for i in range(30)]
+    started = time.perf_counter()
+    fetch_many(requests, instance)
+    # A burst of 20, then 10 more at 20 per second
+    assert time.perf_counter() - started >= 0.4
+    assert len(backend.calls) == 30
+
+
+def test_fetcher_can_be_reused_across_event_loops():
+    instance = _fetcher(StubBackend(), rate=100)
+    for _ in range(2):
+        results = fetch_many([('AAA', '2024-01-01', '2024-02-01')], instance)
+        assert not isinstance(next(iter(results.values())), Exception)
+    instance.close()
+
+
+class ChartHandler(BaseHTTPRequestHandler):
+    """Serves Yahoo chart JSON for _bars(), 503 on the first request of each symbol."""
+
+    protocol_version = 'HTTP/1.1'
+    seen = set()
+
+    def do_GET(self):
+        symbol = self.path.split('?')[0].rsplit('/', 1)[-1]
+        if symbol not in self.seen:
+            self.seen.add(symbol)
+            return self._send(503, b'{}')
+        bars = _bars()
+        result = {'meta': {'gmtoffset': -18000},
+                  'timestamp': [int(ts.timestamp()) + 14.5 * 3600 + 18000 for ts in bars.index],
+                  'indicators': {'quote': [{key.lower(): bars[key].tolist()
+                                            for key in ('Open', 'High', 'Low', 'Close', 'Volume')}],
+                                 'adjclose': [{'adjclose': bars['Adj Close'].tolist()}]}}
+        self._send(200, json.dumps({'chart': {'result': [result], 'error': None}}).encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_yahoo_backend_against_a_local_stand_in():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ChartHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = YahooBackend('http://127.0.0.1:%d/chart' % server.server_address[1])
+        instance = _fetcher(backend, concurrency=2)
+        requests = [(symbol, '2024-01-01', '2024-02-01') for symbol in ('AAA', 'BBB', 'CCC')]
+        results = fetch_many(requests, instance)
+        instance.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for request in requests:
+        data = results[request]
+        assert list(data.index) == list(_bars().index)
+        np.testing.assert_allclose(data['Close'], _bars()['Close'])
+    assert instance.stats['retries'] == 3
+    # Keep-alive: connections are reused, at most one per concurrent slot
+    assert instance.pool.opened <= 2
+
+
+def test_refresh_closes_the_fetcher_it_creates(tmp_path, monkeypatch):
+    closed = []
+    monkeypatch.setattr(fetcher.AsyncFetcher, 'close', lambda self: closed.append(self))
+    store = PriceStore(str(tmp_path), lambda symbol, lo, hi: _bars(lo, 5))
+    assert store.refresh(['AAA', 'BBB'], '2024-01-01', '2024-01-08') == {}
+    assert len(closed) == 1
@@ -0,0 +1,46 @@
+# Parity of the NumPy runtime with Keras (bench_runtime.py compares their speed)
+#
+#   python -m pytest -q test_numpy_runtime.py
+import os
+
+import numpy as np
+import pytest
+
+from export_model import export, parity, quantize
+from numpy_runtime import NumpyModel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOLERANCE = 1e-5
+
+keras = pytest.importorskip('keras')
+
+
+def test_shipped_bundle_matches_keras_model():
+    model = keras.models.load_model(os.path.join(HERE, 'stock_data.keras'))
+    runtime = NumpyModel(os.path.join(HERE, 'stock_data.npz'))
+    assert parity(model, runtime, runtime.input_shape[1]) < TOLERANCE
+
+
+@pytest.mark.parametrize('layer', ['LSTM', 'GRU'])
+def test_export_matches_keras(tmp_path, layer):
+    recurrent = getattr(keras.layers, layer)
+    model = keras.Sequential([keras.Input((30, 1)), recurrent(16, return_sequences=True), keras.layers.Dropout(0.2),
+                              recurrent(8), keras.layers.Dense(1)])
+    path = str(tmp_path / 'model.npz')
+    export(model, path)
+    assert parity(model, NumpyModel(path), 30) < TOLERANCE
+
+
+@pytest.mark.parametrize('weights', ['float16', 'int8'])
+def test_quantize_keeps_biases_in_float32(tmp_path, weights):
+    model = keras.Sequential([keras.Input((30, 1)), keras.layers.GRU(8), keras.layers.Dense(1)])
+    source, target = str(tmp_path / 'model.npz'), str(tmp_path / 'model.q.npz')
+    export(model, source)
+    quantize(source, target, weights)
+
+    bundle = np.load(target)
+    # GRU bias is (2, 3 * units): input and recurrent bias
+    assert bundle['layer0_2'].shape == (2, 24) and bundle['layer0_2'].dtype == np.float32
+    assert bundle['layer1_1'].dtype == np.float32
+    assert bundle['layer0_0'].dtype == np.dtype(weights)
+    assert parity(NumpyModel(source), NumpyModel(target), 30) < 0.05
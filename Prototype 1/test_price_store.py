@@ -0,0 +1,56 @@
+# Tests for price_store.PriceStore coverage
+#
+#   python -m pytest -q test_price_store.py
+import pandas as pd
+import pytest
+
+from price_store import DownloadError, PriceStore, load_many
+
+
+def _bars(start, end):
+    index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name='Date')
+    return pd.DataFrame({'Close': range(len(index))}, index=index, dtype='float64')
+
+
+def test_empty_download_is_fetched_again(tmp_path):
+    responses = [pd.DataFrame(), _bars('2024-01-01', '2024-02-01')]
+    store = PriceStore(str(tmp_path), lambda symbol, lo, hi: responses.pop(0))
+
+    assert store.load('AAA', '2024-01-01', '2024-02-01').empty
+    assert store.missing('AAA', '2024-01-01', '2024-02-01') == [(pd.Timestamp('2024-01-01'),
+                                                                 pd.Timestamp('2024-02-01'))]
+    assert len(store.load('AAA', '2024-01-01', '2024-02-01')) == 23
+    assert store.missing('AAA', '2024-01-01', '2024-02-01') == []
+    assert store.provider_calls == 2
+
+
+def test_failed_download_keeps_stored_bars(tmp_path):
+    def provider(symbol, lo, hi):
+        if lo >= pd.Timestamp('2024-02-01'):
+            raise DownloadError('offline')
+        return _bars(lo, hi)
+
+    store = PriceStore(str(tmp_path), provider)
+    store.load('AAA', '2024-01-01', '2024-02-01')
+    assert len(store.load('AAA', '2024-01-01', '2024-03-01')) == 23
+    assert store.missing('AAA', '2024-01-01', '2024-03-01') == [(pd.Timestamp('2024-02-01'),
+                                                                 pd.Timestamp('2024-03-01'))]
+    with pytest.raises(DownloadError):
+        store.load('AAA', '2024-02-01', '2024-03-01')
+
+
+def test_weekend_gap_is_covered_without_a_request(tmp_path):
+    store = PriceStore(str(tmp_path), lambda symbol, lo, hi: pytest.fail('provider called'))
+    assert store.load('AAA', '2024-01-06', '2024-01-08').empty
+    assert store.missing('AAA', '2024-01-06', '2024-01-08') == []
+
+
+def test_load_many_skips_failed_symbols(tmp_path):
+    def provider(symbol, lo, hi):
+        if symbol == 'FB':
+            raise DownloadError('FB: no rows')
+        return _bars(lo, hi)
+
+    frames, skipped = load_many(['AAA', 'FB', 'BBB'], '2024-01-01', '2024-02-01', PriceStore(str(tmp_path), provider))
+    assert list(frames) == ['AAA', 'BBB']
+    assert skipped == {'FB': 'FB: no rows'}
@@ -0,0 +1,40 @@
+# Tests for the ASHA bookkeeping and data split of tune.py
+#
+#   python -m pytest -q test_tune.py
+import numpy as np
+
+from tune import ASHA, split_series
+
+
+def _result(trial, val_loss, status='done'):
+    return {'trial': trial, 'val_loss': val_loss, 'status': status}
+
+
+def test_stopped_trials_do_not_hold_promotion_slots():
+    configs = [{'trial': 't%d' % i} for i in range(6)]
+    scheduler = ASHA(configs, [2, 6], eta=3)
+    while scheduler.pending:
+        scheduler.next_job()
+    # The two best results stopped early; the quota of 6 // 3 = 2 goes to live trials
+    for trial, loss, status in [('t0', 0.1, 'early_stopped'), ('t1', 0.2, 'diverged'), ('t2', 0.3, 'done'),
+                                ('t3', 0.4, 'done'), ('t4', 0.5, 'done'), ('t5', 0.6, 'done')]:
+        scheduler.report(0, _result(trial, loss, status))
+
+    promoted = []
+    while True:
+        job = scheduler.next_job()
+        if job is None:
+            break
+        promoted.append((job[0]['trial'], job[1]))
+    assert promoted == [('t2', 1), ('t3', 1)]
+
+
+def test_scaler_is_fitted_on_the_train_part_only():
+    buffer = np.concatenate([np.linspace(10, 20, 100), np.linspace(0, 50, 50)]).astype('float32')
+    train, valid = split_series(buffer, [100, 50], lookback=10, validation=0.2)
+
+    for values in train:
+        assert values.min() == 0 and values.max() == 1
+    # Validation values outside the train range are not squeezed into [0, 1]
+    assert valid[1].max() > 1
+    assert len(valid[0]) == 20 + 10
@@ -0,0 +1,216 @@
+# Faster variants of a model, measured and recorded for select_variant()
+#
+#   python variants.py --model stock_data.npz --quantize float16 int8 --distill
+#   python variants.py --model stock_data.npz --list
+#
+# Builds, next to each other under models/variants/:
+#
+#   <name>.float16.npz, <name>.int8.npz   the bundle with its weights stored at
+#                                         lower precision (export_model.quantize)
+#   <name>.gru<units>.keras / .npz        a one-layer GRU student trained on the
+#                                         teacher's outputs for the training
+#                                         windows, blended with the real next
+#                                         close by --alpha
+#
+# Every variant, and the model itself, is then evaluated on the test slices of
+# the symbols (MAE / RMSE in price units, and MAE against the teacher) and
+# timed at several batch sizes on this machine, and the numbers are written to
+# models/variants/variants.json. Variants share the teacher's scalers.
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import WindowSource
+from model_registry import SERVING_MODEL, VARIANT_DIR, get_model, record_variant, variants_for
+from pipeline import prepare, split_train_test
+from price_store import load_many
+from scaling import MinMax, load_scalers, save_scalers, scaler_for
+from symbols import unique_symbols
+
+LOOKBACK = 100
+BATCHES = (1, 32, 256, 1024)
+
+
+def _variant_path(model_path, suffix, variant_dir=VARIANT_DIR):
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(variant_dir, '%s.%s' % (name, suffix))
+
+
+def build_quantized(model_path, weights, variant_dir=VARIANT_DIR):
+    """float16 or int8 copy of the .npz bundle `model_path`; returns its path."""
+    from export_model import quantize
+
+    if not model_path.endswith('.npz'):
+        raise ValueError('quantization works on the .npz export, not %s' % model_path)
+    os.makedirs(variant_dir, exist_ok=True)
+    target = _variant_path(model_path, weights + '.npz', variant_dir)
+    quantize(model_path, target, weights)
+    save_scalers(target, load_scalers(model_path))
+    return target
+
+
+def _load(symbols, start, end, store):
+    frames, skipped = load_many(symbols, start, end, store)
+    for symbol, reason in skipped.items():
+        print('skipped %s: %s' % (symbol, reason))
+    return frames
+
+
+def training_windows(model_path, symbols, start, end, lookback=LOOKBACK, store=None):
+    """(x, y) over the training slices of `symbols`, scaled as inference scales them."""
+    frames = _load(symbols, start, end, store)
+    series = []
+    for symbol, data in frames.items():
+        if 'Close' not in data or len(data) <= 2 * lookback:
+            continue
+        data_train, _ = split_train_test(data['Close'], lookback=lookback)
+        values = np.array(data_train.iloc[:, 0], dtype='float32')
+        scaler_for(symbol, model_path, values).transform(values, out=values)
+        series.append(values)
+    source = WindowSource(series, lookback)
+    return source.gather(source.starts)
+
+
+def student_model(lookback=LOOKBACK, units=32):
+    from keras.layers import GRU, Dense, Input
+    from keras.models import Sequential
+
+    model = Sequential([Input(shape=(lookback, 1)), GRU(units), Dense(1)])
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def distill(model_path, symbols, start, end, units=32, epochs=30, batch_size=256, alpha=0.8,
+            lookback=LOOKBACK, variant_dir=VARIANT_DIR, seed=0):
+    """Train a GRU student on the teacher's predictions; returns the student's .npz path."""
+    from keras.callbacks import EarlyStopping
+
+    from export_model import export
+
+    x, y = training_windows(model_path, symbols, start, end, lookback)
+    if not len(x):
+        raise ValueError('no training windows for %s' % ', '.join(symbols))
+    teacher = np.asarray(get_model(model_path).predict(x, batch_size=4096, verbose=0))[:, 0]
+    target = alpha * teacher + (1 - alpha) * y
+    # Shuffle before fit so the validation split is not just the last symbol
+    order = np.random.default_rng(seed).permutation(len(x))
+
+    student = student_model(lookback, units)
+    student.fit(x[order], target[order], epochs=epochs, batch_size=batch_size, validation_split=0.1,
+                verbose=0, callbacks=[EarlyStopping(patience=3, restore_best_weights=True)])
+
+    os.makedirs(variant_dir, exist_ok=True)
+    path = _variant_path(model_path, 'gru%d.npz' % units, variant_dir)
+    student.save(os.path.splitext(path)[0] + '.keras')
+    export(student, path)
+    save_scalers(path, load_scalers(model_path))
+    return path
+
+
+def test_windows(model_path, symbols, start, end, lookback=LOOKBACK, store=None):
+    """Test-slice (x, y, scaler) of every symbol stacked; scaler de-scales each row's symbol."""
+    frames = _load(symbols, start, end, store)
+    xs, ys, scalers = [], [], []
+    for symbol, data in frames.items():
+        if 'Close' not in data or len(data) <= 2 * lookback:
+            continue
+        x, y, scaler, _ = prepare(data['Close'], lookback, symbol=symbol, model_path=model_path)
+        if len(x):
+            xs.append(x)
+            ys.append(y)
+            scalers.append(scaler)
+    if not xs:
+        raise ValueError('no test windows for %s' % ', '.join(symbols))
+    return (np.concatenate(xs).astype('float32', copy=False), np.concatenate(ys),
+            MinMax.stack(scalers, [len(y) for y in ys]))
+
+
+def latency(model, lookback=LOOKBACK, batches=BATCHES, repeat=5):
+    """{batch size: median predict latency in ms}."""
+    rng = np.random.default_rng(0)
+    result = {}
+    for batch in batches:
+        x = rng.uniform(0, 1, (batch, lookback, 1)).astype('float32')
+        model.predict(x, verbose=0)
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            model.predict(x, verbose=0)
+            runs.append(time.perf_counter() - started)
+        result[batch] = 1e3 * float(np.median(runs))
+    return result
+
+
+def evaluate(path, kind, x, y, scaler, teacher=None, lookback=LOOKBACK):
+    """Registry entry for the variant at `path`: accuracy on (x, y) and latency."""
+    model = get_model(path)
+    predicted = scaler.inverse(np.asarray(model.predict(x, verbose=0), dtype='float64')[:, 0])
+    actual = scaler.inverse(np.asarray(y, dtype='float64'))
+    timings = latency(model, lookback)
+    entry = {
+        'path': path,
+        'kind': kind,
+        'bytes': os.path.getsize(path),
+        'mae': float(np.mean(np.abs(predicted - actual))),
+        'rmse': float(np.sqrt(np.mean((predicted - actual) ** 2))),
+        'teacher_mae': float(np.mean(np.abs(predicted - teacher))) if teacher is not None else 0.0,
+        'latency_ms': {str(batch): ms for batch, ms in timings.items()},
+        'windows_per_s': max(batch / ms * 1e3 for batch, ms in timings.items()),
+        'eval_windows': int(len(x)),
+        'measured_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+    return entry, predicted
+
+
+def show(model_path):
+    entries = variants_for(model_path)
+    if not entries:
+        print('no variants recorded for %s' % model_path)
+    for name, entry in sorted(entries.items(), key=lambda item: item[1]['mae']):
+        latency_text = ' '.join('b%s=%.1fms' % item for item in entry['latency_ms'].items())
+        print('%-10s mae %.3f rmse %.3f vs teacher %.3f | %s | %.0f windows/s | %d KB | %s'
+              % (name, entry['mae'], entry['rmse'], entry['teacher_mae'], latency_text,
+                 entry['windows_per_s'], entry['bytes'] // 1024, entry['path']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build, measure and record faster model variants.')
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--quantize', nargs='*', choices=['float16', 'int8'], default=[])
+    parser.add_argument('--distill', action='store_true', help='train a GRU student')
+    parser.add_argument('--units', type=int, default=32, help='GRU units of the student')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--alpha', type=float, default=0.8,
+                        help='weight of the teacher output vs. the real close in the student target')
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--start', default='2012-01-01')
+    parser.add_argument('--end', default='2022-12-21')
+    parser.add_argument('--list', action='store_true', help='only print the recorded variants')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        show(args.model)
+        return
+    symbols = unique_symbols(args.symbols) if args.symbols else unique_symbols()
+    built = {'float32': args.model}
+    for weights in args.quantize:
+        built[weights] = build_quantized(args.model, weights)
+    if args.distill:
+        built['gru%d' % args.units] = distill(args.model, symbols, args.start, args.end,
+                                              args.units, args.epochs, alpha=args.alpha)
+
+    x, y, scaler = test_windows(args.model, symbols, args.start, args.end)
+    teacher = None
+    for name, path in built.items():
+        entry, predicted = evaluate(path, name, x, y, scaler, teacher)
+        if teacher is None:
+            teacher = predicted
+        record_variant(args.model, name, entry)
+    show(args.model)
+
+
+if __name__ == '__main__':
+    main()
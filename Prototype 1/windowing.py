@@ -0,0 +1,47 @@
+# Sliding-window builder for the LSTM input
+#
+# The windows are strided views over the scaled price series, so building the
+# (n, lookback, 1) input costs no copies no matter how long the history is.
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _as_series(values):
+    values = np.asarray(values)
+    if values.ndim == 2:
+        # (n, 1) column as returned by MinMaxScaler
+        values = values[:, 0]
+    if values.ndim != 1:
+        raise ValueError('expected a 1-D series or an (n, 1) column, got shape %s' % (values.shape,))
+    return values
+
+
+def sliding_windows(values, lookback=100):
+    """Every `lookback`-long window of the series as a read-only (n, lookback, 1) view."""
+    values = _as_series(values)
+    if len(values) < lookback:
+        return np.empty((0, lookback, 1), dtype=values.dtype)
+    return sliding_window_view(values, lookback)[:, :, np.newaxis]
+
+
+def make_windows(values, lookback=100, horizon=1):
+    """Model inputs and targets, `horizon` steps after the end of each window.
+
+    Same result as the loop in the notebook and app.py
+    (x = values[i - lookback:i], y = values[i + horizon - 1]) but as views.
+    """
+    if horizon < 1:
+        raise ValueError('horizon must be at least 1')
+    values = _as_series(values)
+    n = max(len(values) - lookback - horizon + 1, 0)
+    x = sliding_windows(values, lookback)[:n]
+    y = values[lookback + horizon - 1:]
+    return x, y
+
+
+def iter_batches(values, lookback=100, horizon=1, batch_size=1024):
+    """Yield contiguous (x, y) batches lazily, for histories too big to feed at once."""
+    x, y = make_windows(values, lookback, horizon)
+    for lo in range(0, len(x), batch_size):
+        hi = lo + batch_size
+        yield np.ascontiguousarray(x[lo:hi]), np.ascontiguousarray(y[lo:hi])
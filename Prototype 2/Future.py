@@ -0,0 +1,66 @@
+# Import Libraries
+import pandas as pd
+import streamlit as st
+from charts import matplotlib_line_chart
+from forecast import forecast_future
+from model_registry import SERVING_MODEL, select_variant
+from price_store import load_many
+import service_client
+import snapshots
+from symbols import STOCK_SYMBOLS
+
+# Set up Streamlit page configuration
+st.set_page_config(
+    page_title='Future Stock Price Forecast',
+    page_icon='📈',
+    layout='wide',
+    initial_sidebar_state='expanded'
+)
+
+# Sidebar
+st.sidebar.header('Future Stock Price Forecast')
+stocks = st.sidebar.multiselect('Select | Search Stock Symbols', STOCK_SYMBOLS, default=['GOOG'])
+start = st.sidebar.text_input('History Start Date', '2022-01-01')
+end = st.sidebar.text_input('History End Date', str(pd.Timestamp.today().date()))
+days = st.sidebar.slider('Days Ahead', min_value=1, max_value=60, value=30)
+
+# Snapshot published by scheduler.py after the last close, if it covers every
+# selected symbol for this date range
+views = {stock: snapshots.lookup(stock, start, end) for stock in stocks}
+precomputed = bool(views) and all(view is not None and view.future is not None for view in views.values())
+
+# Fetch stock data; symbols whose download fails are left out with a warning
+if precomputed:
+    frames, skipped = {stock: view.prices for stock, view in views.items()}, {}
+else:
+    frames, skipped = load_many(stocks, start, end)
+for stock, reason in skipped.items():
+    st.warning('No price data for %s: %s' % (stock, reason))
+closes = {stock: data['Close'] for stock, data in frames.items() if 'Close' in data}
+
+# Forecast all selected symbols together (one batched model call per day), on
+# the prediction service when PREDICTION_SERVICE_URL is set
+if precomputed:
+    future = pd.DataFrame({stock: view.future.iloc[:days] for stock, view in views.items()})
+elif service_client.SERVICE_URL and closes:
+    future = service_client.forecast(list(closes), start, end, steps=days)
+else:
+    model_path = select_variant(SERVING_MODEL)
+    future = forecast_future(closes, steps=days, model_path=model_path)
+
+if future.empty:
+    st.warning('Not enough price history for the selected symbols.')
+    st.stop()
+
+for stock in future.columns:
+    st.markdown('<hr>', unsafe_allow_html=True)
+    st.subheader('%s | Next %d Days Forecast' % (stock, days))
+    history = closes[stock].tail(200)
+    st.image(matplotlib_line_chart([
+        ('Closing Price', history, 'g'),
+        ('Forecast Price', future[stock].dropna(), 'r'),
+    ], '%s | Next %d Days Forecast' % (stock, days)), width='stretch')
+
+st.markdown('<hr>', unsafe_allow_html=True)
+st.subheader('Forecast Price (USD)')
+st.dataframe(future, height=500, width=900)
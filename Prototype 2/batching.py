@@ -0,0 +1,160 @@
+# Micro-batching of model calls
+#
+# Threads that each want a prediction for a small batch of windows hand it to a
+# MicroBatcher instead of calling the model. A single worker thread waits up to
+# `max_wait_ms` for more requests (or until `max_batch` rows are queued), runs
+# one forward pass per window shape over them (requests with different
+# lookbacks are batched separately) and hands every caller its own rows back.
+# BatchedModel wraps this in the model interface (predict / predict_on_batch),
+# so pipeline.predict_test_slice and forecast.rollout can use it unchanged.
+#
+# Each batcher keeps the size, queue wait and end-to-end latency of its recent
+# batches; metrics() reports queue depth, batch sizes and latency percentiles
+# for every batcher in the process (served at /metrics by service.py).
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+import instrument
+from model_registry import SERVING_MODEL, get_model
+
+MAX_BATCH = int(os.environ.get('BATCH_MAX_SIZE', 4096))
+MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+WINDOW = 1024  # recent batches / requests kept for the percentiles
+
+
+def _percentiles(values, scale=1.0):
+    if not values:
+        return {}
+    p50, p90, p99 = np.percentile(np.asarray(values) * scale, (50, 90, 99))
+    return {'p50': p50, 'p90': p90, 'p99': p99, 'max': max(values) * scale}
+
+
+class MicroBatcher:
+    def __init__(self, predict, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0}
+        self._batch_rows = deque(maxlen=WINDOW)
+        self._batch_requests = deque(maxlen=WINDOW)
+        self._latencies = deque(maxlen=WINDOW)
+        self._model_times = deque(maxlen=WINDOW)
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, x):
+        """Queue (n, ...) inputs; the Future resolves to the model output for those n rows."""
+        future = Future()
+        self._queue.put((np.asarray(x, dtype='float32'), future, time.perf_counter()))
+        return future
+
+    def __call__(self, x):
+        return self.submit(x).result()
+
+    def _collect(self):
+        # Block for the first request, then gather more until the deadline or size cap
+        first = self._queue.get()
+        pending, rows = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            rows += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            # Windows of different lengths cannot share a forward pass
+            groups = {}
+            for item in pending:
+                groups.setdefault(item[0].shape[1:], []).append(item)
+            for group in groups.values():
+                self._predict(group)
+
+    def _predict(self, pending):
+        started = time.perf_counter()
+        try:
+            x = pending[0][0] if len(pending) == 1 else np.concatenate([item[0] for item in pending])
+            out = np.asarray(self.predict(x))
+        except Exception as exc:
+            with self._lock:
+                self.counts['errors'] += 1
+            for _, future, _ in pending:
+                future.set_exception(exc)
+            return
+        finished = time.perf_counter()
+        with self._lock:
+            self.counts['requests'] += len(pending)
+            self.counts['rows'] += len(x)
+            self.counts['batches'] += 1
+            self._batch_rows.append(len(x))
+            self._batch_requests.append(len(pending))
+            self._model_times.append(finished - started)
+            self._latencies.extend(finished - submitted for _, _, submitted in pending)
+        instrument.observe('batch.rows', len(x))
+        instrument.observe('batch.requests', len(pending))
+        offset = 0
+        for inputs, future, _ in pending:
+            future.set_result(out[offset:offset + len(inputs)])
+            offset += len(inputs)
+
+    def stats(self):
+        """Counters, queue depth and percentiles over the last WINDOW batches (times in ms)."""
+        with self._lock:
+            return dict(self.counts,
+                        queue_depth=self._queue.qsize(),
+                        batch_rows=_percentiles(self._batch_rows),
+                        batch_requests=_percentiles(self._batch_requests),
+                        model_ms=_percentiles(self._model_times, 1e3),
+                        latency_ms=_percentiles(self._latencies, 1e3))
+
+
+class BatchedModel:
+    """Model-like front end that routes every call through a shared MicroBatcher."""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    def predict_on_batch(self, x):
+        return self.batcher(x)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return self.batcher(x)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def batched_model(path=SERVING_MODEL):
+    """BatchedModel over get_model(path), one batcher per model file per process."""
+    key = os.path.abspath(path)
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None:
+            # get_model is looked up per batch so a retrained model file is picked up
+            batcher = _batchers[key] = MicroBatcher(
+                lambda x: get_model(path).predict_on_batch(x))
+    return BatchedModel(batcher)
+
+
+def metrics():
+    """{model path: MicroBatcher.stats()} for every batcher in this process."""
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {path: batcher.stats() for path, batcher in batchers.items()}
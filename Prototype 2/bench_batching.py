@@ -0,0 +1,61 @@
+# Benchmark: one model call per session vs. batching.MicroBatcher
+#
+#   python bench_batching.py [--model stock_data.npz] [--sessions 16] [--calls 20] [--rows 8]
+#
+# `sessions` threads each make `calls` predictions on (rows, 100, 1) windows,
+# either straight on the shared model or through a MicroBatcher, and the
+# throughput plus the batcher's own metrics are reported.
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from batching import MicroBatcher
+from model_registry import SERVING_MODEL, get_model
+
+
+def run(predict, sessions, calls, rows):
+    x = np.random.default_rng(0).uniform(0, 1, (rows, 100, 1)).astype('float32')
+    latencies = []
+
+    def session():
+        for _ in range(calls):
+            started = time.perf_counter()
+            predict(x)
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sessions * calls * rows / elapsed, np.percentile(latencies, (50, 99)) * 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--sessions', type=int, default=16)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    model = get_model(args.model)
+    lock = threading.Lock()
+
+    def direct(x):
+        # The shared model serializes callers anyway; the lock makes that explicit
+        with lock:
+            return model.predict_on_batch(x)
+
+    batcher = MicroBatcher(model.predict_on_batch, max_wait_ms=args.max_wait_ms)
+    for name, predict in (('direct', direct), ('batched', batcher)):
+        windows_per_s, (p50, p99) = run(predict, args.sessions, args.calls, args.rows)
+        print('%-7s | %8.0f windows/s | latency p50 %7.1f ms, p99 %7.1f ms'
+              % (name, windows_per_s, p50, p99))
+    print(json.dumps(batcher.stats(), indent=1, default=float))
@@ -0,0 +1,80 @@
+# Benchmark: full-resolution charts vs. charts.py (downsampled, Scattergl)
+#
+#   python bench_charts.py [rows ...]
+#
+# Reports build + serialization time and payload size for the Plotly figures
+# of Prototype 1 (JSON sent to the browser) and the matplotlib figures of
+# Prototype 2 (PNG sent to the browser), for the three-trace moving-average chart.
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from charts import matplotlib_line_chart, plotly_line_chart
+from indicators import moving_averages
+
+
+def synthetic_close(rows):
+    index = pd.bdate_range('1980-01-01', periods=rows, name='Date')
+    steps = np.random.default_rng(0).normal(0, 0.01, rows)
+    return pd.Series(100 * np.exp(np.cumsum(steps)), index=index)
+
+
+def plotly_full(traces):
+    # What app.py did before: one go.Scatter per series at full resolution
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for name, series, color in traces:
+        fig.add_trace(go.Scatter(x=series.index, y=series, mode='lines', name=name,
+                                 line=dict(color=color, width=2)))
+    fig.update_layout(xaxis_title='Date', yaxis_title='Price (USD)', hovermode='x unified',
+                      template='plotly_white', width=1800, height=700)
+    return fig
+
+
+def matplotlib_full(traces):
+    import io
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(30, 15))
+    for name, series, color in traces:
+        plt.plot(series.index, series, color[0], label=name)
+    plt.grid(True)
+    plt.legend()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def run(rows):
+    close = synthetic_close(rows)
+    ma_100, ma_200 = moving_averages(close, (100, 200)).values()
+    traces = [('100-Day MA', ma_100, 'red'), ('200-Day MA', ma_200, 'blue'), ('Closing Price', close, 'green')]
+    mpl_traces = [(name, series, color[0]) for name, series, color in traces]
+
+    before, t_before = timed(lambda: plotly_full(traces).to_json())
+    after, t_after = timed(lambda: plotly_line_chart(traces).to_json())
+    print('%8d rows | plotly     | before %8.1f ms %9.1f KiB | after %7.1f ms %7.1f KiB'
+          % (rows, t_before * 1e3, len(before) / 1024, t_after * 1e3, len(after) / 1024))
+
+    before, t_before = timed(lambda: matplotlib_full(mpl_traces))
+    after, t_after = timed(lambda: matplotlib_line_chart(mpl_traces, 'bench'))
+    print('%8d rows | matplotlib | before %8.1f ms %9.1f KiB | after %7.1f ms %7.1f KiB'
+          % (rows, t_before * 1e3, len(before) / 1024, t_after * 1e3, len(after) / 1024))
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [500, 2520, 10000, 100000]:
+        run(rows)
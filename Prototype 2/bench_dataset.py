@@ -0,0 +1,82 @@
+# Benchmark: materialized window arrays (notebook) vs. dataset.window_dataset
+#
+#   python bench_dataset.py [--symbols 20] [--rows 2500] [--fit-samples 2048]
+#
+# Each mode runs in a fresh interpreter. Reported: resident memory added by
+# building the training inputs, input-pipeline throughput (one full pass), and
+# model.fit throughput on the first --fit-samples samples.
+import argparse
+import json
+import subprocess
+import sys
+
+WORKER = r'''
+import json, resource, sys, time
+import numpy as np
+import tensorflow as tf
+from dataset import window_dataset
+from train import build_model
+from windowing import make_windows
+
+mode, symbols, rows, fit_samples, batch_size = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), 32
+rng = np.random.default_rng(0)
+series = [rng.uniform(0, 1, rows).astype('float32') for _ in range(symbols)]
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS'):
+                return int(line.split()[1]) / 1024
+
+base = rss_mb()
+started = time.perf_counter()
+if mode == 'arrays':
+    # The notebook path: every window copied into one dense array
+    pairs = [make_windows(values) for values in series]
+    x = np.concatenate([np.array(p[0]) for p in pairs])
+    y = np.concatenate([np.array(p[1]) for p in pairs])
+    samples = len(x)
+    ds = tf.data.Dataset.from_tensor_slices((x, y)).shuffle(samples).batch(batch_size)
+    fit_args = (x[:fit_samples], y[:fit_samples])
+    fit_kwargs = {'batch_size': batch_size}
+else:
+    ds = window_dataset(series, batch_size=batch_size)
+    samples = sum(len(values) - 100 for values in series)
+    fit_args = (ds.take(fit_samples // batch_size),)
+    fit_kwargs = {}
+built = time.perf_counter()
+inputs_mb = rss_mb() - base
+
+t = time.perf_counter()
+for _ in ds:
+    pass
+pipeline_sps = samples / (time.perf_counter() - t)
+
+model = build_model()
+model.fit(*fit_args, epochs=1, verbose=0, **fit_kwargs)  # trace once
+t = time.perf_counter()
+model.fit(*fit_args, epochs=1, verbose=0, **fit_kwargs)
+fit_sps = fit_samples / (time.perf_counter() - t)
+
+print(json.dumps({'samples': samples, 'build_s': built - started, 'inputs_mb': inputs_mb,
+                  'pipeline_sps': pipeline_sps, 'fit_sps': fit_sps,
+                  'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def run(mode, symbols, rows, fit_samples):
+    out = subprocess.run([sys.executable, '-c', WORKER, mode, str(symbols), str(rows), str(fit_samples)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=2500)
+    parser.add_argument('--fit-samples', type=int, default=2048)
+    args = parser.parse_args()
+    for mode in ('arrays', 'dataset'):
+        r = run(mode, args.symbols, args.rows, args.fit_samples)
+        print('%-7s | %7d samples | inputs +%7.1f MB | max RSS %6.0f MB | pipeline %9.0f samples/s | fit %6.0f samples/s'
+              % (mode, r['samples'], r['inputs_mb'], r['max_rss_mb'], r['pipeline_sps'], r['fit_sps']))
@@ -0,0 +1,96 @@
+# Benchmark: peak memory of the intraday pipeline as the history grows
+#
+#   python bench_intraday.py [--years 1 2 4] [--rule 15min] [--model stock_data.npz]
+#
+# For each history length, synthetic 1-minute bars (390 per business day, a
+# seeded random walk) are ingested one month at a time into a temporary store
+# with intraday.ingest, then run through intraday.predict_symbol (resample,
+# scale, window, predict, write) and, for comparison, through the same steps
+# on one in-memory frame. Each step runs in a fresh interpreter, so its peak
+# RSS is its own. The streaming columns should stay flat as --years grows.
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+WORKER = r'''
+import json, resource, sys, time
+mode, root, years, rule, model = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5]
+import numpy as np
+import pandas as pd
+import intraday
+started = time.perf_counter()
+if mode == 'ingest':
+    from bench_intraday import synthetic_months
+    rows = intraday.ingest('SYN', synthetic_months(years), '1m', root)
+elif mode == 'stream':
+    rows = intraday.predict_symbol('SYN', '1m', rule, model_path=model, output=root + '/out.parquet', root=root)
+else:
+    from model_registry import get_model
+    from windowing import make_windows
+    bars = pd.concat(list(intraday.iter_bars('SYN', '1m', root=root)))
+    bars = bars.resample(rule).agg(intraday.AGGREGATE).dropna(subset=['Close'])
+    scaler = intraday.MinMax.fit(bars['Close'])
+    x, _ = make_windows(scaler.transform(bars['Close'].to_numpy()).astype('float32'))
+    predicted = get_model(model).predict(np.ascontiguousarray(x), verbose=0)
+    rows = len(predicted)
+print(json.dumps({'rows': int(rows), 'seconds': time.perf_counter() - started,
+                  'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def synthetic_months(years, seed=0):
+    """One frame of 1-minute bars per month over `years` years, 09:30-16:00 on business days."""
+    rng = np.random.default_rng(seed)
+    price = 100.0
+    for month in pd.period_range(end='2024-01', periods=12 * years, freq='M'):
+        days = pd.bdate_range(month.start_time, month.end_time)
+        index = (days.repeat(390) + pd.Timedelta(hours=9, minutes=30)
+                 + pd.to_timedelta(np.tile(np.arange(390), len(days)), unit='min'))
+        close = price * np.exp(np.cumsum(rng.normal(0, 0.0008, len(index))))
+        price = close[-1]
+        spread = np.abs(rng.normal(0, 0.0005, len(index))) * close
+        yield pd.DataFrame({'Open': close, 'High': close + spread, 'Low': close - spread,
+                            'Close': close, 'Volume': rng.integers(100, 10_000, len(index)).astype('float64')},
+                           index=index)
+
+
+def run(mode, root, years, rule, model):
+    out = subprocess.run([sys.executable, '-c', WORKER, mode, root, str(years), rule, model],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    from model_registry import SERVING_MODEL
+
+    parser = argparse.ArgumentParser(description='Peak RSS of intraday ingestion and inference vs. history length.')
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rule', default='15min')
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for years in args.years:
+        with tempfile.TemporaryDirectory() as root:
+            result = {'years': years}
+            for mode in ('ingest', 'stream', 'in_memory'):
+                result[mode] = run(mode, root, years, args.rule, args.model)
+        results.append(result)
+        print('%d years | %8d 1m bars | ingest %6.0f MB %5.1fs | stream %6.0f MB %5.1fs | in-memory %6.0f MB %5.1fs'
+              % (years, result['ingest']['rows'],
+                 result['ingest']['max_rss_mb'], result['ingest']['seconds'],
+                 result['stream']['max_rss_mb'], result['stream']['seconds'],
+                 result['in_memory']['max_rss_mb'], result['in_memory']['seconds']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
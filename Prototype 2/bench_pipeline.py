@@ -0,0 +1,182 @@
+# Benchmark: every stage of the app.py pipeline, offline
+#
+#   python bench_pipeline.py [--rows 500 2520 10000] [--symbols 1 10] [--repeat 3]
+#                            [--fixture price_data] [--output bench_pipeline.json]
+#                            [--compare old.json]
+#
+# Synthetic OHLCV series (a seeded random walk) are written to a temporary
+# price store, or the Parquet files of an existing store are used with
+# --fixture, so nothing touches the network. For each history length and
+# symbol count the stages below run once per symbol, as a page load does, and
+# the median over --repeat runs is reported:
+#
+#   load        PriceStore.load from disk
+#   scale       train/test split and scaler fit + transform
+#   windows     window construction
+#   predict     model.predict on the test windows
+#   descale     inverse scaling of predictions and targets
+#   indicators  50/100/200-day moving averages
+#   plotly      Prototype 1 figure, built and serialized to JSON
+#   matplotlib  Prototype 2 figure, rendered to PNG
+#
+# The JSON output records the commit and library versions; --compare prints
+# the ratio to an earlier output so regressions show up between commits.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from charts import matplotlib_line_chart, plotly_line_chart
+from indicators import moving_averages
+from model_registry import SERVING_MODEL, get_model
+from pipeline import descale, split_train_test
+from price_store import PriceStore
+from scaling import MinMax
+from windowing import make_windows
+
+STAGES = ['load', 'scale', 'windows', 'predict', 'descale', 'indicators', 'plotly', 'matplotlib']
+
+
+def synthetic_ohlcv(rows, seed=0):
+    """Daily bars for `rows` business days with the columns the store keeps."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end='2024-01-01', periods=rows, name='Date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, rows)))
+    spread = np.abs(rng.normal(0, 0.01, rows)) * close
+    open_ = close * (1 + rng.normal(0, 0.005, rows))
+    return pd.DataFrame({
+        'Open': open_, 'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread, 'Close': close, 'Adj Close': close,
+        'Volume': rng.integers(1e6, 5e7, rows).astype('float64'),
+    }, index=index)
+
+
+def make_store(root, symbols, rows, fixture=None):
+    """A PriceStore under `root` holding `rows` days for each symbol; returns (store, names)."""
+    names = []
+    for i in range(symbols):
+        if fixture:
+            files = sorted(name for name in os.listdir(fixture) if name.endswith('.parquet'))
+            source = files[i % len(files)]
+            bars = pd.read_parquet(os.path.join(fixture, source)).tail(rows)
+        else:
+            bars = synthetic_ohlcv(rows, seed=i)
+        name = 'SYM%03d' % i
+        path = os.path.join(root, name)
+        bars.to_parquet(path + '.parquet')
+        with open(path + '.json', 'w') as f:
+            json.dump({'covered': [[str(bars.index[0].date()),
+                                    str((bars.index[-1] + pd.Timedelta(days=1)).date())]]}, f)
+        names.append(name)
+    return PriceStore(root, offline=True), names
+
+
+def page_load(store, name, model, timings):
+    """One symbol through the app.py stages, adding each stage's time to `timings`."""
+    def timed(stage, func):
+        started = time.perf_counter()
+        result = func()
+        timings[stage] += time.perf_counter() - started
+        return result
+
+    data = timed('load', lambda: store.load(name, '1900-01-01', '2100-01-01'))
+    close = data['Close']
+
+    def scale():
+        data_train, data_test = split_train_test(close)
+        scaler = MinMax.fit(data_train.to_numpy())
+        values = np.array(data_test.iloc[:, 0], dtype='float32')
+        return scaler, scaler.transform(values, out=values)
+
+    scaler, scaled = timed('scale', scale)
+    x, y = timed('windows', lambda: make_windows(scaled, lookback=100))
+    predicted = timed('predict', lambda: model.predict(x, verbose=0)[:, 0])
+    predicted, y = timed('descale', lambda: (descale(predicted, scaler), descale(y, scaler)))
+    ma_50, ma_100, ma_200 = timed('indicators', lambda: moving_averages(close, (50, 100, 200)).values())
+    timed('plotly', lambda: plotly_line_chart([
+        ('100-Day MA', ma_100, 'red'), ('200-Day MA', ma_200, 'blue'), ('Closing Price', close, 'green'),
+    ]).to_json())
+    timed('matplotlib', lambda: matplotlib_line_chart([
+        ('100-Day MA', ma_100, 'r'), ('200-Day MA', ma_200, 'b'), ('Closing Price', close, 'g'),
+    ], 'bench'))
+
+
+def run_case(rows, symbols, model, repeat, fixture=None):
+    with tempfile.TemporaryDirectory() as root:
+        store, names = make_store(root, symbols, rows, fixture)
+        page_load(store, names[0], model, dict.fromkeys(STAGES, 0.0))  # warm-up
+        runs = []
+        for _ in range(repeat):
+            timings = dict.fromkeys(STAGES, 0.0)
+            for name in names:
+                page_load(store, name, model, timings)
+            runs.append(timings)
+    stages = {stage: float(np.median([run[stage] for run in runs])) for stage in STAGES}
+    return {'rows': rows, 'symbols': symbols, 'stages_s': stages, 'total_s': sum(stages.values())}
+
+
+def environment(model_path):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import matplotlib
+    import plotly
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'matplotlib': matplotlib.__version__,
+            'plotly': plotly.__version__, 'cpus': os.cpu_count(), 'model': model_path,
+            'created_at': pd.Timestamp.now().isoformat(timespec='seconds')}
+
+
+def compare(results, baseline):
+    """Print new / old time per stage for the cases present in both outputs."""
+    old = {(case['rows'], case['symbols']): case for case in baseline['cases']}
+    print('vs. %s (ratio new / old, > 1 is slower)' % (baseline['environment'].get('commit'),))
+    for case in results['cases']:
+        before = old.get((case['rows'], case['symbols']))
+        if before is None:
+            continue
+        ratios = ' '.join('%s=%.2f' % (stage, case['stages_s'][stage] / max(before['stages_s'][stage], 1e-9))
+                          for stage in STAGES)
+        print('%7d rows x %3d symbols | %s' % (case['rows'], case['symbols'], ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time each stage of the app pipeline offline.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[500, 2520, 10000])
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--model', default=SERVING_MODEL)
+    parser.add_argument('--fixture', help='price store directory to take series from instead of synthetic ones')
+    parser.add_argument('--output', default='bench_pipeline.json')
+    parser.add_argument('--compare', help='earlier --output to compare against')
+    args = parser.parse_args(argv)
+
+    import matplotlib
+    matplotlib.use('Agg')
+    model = get_model(args.model)
+    results = {'environment': environment(args.model), 'cases': []}
+    for rows in args.rows:
+        for symbols in args.symbols:
+            case = run_case(rows, symbols, model, args.repeat, args.fixture)
+            results['cases'].append(case)
+            print('%7d rows x %3d symbols | %s | total %.3fs'
+                  % (rows, symbols, ' '.join('%s %.3f' % item for item in case['stages_s'].items()),
+                     case['total_s']))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('-> %s' % args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Micro-benchmark: Python append loop vs. windowing.make_windows
+#
+#   python bench_windowing.py [rows ...]
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from windowing import make_windows
+
+
+def loop_windows(values, lookback=100):
+    # The original code from app.py / Untitled.ipynb
+    x, y = [], []
+    for i in range(lookback, values.shape[0]):
+        x.append(values[i - lookback:i])
+        y.append(values[i, 0])
+    return np.array(x), np.array(y)
+
+
+def peak_bytes(func, *args):
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def run(rows):
+    values = np.random.default_rng(0).uniform(0, 1, (rows, 1))
+    x_loop, y_loop = loop_windows(values)
+    x_view, y_view = make_windows(values)
+    assert np.array_equal(x_loop, x_view) and np.array_equal(y_loop, y_view)
+
+    number = 5
+    t_loop = timeit.timeit(lambda: loop_windows(values), number=number) / number
+    t_view = timeit.timeit(lambda: make_windows(values), number=number) / number
+    m_loop = peak_bytes(loop_windows, values)
+    m_view = peak_bytes(make_windows, values)
+    print('%8d rows | loop %9.3f ms %9.1f KiB | view %7.3f ms %7.1f KiB | %6.0fx faster'
+          % (rows, t_loop * 1e3, m_loop / 1024, t_view * 1e3, m_view / 1024, t_loop / t_view))
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [600, 2700, 10000, 50000]:
+        run(rows)
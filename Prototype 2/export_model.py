@@ -0,0 +1,132 @@
+# Export a Keras model to a NumPy weight bundle for numpy_runtime.NumpyModel
+#
+#   python export_model.py stock_data.keras stock_data.npz
+#   python export_model.py stock_data.npz stock_data.int8.npz --quantize int8
+#
+# The export checks parity against Keras on random and real-looking windows and
+# fails if the outputs differ by more than --tolerance. --quantize rewrites an
+# existing bundle with float16 weights, or int8 weights with one scale per
+# output column, without TensorFlow; the parity check is then against the
+# float32 bundle and --tolerance is not enforced (variants.py measures the
+# effect on accuracy instead).
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from numpy_runtime import NumpyModel
+
+
+def export(model, path, dtype='float32'):
+    layers, arrays = [], {}
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ('LSTM', 'GRU'):
+            config = layer.get_config()
+            spec = {
+                'type': kind.lower(),
+                'units': config['units'],
+                'activation': config['activation'],
+                'recurrent_activation': config['recurrent_activation'],
+                'return_sequences': config['return_sequences'],
+            }
+        elif kind == 'Dense':
+            spec = {'type': 'dense', 'units': layer.units,
+                    'activation': layer.get_config()['activation']}
+        elif kind in ('Dropout', 'InputLayer'):
+            # Inference no-ops
+            continue
+        else:
+            raise ValueError('layer type %s is not supported by numpy_runtime' % kind)
+
+        weights = layer.get_weights()
+        spec['weights'] = [list(w.shape) for w in weights]
+        for k, w in enumerate(weights):
+            arrays['layer%d_%d' % (len(layers), k)] = w.astype(dtype)
+        layers.append(spec)
+
+    config = {
+        'input_shape': list(model.input_shape),
+        'dtype': dtype,
+        'layers': layers,
+    }
+    np.savez(path, config=json.dumps(config), **arrays)
+    return config
+
+
+def quantize(source, target, weights='int8'):
+    """Copy the bundle `source` to `target` with its matrices stored as float16 or int8.
+
+    Biases stay float32 (told apart by their position in the layer, as the
+    GRU bias is 2-D). int8 matrices are scaled symmetrically per output
+    column; NumpyModel expands them back to float32 when it loads the file.
+    """
+    if weights not in ('float16', 'int8'):
+        raise ValueError('weights must be float16 or int8')
+    bundle = np.load(source)
+    config = json.loads(str(bundle['config']))
+    # LSTM, GRU and Dense layers store their bias last (kernel, [recurrent kernel,] bias)
+    biases = {'layer%d_%d' % (i, len(layer['weights']) - 1) for i, layer in enumerate(config['layers'])}
+    arrays = {}
+    for key in bundle.files:
+        if key == 'config':
+            continue
+        w = bundle[key]
+        if key in biases:
+            arrays[key] = w.astype('float32')
+        elif weights == 'float16':
+            arrays[key] = w.astype('float16')
+        else:
+            scale = np.abs(w).max(axis=0, keepdims=True) / 127
+            scale[scale == 0] = 1
+            arrays[key] = np.round(w / scale).astype('int8')
+            arrays[key + '_scale'] = scale.astype('float32')
+    config['weights_dtype'] = weights
+    np.savez(target, config=json.dumps(config), **arrays)
+    return config
+
+
+def parity(model, runtime, lookback, samples=256, seed=0):
+    """Largest absolute difference between Keras (or a reference bundle) and NumPy outputs."""
+    rng = np.random.default_rng(seed)
+    noise = rng.uniform(0, 1, (samples, lookback, 1))
+    walks = np.cumsum(rng.normal(0, 0.02, (samples, lookback, 1)), axis=1)
+    walks = (walks - walks.min(axis=1, keepdims=True)) / np.ptp(walks, axis=1, keepdims=True)
+    x = np.concatenate([noise, walks]).astype('float32')
+    expected = model.predict(x, verbose=0)
+    actual = runtime.predict(x)
+    return float(np.max(np.abs(expected - actual)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export a Keras LSTM to a NumPy weight bundle.')
+    parser.add_argument('source', nargs='?', default='stock_data.keras')
+    parser.add_argument('target', nargs='?', default='stock_data.npz')
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    parser.add_argument('--quantize', choices=['float16', 'int8'],
+                        help='store the weights of an existing .npz bundle at lower precision')
+    args = parser.parse_args(argv)
+
+    if args.quantize:
+        config = quantize(args.source, args.target, args.quantize)
+        error = parity(NumpyModel(args.source), NumpyModel(args.target), config['input_shape'][1])
+        print('%s -> %s, %s weights, max abs diff vs float32 %.2e'
+              % (args.source, args.target, args.quantize, error))
+        return 0
+
+    from keras.models import load_model
+
+    model = load_model(args.source)
+    config = export(model, args.target)
+    error = parity(model, NumpyModel(args.target), config['input_shape'][1])
+    print('%s -> %s, %d layers, max abs diff vs keras %.2e'
+          % (args.source, args.target, len(config['layers']), error))
+    if error > args.tolerance:
+        print('parity check failed (tolerance %.0e)' % args.tolerance)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# Forecast result cache
+#
+# Forecasts are keyed by symbol, date range, lookback and content hashes of the
+# model file and its saved scalers, and kept in two tiers: an in-memory LRU shared by every session of
+# the server process, and Parquet files on disk shared between processes.
+# Both tiers evict by entry count / total size and by age (TTL).
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from model_registry import SERVING_MODEL
+from scaling import scaler_path
+
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', 'forecast_cache')
+MAX_ITEMS = int(os.environ.get('FORECAST_CACHE_ITEMS', 256))
+MAX_DISK_BYTES = int(os.environ.get('FORECAST_CACHE_BYTES', 256 * 1024 * 1024))
+TTL_SECONDS = float(os.environ.get('FORECAST_CACHE_TTL', 6 * 60 * 60))
+# Bumped when the way forecasts are computed changes (2: train-slice scaling)
+KEY_VERSION = 2
+
+_hashes = {}
+
+
+def model_hash(path=SERVING_MODEL):
+    """SHA-256 of the model file, recomputed only when the file changes."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    version = (path, stat.st_mtime, stat.st_size)
+    digest = _hashes.get(version)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        digest = _hashes[version] = sha.hexdigest()
+    return digest
+
+
+def forecast_key(symbol, start, end, lookback=100, model_path=SERVING_MODEL):
+    scalers = scaler_path(model_path)
+    parts = [KEY_VERSION, symbol.upper(), str(pd.Timestamp(start).date()), str(pd.Timestamp(end).date()),
+             int(lookback), model_hash(model_path),
+             model_hash(scalers) if os.path.exists(scalers) else None]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:32]
+
+
+class ForecastCache:
+    def __init__(self, root=CACHE_DIR, max_items=MAX_ITEMS,
+                 max_disk_bytes=MAX_DISK_BYTES, ttl=TTL_SECONDS):
+        self.root = root
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.root, key + '.parquet')
+
+    def _expired(self, stored_at):
+        return time.time() - stored_at > self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, frame = entry
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return frame
+                del self._memory[key]
+                self.counters['evictions'] += 1
+
+            path = self._path(key)
+            if os.path.exists(path):
+                stored_at = os.path.getmtime(path)
+                if not self._expired(stored_at):
+                    frame = pd.read_parquet(path)
+                    self._remember(key, stored_at, frame)
+                    self.counters['disk_hits'] += 1
+                    return frame
+                os.remove(path)
+                self.counters['evictions'] += 1
+
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, key, frame):
+        with self._lock:
+            self._remember(key, time.time(), frame)
+            os.makedirs(self.root, exist_ok=True)
+            path = self._path(key)
+            frame.to_parquet(path + '.tmp')
+            os.replace(path + '.tmp', path)
+            self._trim_disk()
+
+    def get_or_compute(self, key, compute):
+        frame = self.get(key)
+        if frame is None:
+            frame = compute()
+            self.put(key, frame)
+        return frame
+
+    def _remember(self, key, stored_at, frame):
+        self._memory[key] = (stored_at, frame)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _trim_disk(self):
+        # Drop expired files, then the oldest ones until under the size budget
+        files = []
+        for name in os.listdir(self.root):
+            if name.endswith('.parquet'):
+                path = os.path.join(self.root, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for stored_at, size, path in files:
+            if not self._expired(stored_at) and total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = lookups - self.counters['misses']
+            return dict(self.counters, memory_items=len(self._memory),
+                        hit_rate=hits / lookups if lookups else 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if os.path.isdir(self.root):
+                for name in os.listdir(self.root):
+                    if name.endswith('.parquet'):
+                        os.remove(os.path.join(self.root, name))
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ForecastCache()
+    return _default_cache
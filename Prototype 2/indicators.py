@@ -0,0 +1,154 @@
+# Technical indicators computed with NumPy over contiguous float64 arrays
+#
+# Every function accepts one series of shape (time,) or many symbols at once as
+# (symbols, time), and works along the last axis. A pandas Series in gives
+# Series out with the same index. All moving-average windows come from one
+# cumulative sum; EMA and RSI use a linear filter instead of a Python loop.
+import numpy as np
+import pandas as pd
+
+import instrument
+
+
+def _as_array(prices):
+    return np.ascontiguousarray(np.asarray(prices, dtype='float64'))
+
+
+def _wrap(prices, values):
+    if isinstance(prices, pd.Series):
+        return pd.Series(values, index=prices.index)
+    return values
+
+
+def _cumsum(values):
+    # Leading zero so a window sum is cs[t + 1] - cs[t + 1 - w]
+    out = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=out[..., 1:])
+    return out
+
+
+def _window_means(cs, window, length):
+    out = np.full(cs.shape[:-1] + (length,), np.nan)
+    if window <= length:
+        out[..., window - 1:] = (cs[..., window:] - cs[..., :-window]) / window
+    return out
+
+
+@instrument.traced('indicators')
+def moving_averages(prices, windows=(50, 100, 200)):
+    """Simple moving averages for several windows from a single cumulative sum.
+
+    Returns {window: values}, NaN until a window is full (like rolling().mean()).
+    """
+    values = _as_array(prices)
+    cs = _cumsum(values)
+    return {w: _wrap(prices, _window_means(cs, w, values.shape[-1])) for w in windows}
+
+
+def ema(prices, span=20):
+    """Exponential moving average, same as Series.ewm(span=span, adjust=False).mean()."""
+    values = _as_array(prices)
+    alpha = 2.0 / (span + 1.0)
+    return _wrap(prices, _ewm(values, alpha))
+
+
+def _ewm(values, alpha):
+    # y[t] = alpha * x[t] + (1 - alpha) * y[t - 1], starting from y[0] = x[0]
+    zi = (1.0 - alpha) * values[..., :1]
+    # scipy.signal takes most of a second to import, so only EMA / RSI pay for it
+    from scipy.signal import lfilter
+
+    out, _ = lfilter([alpha], [1.0, alpha - 1.0], values, axis=-1, zi=zi)
+    return out
+
+
+def bollinger_bands(prices, window=20, k=2.0):
+    """(lower, middle, upper) bands using the sample standard deviation."""
+    values = _as_array(prices)
+    length = values.shape[-1]
+    # Shift by the first price so the sums of squares do not lose precision
+    shifted = values - values[..., :1]
+    mean = _window_means(_cumsum(shifted), window, length)
+    mean_sq = _window_means(_cumsum(shifted * shifted), window, length)
+    var = np.maximum(mean_sq - mean * mean, 0.0) * window / max(window - 1, 1)
+    std = np.sqrt(var)
+    middle = mean + values[..., :1]
+    return (_wrap(prices, middle - k * std), _wrap(prices, middle), _wrap(prices, middle + k * std))
+
+
+def rsi(prices, period=14):
+    """Relative strength index with Wilder smoothing (alpha = 1 / period)."""
+    values = _as_array(prices)
+    delta = np.diff(values, axis=-1)
+    gain = _ewm(np.maximum(delta, 0.0), 1.0 / period)
+    loss = _ewm(np.maximum(-delta, 0.0), 1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = 100.0 - 100.0 / (1.0 + gain / loss)
+    out = np.where(loss == 0, 100.0, out)
+    out = np.concatenate([np.full(values.shape[:-1] + (1,), np.nan), out], axis=-1)
+    out[..., :period] = np.nan
+    return _wrap(prices, out)
+
+
+class IndicatorState:
+    """Moving averages, EMAs and RSI updated in O(windows) per new bar.
+
+    Seed it with the history of one or many symbols, then append() one price
+    per symbol; each call returns the latest indicator values.
+    """
+
+    def __init__(self, prices, windows=(50, 100, 200), spans=(20,), rsi_period=14):
+        values = _as_array(prices)
+        self.windows = tuple(windows)
+        self.spans = tuple(spans)
+        self.rsi_period = rsi_period
+        self.size = max(self.windows)
+        # Ring buffer of the last max(windows) prices, enough to drop old values from each sum
+        self.buffer = np.full(values.shape[:-1] + (self.size,), np.nan)
+        tail = values[..., -self.size:]
+        self.buffer[..., self.size - tail.shape[-1]:] = tail
+        self.head = 0
+        self.count = values.shape[-1]
+        self.sums = {w: values[..., -w:].sum(axis=-1) for w in self.windows}
+        self.emas = {s: ema(values, s)[..., -1] for s in self.spans}
+        delta = np.diff(values, axis=-1)
+        self.avg_gain = _ewm(np.maximum(delta, 0.0), 1.0 / rsi_period)[..., -1]
+        self.avg_loss = _ewm(np.maximum(-delta, 0.0), 1.0 / rsi_period)[..., -1]
+        self.last = values[..., -1]
+
+    def _oldest(self, window):
+        # Price that leaves a `window`-long sum when a new one arrives
+        return self.buffer[..., (self.head - window) % self.size]
+
+    def append(self, price):
+        price = np.asarray(price, dtype='float64')
+        for w in self.windows:
+            if self.count >= w:
+                self.sums[w] = self.sums[w] - self._oldest(w) + price
+            else:
+                self.sums[w] = self.sums[w] + price
+        self.buffer[..., self.head] = price
+        self.head = (self.head + 1) % self.size
+        self.count += 1
+
+        for s in self.spans:
+            alpha = 2.0 / (s + 1.0)
+            self.emas[s] = alpha * price + (1.0 - alpha) * self.emas[s]
+
+        alpha = 1.0 / self.rsi_period
+        delta = price - self.last
+        self.avg_gain = alpha * np.maximum(delta, 0.0) + (1.0 - alpha) * self.avg_gain
+        self.avg_loss = alpha * np.maximum(-delta, 0.0) + (1.0 - alpha) * self.avg_loss
+        self.last = price
+        return self.latest()
+
+    def latest(self):
+        out = {}
+        for w in self.windows:
+            out['MA%d' % w] = self.sums[w] / w if self.count >= w else np.full_like(self.last, np.nan)
+        for s in self.spans:
+            out['EMA%d' % s] = self.emas[s]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['RSI%d' % self.rsi_period] = np.where(
+                self.avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss))
+        return out
@@ -0,0 +1,291 @@
+# Timing spans, counters and a sampling profiler
+#
+# Pipeline stages are wrapped in spans:
+#
+#   with instrument.span('predict', rows=len(x)):
+#       ...
+#   @instrument.traced('prepare')
+#   def prepare(...): ...
+#
+# Each finished span adds to a per-name aggregate (count, total, max, recent
+# durations for percentiles), to the trace of the current page load (one per
+# thread, see begin_trace) and, if APP_TRACE_LOG is set, to a JSON-lines file.
+# count() and observe() keep counters and value distributions (cache hits,
+# batch sizes), and register() adds stats that other modules already keep.
+# snapshot() returns everything as a dict, prometheus_text() in the Prometheus
+# text format.
+#
+# Tracing is off unless APP_TRACE is set or enable() is called, both for the
+# whole process. enable_here() turns it on for the current context only (one
+# page run of one session, see debug_panel.py); other sessions and threads
+# stay untraced. While it is off, span() returns a shared no-op object and
+# count() / observe() return right away, so the instrumented code pays about
+# one function call.
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+ENABLED = os.environ.get('APP_TRACE', '') not in ('', '0')
+LOG_PATH = os.environ.get('APP_TRACE_LOG', '')
+WINDOW = 512  # recent durations / values kept per name for the percentiles
+
+_enabled = ENABLED
+_lock = threading.Lock()
+_spans = {}
+_counters = Counter()
+_observations = {}
+_collectors = {}
+_local = threading.local()
+_here = contextvars.ContextVar('instrument_here', default=False)
+
+
+def enable(on=True):
+    """Turn tracing on or off for the whole process."""
+    global _enabled
+    _enabled = on
+
+
+def enable_here(on=True):
+    """Turn tracing on or off for the current context (thread) only."""
+    _here.set(on)
+
+
+def enabled():
+    return _enabled or _here.get()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'attrs', 'started')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, time.perf_counter() - self.started, self.attrs, exc_type is not None)
+        return False
+
+
+def span(name, **attrs):
+    """Context manager timing the block under `name`; attrs go to the trace and log."""
+    return _Span(name, attrs) if _enabled or _here.get() else _NULL_SPAN
+
+
+def traced(name=None):
+    """Decorator wrapping every call of the function in a span."""
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (_enabled or _here.get()):
+                return func(*args, **kwargs)
+            with _Span(label, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    if _enabled or _here.get():
+        with _lock:
+            _counters[name] += n
+
+
+def observe(name, value):
+    """Record one value of a distribution, e.g. a batch size."""
+    if _enabled or _here.get():
+        with _lock:
+            item = _observations.get(name)
+            if item is None:
+                item = _observations[name] = [0, 0.0, deque(maxlen=WINDOW)]
+            item[0] += 1
+            item[1] += value
+            item[2].append(value)
+
+
+def register(name, collect):
+    """Include `collect()` (a dict of numbers, possibly one level nested) in snapshots."""
+    _collectors[name] = collect
+
+
+def _record(name, seconds, attrs, failed):
+    with _lock:
+        item = _spans.get(name)
+        if item is None:
+            item = _spans[name] = [0, 0.0, 0.0, 0, deque(maxlen=WINDOW)]
+        item[0] += 1
+        item[1] += seconds
+        item[2] = max(item[2], seconds)
+        item[3] += failed
+        item[4].append(seconds)
+    event = dict(attrs, span=name, ms=seconds * 1e3)
+    if failed:
+        event['error'] = True
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.append(event)
+    if LOG_PATH:
+        event = dict(event, ts=time.time(), thread=threading.current_thread().name)
+        with _lock, open(LOG_PATH, 'a') as f:
+            f.write(json.dumps(event, default=str) + '\n')
+
+
+def begin_trace():
+    """Start collecting this thread's spans, e.g. at the top of a page run."""
+    _local.trace = []
+
+
+def current_trace():
+    """Spans finished in this thread since begin_trace(), in order."""
+    return list(getattr(_local, 'trace', None) or [])
+
+
+def _summary(values, scale=1.0):
+    p50, p90, p99 = np.percentile(np.asarray(values) * scale, (50, 90, 99))
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99)}
+
+
+def snapshot():
+    with _lock:
+        spans = {name: dict(count=c, total_s=total, mean_ms=total / c * 1e3, max_ms=peak * 1e3,
+                            errors=errors, **{k + '_ms': v for k, v in _summary(recent, 1e3).items()})
+                 for name, (c, total, peak, errors, recent) in _spans.items()}
+        observations = {name: dict(count=c, mean=total / c, **_summary(recent))
+                        for name, (c, total, recent) in _observations.items()}
+        counters = dict(_counters)
+    collected = {}
+    for name, collect in list(_collectors.items()):
+        try:
+            collected[name] = collect()
+        except Exception as exc:
+            collected[name] = {'error': repr(exc)}
+    return {'enabled': enabled(), 'spans': spans, 'counters': counters,
+            'observations': observations, 'collectors': collected}
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _observations.clear()
+
+
+def _metric(text):
+    return ''.join(c if c.isalnum() else '_' for c in text).strip('_')
+
+
+def prometheus_text(prefix='app'):
+    """snapshot() in the Prometheus text exposition format."""
+    snap = snapshot()
+    lines = []
+    for kind, unit in (('count', ''), ('total_s', '_seconds'), ('max_ms', '_max_ms'), ('p90_ms', '_p90_ms')):
+        metric = '%s_span%s%s' % (prefix, unit, '_count' if kind == 'count' else '')
+        lines.append('# TYPE %s %s' % (metric, 'counter' if kind in ('count', 'total_s') else 'gauge'))
+        for name, item in snap['spans'].items():
+            lines.append('%s{span="%s"} %r' % (metric, name, float(item[kind])))
+    for name, value in snap['counters'].items():
+        lines.append('# TYPE %s_%s_total counter' % (prefix, _metric(name)))
+        lines.append('%s_%s_total %r' % (prefix, _metric(name), float(value)))
+    for name, item in snap['observations'].items():
+        metric = '%s_%s' % (prefix, _metric(name))
+        lines.append('# TYPE %s summary' % metric)
+        for q in ('p50', 'p90', 'p99'):
+            lines.append('%s{quantile="0.%s"} %r' % (metric, q[1:], item[q]))
+        lines.append('%s_count %r' % (metric, float(item['count'])))
+        lines.append('%s_sum %r' % (metric, item['mean'] * item['count']))
+    for collector, values in snap['collectors'].items():
+        for key, value in values.items():
+            items = value.items() if isinstance(value, dict) else [('', value)]
+            for sub, number in items:
+                if isinstance(number, (int, float)) and not isinstance(number, bool):
+                    name = '_'.join(part for part in (prefix, collector, key, sub) if part)
+                    lines.append('%s %r' % (_metric(name), float(number)))
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every `interval` seconds from a background thread.
+
+    Cheap enough to leave on for a page load; stats() gives the functions seen
+    most often on top of the stack (self), with the share of samples
+    that had them anywhere on the stack (total).
+    """
+
+    def __init__(self, interval=0.005, thread=None, depth=40):
+        self.interval = interval
+        self.target = (thread or threading.current_thread()).ident
+        self.depth = depth
+        self.samples = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append('%s:%s' % (os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def stats(self, top=20):
+        """[(function, self fraction, total fraction)] for the `top` most frequent functions."""
+        own, total = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            own[stack[-1]] += n
+            for function in set(stack):
+                total[function] += n
+        samples = max(self.samples, 1)
+        return [(function, n / samples, total[function] / samples) for function, n in own.most_common(top)]
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph tools."""
+        return '\n'.join('%s %d' % (';'.join(stack), n) for stack, n in self.stacks.most_common())
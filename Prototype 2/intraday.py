@@ -0,0 +1,270 @@
+# Out-of-core intraday bars
+#
+# Intraday history (1m / 5m bars over years and many symbols) does not fit in
+# one pandas frame, so it is stored and processed one calendar month at a time:
+#
+#   intraday_data/<interval>/<SYMBOL>/<YYYY-MM>.parquet
+#
+# ingest() takes any iterable of bar frames (CSV chunks, Yahoo requests of a
+# few days each) and merges every chunk into the monthly partitions it
+# touches. iter_bars() reads the partitions back one at a time, and the
+# processing steps are generators over those chunks:
+#
+#   resample_chunks   OHLCV bars at a coarser fixed frequency ('15min', '1h', '1D'),
+#                     carrying the last, possibly incomplete, bucket into the next chunk
+#   fit_minmax        the scaler from a streaming min / max over the training range
+#   predict_chunks    scaled sliding windows (the last `lookback` values carried
+#                     across chunks) through the model in fixed-size batches
+#
+# Memory is bounded by one month of bars plus one batch of windows, however
+# long the history is; bench_intraday.py checks that peak RSS stays flat.
+#
+#   python intraday.py ingest --symbols AAPL --interval 1m --csv AAPL_1m.csv
+#   python intraday.py ingest --symbols AAPL MSFT --interval 5m --start 2024-01-01
+#   python intraday.py predict --symbol AAPL --interval 1m --rule 15min --output aapl_15min.parquet
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from model_registry import SERVING_MODEL, get_model
+from scaling import MinMax, load_scalers
+from windowing import make_windows
+
+INTRADAY_DIR = os.environ.get('INTRADAY_DIR', 'intraday_data')
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+AGGREGATE = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+# Yahoo serves at most this many days of 1m bars per request
+YAHOO_DAYS = 7
+
+
+def partition_dir(symbol, interval, root=INTRADAY_DIR):
+    return os.path.join(root, interval, symbol.upper())
+
+
+def _normalize(bars):
+    bars = bars[[column for column in COLUMNS if column in bars]].astype('float64')
+    bars.index = pd.DatetimeIndex(bars.index, name='Datetime')
+    if bars.index.tz is not None:
+        bars.index = bars.index.tz_localize(None)
+    return bars
+
+
+def write_month(path, bars):
+    """Merge `bars` (one month) into the partition file at `path`, newer rows winning."""
+    if os.path.exists(path):
+        bars = pd.concat([pd.read_parquet(path), bars])
+    bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+    bars.to_parquet(path + '.tmp', compression='zstd')
+    os.replace(path + '.tmp', path)
+
+
+def ingest(symbol, chunks, interval='1m', root=INTRADAY_DIR):
+    """Write an iterable of bar frames to the monthly partitions; returns the rows written."""
+    directory = partition_dir(symbol, interval, root)
+    os.makedirs(directory, exist_ok=True)
+    rows = 0
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        chunk = _normalize(chunk)
+        for month, bars in chunk.groupby(chunk.index.to_period('M')):
+            write_month(os.path.join(directory, '%s.parquet' % month), bars)
+        rows += len(chunk)
+    return rows
+
+
+def csv_chunks(path, chunksize=500_000):
+    """Bars from a large CSV (first column the timestamp), `chunksize` rows at a time."""
+    for chunk in pd.read_csv(path, index_col=0, parse_dates=True, chunksize=chunksize):
+        yield chunk.rename(columns=str.title)
+
+
+def yahoo_chunks(symbol, start, end, interval='1m', days=YAHOO_DAYS, backend=None):
+    """Intraday bars from the Yahoo chart API, one request per `days` days."""
+    from fetcher import ConnectionPool, YahooBackend
+
+    backend = backend or YahooBackend(interval=interval)
+    pool = ConnectionPool()
+    try:
+        for lo in pd.date_range(start, end, freq='%dD' % days):
+            hi = min(lo + pd.Timedelta(days=days), pd.Timestamp(end))
+            yield backend.fetch(symbol, lo, hi, pool)
+    finally:
+        pool.close()
+
+
+def partitions(symbol, interval='1m', start=None, end=None, root=INTRADAY_DIR):
+    """Partition files of `symbol` overlapping [start, end), oldest first."""
+    directory = partition_dir(symbol, interval, root)
+    if not os.path.isdir(directory):
+        return []
+    first = pd.Timestamp(start).to_period('M') if start is not None else None
+    last = pd.Timestamp(end).to_period('M') if end is not None else None
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.parquet'):
+            continue
+        month = pd.Period(name[:-len('.parquet')], 'M')
+        if (first is None or month >= first) and (last is None or month <= last):
+            paths.append(os.path.join(directory, name))
+    return paths
+
+
+def iter_bars(symbol, interval='1m', start=None, end=None, columns=None, root=INTRADAY_DIR):
+    """The bars of `symbol` in [start, end), one monthly frame at a time."""
+    for path in partitions(symbol, interval, start, end, root):
+        bars = pd.read_parquet(path, columns=columns)
+        if start is not None:
+            bars = bars.loc[bars.index >= pd.Timestamp(start)]
+        if end is not None:
+            bars = bars.loc[bars.index < pd.Timestamp(end)]
+        if len(bars):
+            yield bars
+
+
+def resample_chunks(chunks, rule='15min'):
+    """OHLCV bars of each chunk resampled to `rule`, buckets spanning chunks merged.
+
+    `rule` is a fixed frequency; buckets are [label, label + rule).
+    """
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        aggregate = {column: how for column, how in AGGREGATE.items() if column in chunk}
+        bars = chunk.resample(rule, label='left', closed='left').agg(aggregate).dropna(subset=['Close'])
+        if not len(bars):
+            carry = chunk
+            continue
+        # The last bucket may continue in the next chunk
+        carry = chunk.loc[chunk.index >= bars.index[-1]]
+        if len(bars) > 1:
+            yield bars.iloc[:-1]
+    if carry is not None and len(carry):
+        aggregate = {column: how for column, how in AGGREGATE.items() if column in carry}
+        yield carry.resample(rule, label='left', closed='left').agg(aggregate).dropna(subset=['Close'])
+
+
+def fit_minmax(chunks, column='Close'):
+    """MinMax over `column` of every chunk, in one streaming pass."""
+    low, high = np.inf, -np.inf
+    for chunk in chunks:
+        values = chunk[column].to_numpy(dtype='float64')
+        if len(values):
+            low, high = min(low, np.nanmin(values)), max(high, np.nanmax(values))
+    if low > high:
+        raise ValueError('no data to fit the scaler on')
+    return MinMax(low, high)
+
+
+def predict_chunks(chunks, model, scaler, lookback=100, batch_size=4096, column='Close'):
+    """Next-bar predictions for every bar after the first `lookback`, chunk by chunk.
+
+    Yields frames indexed by the predicted bar's time, with the actual and the
+    predicted price. The last `lookback` scaled values of a chunk are carried
+    into the next one, so the windows are the same as over the whole series.
+    """
+    tail = np.empty(0, dtype='float32')
+    tail_index = pd.DatetimeIndex([])
+    for chunk in chunks:
+        scaled = np.array(chunk[column], dtype='float32')
+        scaler.transform(scaled, out=scaled)
+        values = np.concatenate([tail, scaled])
+        index = tail_index.append(chunk.index)
+        x, _ = make_windows(values, lookback)
+        if len(x):
+            predicted = np.empty(len(x), dtype='float64')
+            for lo in range(0, len(x), batch_size):
+                batch = np.ascontiguousarray(x[lo:lo + batch_size])
+                predicted[lo:lo + len(batch)] = np.asarray(model.predict(batch, verbose=0))[:, 0]
+            yield pd.DataFrame({
+                'Original Price': chunk[column].to_numpy(dtype='float64')[-len(x):],
+                'Predicted Price': scaler.inverse(predicted, out=predicted),
+            }, index=index[lookback:])
+        tail, tail_index = values[-lookback:], index[-lookback:]
+
+
+def predict_symbol(symbol, interval='1m', rule='15min', start=None, end=None, fit_end=None,
+                   model_path=SERVING_MODEL, lookback=100, output=None, root=INTRADAY_DIR):
+    """Stream one symbol's stored bars through resampling, scaling, windowing and the model.
+
+    The scaler is the one persisted for `symbol` next to the model, else a
+    streaming fit on the bars before `fit_end` (default: `start`, or all bars).
+    Predictions are appended to the Parquet file `output` chunk by chunk and
+    the number of rows is returned; without `output` they are returned as a frame.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    scaler = load_scalers(model_path).get(symbol)
+    if scaler is None:
+        scaler = fit_minmax(iter_bars(symbol, interval, None, fit_end or start, ['Close'], root))
+    model = get_model(model_path)
+    chunks = predict_chunks(resample_chunks(iter_bars(symbol, interval, start, end, root=root), rule),
+                            model, scaler, lookback)
+    if output is None:
+        frames = list(chunks)
+        return pd.concat(frames) if frames else pd.DataFrame(columns=['Original Price', 'Predicted Price'])
+
+    rows, writer = 0, None
+    try:
+        for frame in chunks:
+            table = pa.Table.from_pandas(frame.rename_axis('Datetime'))
+            if writer is None:
+                writer = pq.ParquetWriter(output + '.tmp', table.schema, compression='zstd')
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(output + '.tmp', output)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Chunked intraday ingestion and inference.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', help='write intraday bars to the monthly partitions')
+    ingest_parser.add_argument('--symbols', nargs='+', required=True)
+    ingest_parser.add_argument('--interval', default='1m')
+    ingest_parser.add_argument('--csv', nargs='*', help='one CSV per symbol instead of downloading')
+    ingest_parser.add_argument('--start', default=str((pd.Timestamp.today() - pd.Timedelta(days=28)).date()))
+    ingest_parser.add_argument('--end', default=str(pd.Timestamp.today().date()))
+    ingest_parser.add_argument('--chunksize', type=int, default=500_000, help='CSV rows per chunk')
+
+    predict_parser = commands.add_parser('predict', help='stream stored bars through the model')
+    predict_parser.add_argument('--symbol', required=True)
+    predict_parser.add_argument('--interval', default='1m')
+    predict_parser.add_argument('--rule', default='15min', help='bar size the model sees')
+    predict_parser.add_argument('--start')
+    predict_parser.add_argument('--end')
+    predict_parser.add_argument('--fit-end', help='bars before this fit the scaler (default --start)')
+    predict_parser.add_argument('--model', default=SERVING_MODEL)
+    predict_parser.add_argument('--output', required=True, help='.parquet file')
+
+    for parser_ in (ingest_parser, predict_parser):
+        parser_.add_argument('--root', default=INTRADAY_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        if args.csv and len(args.csv) != len(args.symbols):
+            parser.error('give one --csv file per symbol')
+        for i, symbol in enumerate(args.symbols):
+            if args.csv:
+                chunks = csv_chunks(args.csv[i], args.chunksize)
+            else:
+                chunks = yahoo_chunks(symbol, args.start, args.end, args.interval)
+            rows = ingest(symbol, chunks, args.interval, args.root)
+            print('%s: %d %s bars -> %s' % (symbol, rows, args.interval, partition_dir(symbol, args.interval, args.root)))
+    else:
+        rows = predict_symbol(args.symbol, args.interval, args.rule, args.start, args.end, args.fit_end,
+                              args.model, output=args.output, root=args.root)
+        print('%s: %d predictions -> %s' % (args.symbol, rows, args.output))
+
+
+if __name__ == '__main__':
+    main()
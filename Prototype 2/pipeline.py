@@ -0,0 +1,73 @@
+# Data preparation shared by app.py and the batch jobs
+import numpy as np
+import pandas as pd
+
+import instrument
+from model_registry import SERVING_MODEL, get_model
+from scaling import scaler_for
+from windowing import make_windows
+
+
+def split_train_test(close, split=0.80, lookback=100):
+    """Train and test slices of the closing prices, as in the notebook.
+
+    The test slice is prefixed with the last `lookback` training rows so the
+    first test day already has a full window behind it.
+    """
+    close = pd.Series(close).astype('float64')
+    cut = int(len(close) * split)
+    data_train = pd.DataFrame(close[0: cut])
+    data_test = pd.DataFrame(close[cut: len(close)])
+    past_days = data_train.tail(lookback)
+    return data_train, pd.concat([past_days, data_test], ignore_index=True)
+
+
+def enough_history(close, lookback=100, split=0.80):
+    """Whether prepare() gets at least one test window out of `close`.
+
+    The one check the app, the service and the batch jobs use to decide
+    which symbols can be predicted.
+    """
+    rows = len(close)
+    return int(rows * split) > 0 and rows > max(int(rows * split), lookback)
+
+
+@instrument.traced('prepare')
+def prepare(close, lookback=100, split=0.80, symbol=None, model_path=SERVING_MODEL):
+    """Scaled model inputs and targets for the test slice.
+
+    The scaler is the one persisted for `symbol` next to the model, else one
+    fitted on the training slice only (never on the test slice).
+    Returns (x, y, scaler, dates), where dates are the trading days of the
+    targets in y.
+    """
+    close = pd.Series(close)
+    data_train, data_test = split_train_test(close, split, lookback)
+    scaler = scaler_for(symbol, model_path, data_train.to_numpy())
+    data_test_scaled = np.array(data_test.iloc[:, 0], dtype='float32')
+    scaler.transform(data_test_scaled, out=data_test_scaled)
+    x, y = make_windows(data_test_scaled, lookback=lookback)
+    # The first target follows the first full window: the cut, or `lookback`
+    # when the training slice is shorter than one window
+    dates = close.index[max(int(len(close) * split), lookback):]
+    return x, y, scaler, dates
+
+
+def descale(values, scaler):
+    return scaler.inverse(np.asarray(values, dtype='float64'))
+
+
+def predict_test_slice(close, model_path=SERVING_MODEL, lookback=100, split=0.80, symbol=None, model=None):
+    """Original vs. predicted closing prices for the test slice, indexed by date.
+
+    `model` overrides the one loaded from `model_path` (e.g. a batching.BatchedModel);
+    `model_path` still selects the scalers.
+    """
+    x, y, scaler, dates = prepare(close, lookback, split, symbol, model_path)
+    with instrument.span('predict', rows=len(x)):
+        predict = np.asarray((model or get_model(model_path)).predict(x, verbose=0))[:, 0]
+    with instrument.span('descale'):
+        return pd.DataFrame({
+            'Original Price': descale(y, scaler),
+            'Predicted Price': descale(predict, scaler),
+        }, index=pd.DatetimeIndex(dates[:len(y)], name='Date'))
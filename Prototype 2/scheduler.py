@@ -0,0 +1,127 @@
+# Market-close scheduler for the precomputed snapshots
+#
+#   python scheduler.py              # worker: refresh and publish after every close
+#   python scheduler.py --once       # refresh and publish now, then exit
+#
+# After each weekday's close (MARKET_CLOSE in MARKET_TZ, plus
+# SCHEDULE_DELAY_MINUTES for the final bars to settle) the worker downloads
+# the missing bars of every symbol (PriceStore.refresh, concurrent), then
+# publishes a new snapshot (snapshots.publish: moving averages, batched
+# predictions and forecasts). Pages read that snapshot instead of computing.
+#
+# Scheduler can also run inside another process on a daemon thread:
+#   scheduler.Scheduler().start()
+# Runs of several workers are serialized by the snapshot lock. A failed run is
+# logged and the next close is waited for; --once exits with status 1.
+import argparse
+import os
+import sys
+import threading
+import time
+import traceback
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+import snapshots
+
+MARKET_TZ = os.environ.get('MARKET_TZ', 'America/New_York')
+MARKET_CLOSE = os.environ.get('MARKET_CLOSE', '16:00')
+DELAY_MINUTES = int(os.environ.get('SCHEDULE_DELAY_MINUTES', 30))
+
+
+def next_run(now=None, close=MARKET_CLOSE, delay=DELAY_MINUTES, tz=MARKET_TZ):
+    """The next weekday close + delay after `now`, as an aware timestamp in `tz`."""
+    zone = ZoneInfo(tz)
+    now = pd.Timestamp(now).tz_convert(zone) if now is not None else pd.Timestamp.now(tz=zone)
+    hour, minute = (int(part) for part in close.split(':'))
+    # Local wall-clock time each day, so DST changes do not shift the run
+    day = now.tz_localize(None).normalize()
+    while True:
+        run = (day + pd.Timedelta(hours=hour, minutes=minute + delay)).tz_localize(zone)
+        if run > now and run.weekday() < 5:
+            return run
+        day += pd.Timedelta(days=1)
+
+
+def run_once(symbols=None, ranges=None, store=None, as_of=None, tz=MARKET_TZ):
+    """Refresh prices for every snapshot range, then publish; returns the manifest."""
+    from price_store import default_store
+    from symbols import unique_symbols
+
+    as_of = as_of or pd.Timestamp.now(tz=ZoneInfo(tz)).tz_localize(None).normalize()
+    symbols = unique_symbols(symbols) if symbols else unique_symbols()
+    ranges = ranges or snapshots.parse_ranges(as_of=as_of)
+    store = store or default_store()
+    started = time.perf_counter()
+    failed = store.refresh(symbols, min(r['start'] for r in ranges), max(r['end'] for r in ranges))
+    refreshed = time.perf_counter()
+    manifest = snapshots.publish(symbols, ranges, store, as_of=as_of)
+    print('%s: refreshed %d symbols in %.1fs (%d failed), published %s in %.1fs'
+          % (pd.Timestamp.now().isoformat(timespec='seconds'), len(symbols), refreshed - started,
+             len(failed), manifest['version'], manifest['seconds']))
+    for symbol, exc in failed.items():
+        print('  refresh failed for %s: %s' % (symbol, exc))
+    return manifest
+
+
+class Scheduler:
+    """Calls run_once() after every close until stop() is called."""
+
+    def __init__(self, symbols=None, close=MARKET_CLOSE, delay=DELAY_MINUTES, tz=MARKET_TZ):
+        self.symbols = symbols
+        self.close = close
+        self.delay = delay
+        self.tz = tz
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            when = next_run(close=self.close, delay=self.delay, tz=self.tz)
+            print('next snapshot at %s' % when.isoformat(timespec='minutes'))
+            if self._stop.wait((when - pd.Timestamp.now(tz=when.tz)).total_seconds()):
+                break
+            try:
+                run_once(self.symbols, as_of=when.tz_localize(None).normalize(), tz=self.tz)
+            except Exception:
+                traceback.print_exc()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name='snapshot-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh prices and publish snapshots after the market close.')
+    parser.add_argument('--once', action='store_true', help='run now and exit')
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--close', default=MARKET_CLOSE, help='market close, HH:MM in --tz')
+    parser.add_argument('--delay', type=int, default=DELAY_MINUTES, help='minutes after the close')
+    parser.add_argument('--tz', default=MARKET_TZ)
+    args = parser.parse_args(argv)
+
+    if args.once:
+        try:
+            run_once(args.symbols, tz=args.tz)
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return 0
+    try:
+        Scheduler(args.symbols, args.close, args.delay, args.tz).run_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Streaming next-day predictions for new daily bars
+#
+# StreamingPredictor keeps, per symbol, only what the next prediction needs:
+# the last `lookback` scaled closes and the scaling range. A new bar shifts the
+# symbol's window by one and every updated symbol is predicted in one batched
+# pass, so refreshing a watchlist costs O(symbols) and never re-reads history.
+#
+# mode='window' (default) gives exactly the prediction the app would make for
+# the latest window. mode='stateful' also keeps each recurrent layer's state
+# ((h, c) for an LSTM, h for a GRU) and advances it by the single new time step
+# (NumPy runtime only). That is O(1)
+# per bar instead of O(lookback), but after the first bar it sees an unbounded
+# history rather than a 100-day window, so its output drifts from 'window'.
+import numpy as np
+import pandas as pd
+
+from model_registry import SERVING_MODEL, get_model
+from pipeline import split_train_test
+from scaling import scaler_for
+
+
+class StreamingPredictor:
+    def __init__(self, model_path=SERVING_MODEL, lookback=100, mode='window'):
+        if mode not in ('window', 'stateful'):
+            raise ValueError("mode must be 'window' or 'stateful'")
+        self.model = get_model(model_path)
+        self.model_path = model_path
+        if mode == 'stateful' and not hasattr(self.model, 'run'):
+            raise ValueError('stateful mode needs a NumPy (.npz) model')
+        self.lookback = lookback
+        self.mode = mode
+        self.symbols = {}
+        self.windows = np.empty((0, lookback), dtype='float32')
+        self.low = np.empty(0)
+        self.span = np.empty(0)
+        self.last_dates = []
+        self.states = None  # per recurrent layer, a tuple of (symbols, units) arrays
+        self._bare = None  # per recurrent layer, whether its state is h alone (GRU)
+        self.latest = np.empty(0)
+
+    def _scale(self, rows, prices):
+        return (prices - self.low[rows]) / self.span[rows]
+
+    def _unscale(self, rows, scaled):
+        return scaled * self.span[rows] + self.low[rows]
+
+    def seed(self, closes):
+        """Start tracking symbols from their price history ({symbol: Series})."""
+        windows, lows, spans, dates, names = [], [], [], [], []
+        for symbol, close in closes.items():
+            close = pd.Series(close).dropna().astype('float64')
+            if len(close) < self.lookback:
+                continue
+            # Same scaler as pipeline.prepare: persisted, else fitted on the train slice
+            data_train, _ = split_train_test(close, lookback=self.lookback)
+            scaler = scaler_for(symbol, self.model_path, data_train.to_numpy())
+            windows.append(scaler.transform(close.to_numpy()[-self.lookback:]))
+            lows.append(float(scaler.data_min))
+            spans.append(float(scaler.span))
+            dates.append(close.index[-1])
+            names.append(symbol)
+
+        if not names:
+            return {}
+        start = len(self.symbols)
+        for offset, symbol in enumerate(names):
+            self.symbols[symbol] = start + offset
+        self.windows = np.concatenate([self.windows, np.asarray(windows, dtype='float32')])
+        self.low = np.concatenate([self.low, lows])
+        self.span = np.concatenate([self.span, spans])
+        self.last_dates.extend(dates)
+        self.latest = np.concatenate([self.latest, np.full(len(names), np.nan)])
+
+        rows = np.arange(start, len(self.symbols))
+        scaled = self._predict_rows(rows, seeding=True)
+        return dict(zip(names, self._unscale(rows, scaled)))
+
+    def _predict_rows(self, rows, seeding=False):
+        if self.mode == 'window':
+            scaled = np.asarray(self.model.predict_on_batch(self.windows[rows, :, np.newaxis]))[:, 0]
+        elif seeding:
+            scaled, states = self.model.run(self.windows[rows, :, np.newaxis])
+            self._store_states(rows, states)
+            scaled = scaled[:, 0]
+        else:
+            current = [parts[0][rows] if bare else tuple(part[rows] for part in parts)
+                       for parts, bare in zip(self.states, self._bare)]
+            scaled, states = self.model.run(self.windows[rows, -1:, np.newaxis], current)
+            self._store_states(rows, states)
+            scaled = scaled[:, 0]
+        self.latest[rows] = self._unscale(rows, scaled)
+        return scaled
+
+    def _store_states(self, rows, states):
+        if self.states is None:
+            self._bare = [not isinstance(state, tuple) for state in states]
+            self.states = [tuple(np.zeros((0, part.shape[1]), part.dtype) for part in self._parts(state))
+                           for state in states]
+        grown = []
+        for parts_all, state in zip(self.states, states):
+            layer = []
+            for part_all, part in zip(parts_all, self._parts(state)):
+                if len(part_all) < len(self.symbols):
+                    pad = len(self.symbols) - len(part_all)
+                    part_all = np.concatenate([part_all, np.zeros((pad, part_all.shape[1]), part_all.dtype)])
+                part_all[rows] = part
+                layer.append(part_all)
+            grown.append(tuple(layer))
+        self.states = grown
+
+    @staticmethod
+    def _parts(state):
+        return state if isinstance(state, tuple) else (state,)
+
+    def update(self, bars, date=None):
+        """Append one new close per symbol ({symbol: price}) and return the
+        next-day predictions for those symbols."""
+        known = [symbol for symbol in bars if symbol in self.symbols]
+        if not known:
+            return {}
+        rows = np.array([self.symbols[symbol] for symbol in known])
+        prices = np.array([bars[symbol] for symbol in known], dtype='float64')
+
+        self.windows[rows, :-1] = self.windows[rows, 1:]
+        self.windows[rows, -1] = self._scale(rows, prices)
+        if date is not None:
+            for row in rows:
+                self.last_dates[row] = pd.Timestamp(date)
+
+        self._predict_rows(rows)
+        return dict(zip(known, self.latest[rows]))
+
+    def predictions(self):
+        """Latest next-day prediction for every tracked symbol."""
+        return pd.Series({symbol: self.latest[row] for symbol, row in self.symbols.items()},
+                         name='Predicted Price')
@@ -0,0 +1,24 @@
+# Tests for forecast.forecast_future
+#
+#   python -m pytest -q test_forecast.py
+import numpy as np
+import pandas as pd
+
+from forecast import forecast_future
+
+
+class LastValue:
+    """Predicts the last value of each window."""
+
+    def predict_on_batch(self, x):
+        return x[:, -1, :]
+
+
+def test_each_series_is_dated_from_its_own_last_bar():
+    close = pd.Series(np.linspace(1, 2, 200), index=pd.bdate_range('2023-01-02', periods=200))
+    future = forecast_future({'A': close, 'B': close.iloc[:-5]}, steps=3, model=LastValue())
+
+    for name, series in (('A', close), ('B', close.iloc[:-5])):
+        dates = future[name].dropna().index
+        assert list(dates) == list(pd.bdate_range(series.index[-1] + pd.offsets.BDay(1), periods=3))
+        np.testing.assert_allclose(future[name].dropna(), series.iloc[-1])
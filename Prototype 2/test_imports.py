@@ -0,0 +1,41 @@
+# Cold-start guards: serving and the pages must not import TensorFlow
+#
+#   python -m pytest -q test_imports.py
+#
+# Each check runs in a fresh interpreter; bench_imports.py also reports timings.
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bench_imports import LAZY, import_times, report
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAGES = [page for page in ('app.py', 'Future.py') if os.path.exists(os.path.join(HERE, page))]
+
+SERVE = r'''
+import sys
+import numpy as np
+import batching, forecast, pipeline, service, streaming
+from model_registry import SERVING_MODEL, get_model
+get_model(SERVING_MODEL).predict(np.zeros((2, 100, 1), dtype='float32'))
+print(sorted(name for name in ('tensorflow', 'keras') if name in sys.modules))
+'''
+
+
+def test_serving_does_not_import_tensorflow():
+    out = subprocess.run([sys.executable, '-c', SERVE], cwd=HERE, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == '[]'
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_page_imports_stay_lazy(page):
+    framework = {name.strip() for name, _, _ in import_times('import streamlit')}
+    cwd = os.getcwd()
+    os.chdir(HERE)
+    try:
+        result = report(page, framework=framework)
+    finally:
+        os.chdir(cwd)
+    assert result['eager_lazy_modules'] == [], 'should stay lazy: %s of %s' % (result['eager_lazy_modules'], LAZY)
@@ -0,0 +1,23 @@
+# Tests for pipeline.prepare
+#
+#   python -m pytest -q test_pipeline.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import enough_history, prepare
+
+
+@pytest.mark.parametrize('rows', [115, 124, 600])
+def test_dates_label_the_targets(rows):
+    close = pd.Series(np.arange(1, rows + 1, dtype='float64'), index=pd.bdate_range('2020-01-01', periods=rows))
+    x, y, scaler, dates = prepare(close, lookback=100)
+
+    assert len(dates) == len(y) == len(x)
+    np.testing.assert_allclose(scaler.inverse(np.asarray(y, dtype='float64')), close[dates].to_numpy(), rtol=1e-6)
+
+
+@pytest.mark.parametrize('rows', [100, 101, 150, 250])
+def test_enough_history_matches_prepare(rows):
+    close = pd.Series(np.linspace(1, 2, rows), index=pd.bdate_range('2020-01-01', periods=rows))
+    assert enough_history(close, lookback=100) == (len(prepare(close, lookback=100)[0]) > 0)
@@ -0,0 +1,56 @@
+# Tests for streaming.StreamingPredictor
+#
+#   python -m pytest -q test_streaming.py
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from numpy_runtime import NumpyModel
+from streaming import StreamingPredictor
+
+LOOKBACK = 20
+
+
+def _bundle(path, recurrent, units=8, seed=0):
+    """A random export_model-style bundle: one `recurrent` layer and a Dense head."""
+    rng = np.random.default_rng(seed)
+    gates = 4 if recurrent == 'lstm' else 3
+    bias = rng.normal(0, 0.1, (gates * units,) if recurrent == 'lstm' else (2, gates * units))
+    arrays = {'layer0_0': rng.normal(0, 0.5, (1, gates * units)),
+              'layer0_1': rng.normal(0, 0.5, (units, gates * units)),
+              'layer0_2': bias,
+              'layer1_0': rng.normal(0, 0.5, (units, 1)),
+              'layer1_1': np.zeros(1)}
+    config = {'input_shape': [None, LOOKBACK, 1], 'dtype': 'float32', 'layers': [
+        {'type': recurrent, 'units': units, 'activation': 'tanh', 'recurrent_activation': 'sigmoid',
+         'return_sequences': False, 'weights': [list(arrays['layer0_%d' % k].shape) for k in range(3)]},
+        {'type': 'dense', 'units': 1, 'activation': 'linear', 'weights': [[units, 1], [1]]}]}
+    np.savez(path, config=json.dumps(config), **{k: v.astype('float32') for k, v in arrays.items()})
+    return str(path)
+
+
+def _closes(symbols, days=60):
+    rng = np.random.default_rng(1)
+    index = pd.bdate_range('2023-01-02', periods=days)
+    return {symbol: pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, days))), index=index)
+            for symbol in symbols}
+
+
+@pytest.mark.parametrize('recurrent', ['gru', 'lstm'])
+@pytest.mark.parametrize('symbols', [['AAA', 'BBB'], ['AAA', 'BBB', 'CCC']])
+def test_stateful_update_continues_the_sequence(tmp_path, recurrent, symbols):
+    path = _bundle(tmp_path / ('%s.npz' % recurrent), recurrent)
+    predictor = StreamingPredictor(path, lookback=LOOKBACK, mode='stateful')
+    predictor.seed(_closes(symbols))
+    seeded = predictor.windows.copy()
+    bars = {symbol: 101.0 + i for i, symbol in enumerate(symbols)}
+    updated = predictor.update(bars)
+
+    # One step from the stored states equals a pass over the window plus the new bar
+    rows = np.arange(len(symbols))
+    new = predictor._scale(rows, np.array(list(bars.values())))
+    x = np.concatenate([seeded, new[:, np.newaxis]], axis=1)[:, :, np.newaxis].astype('float32')
+    expected = predictor._unscale(rows, NumpyModel(path).run(x)[0][:, 0])
+    np.testing.assert_allclose([updated[symbol] for symbol in symbols], expected, rtol=1e-5)
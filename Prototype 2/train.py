@@ -0,0 +1,214 @@
+# Training pipeline extracted from Untitled.ipynb
+#
+# Trains one model per symbol or per sector in a process pool, one TensorFlow
+# thread budget per worker, checkpointing every epoch so an interrupted run
+# resumes where it stopped. Finished models are saved as .keras plus the NumPy
+# export used for serving, and recorded in models/manifest.json.
+#
+#   python train.py --per symbol --workers 4 --epochs 50
+#   python train.py --per sector --symbols AAPL MSFT GOOG
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from dataset import window_dataset
+from model_registry import MANIFEST, MODEL_DIR
+from pipeline import split_train_test
+from price_store import load_many
+from scaling import MinMax, save_scalers, scaler_path
+from symbols import SECTORS, unique_symbols
+
+
+def build_model(lookback=100, units=(50, 60, 80, 120), dropout=(0.2, 0.3, 0.4, 0.5)):
+    """The stacked LSTM from the notebook."""
+    from keras.layers import LSTM, Dense, Dropout, Input
+    from keras.models import Sequential
+
+    model = Sequential()
+    model.add(Input(shape=(lookback, 1)))
+    for i, (n_units, rate) in enumerate(zip(units, dropout)):
+        model.add(LSTM(units=n_units, activation='relu', return_sequences=i < len(units) - 1))
+        model.add(Dropout(rate))
+    model.add(Dense(units=1))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+
+def training_series(close, lookback=100, split=0.80):
+    """The training slice, scaled on that slice as in the notebook."""
+    data_train, _ = split_train_test(close, split, lookback)
+    values = np.array(data_train.iloc[:, 0], dtype='float32')
+    scaler = MinMax.fit(values)
+    return scaler.transform(values, out=values), scaler
+
+
+def make_jobs(per='symbol', symbols=None):
+    symbols = unique_symbols(symbols) if symbols else unique_symbols()
+    if per == 'symbol':
+        return [{'name': symbol, 'symbols': [symbol]} for symbol in symbols]
+    jobs = []
+    for sector, members in SECTORS.items():
+        members = [symbol for symbol in members if symbol in symbols]
+        if members:
+            jobs.append({'name': sector.replace(' ', '_'), 'symbols': members})
+    return jobs
+
+
+def _init_worker(threads):
+    # Must run before TensorFlow is imported in the worker process
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _load_series(job, start, end, lookback):
+    frames, skipped = load_many(job['symbols'], start, end)
+    series, scalers = [], {}
+    for symbol, data in frames.items():
+        if 'Close' not in data or len(data) <= 2 * lookback:
+            skipped[symbol] = 'not enough history (%d rows)' % len(data)
+            continue
+        values, scalers[symbol] = training_series(data['Close'], lookback)
+        series.append(values)
+    return series, scalers, skipped
+
+
+def train_job(job, start, end, epochs=50, batch_size=32, lookback=100, model_dir=MODEL_DIR):
+    """Train one job, resuming from its checkpoint if there is one."""
+    from keras.callbacks import Callback, ModelCheckpoint
+    from keras.models import load_model
+
+    from export_model import export
+
+    started = time.perf_counter()
+    series, scalers, skipped = _load_series(job, start, end, lookback)
+    if not series:
+        return dict(job, status='skipped', reason='no usable history', skipped=skipped)
+    # Windows are gathered lazily per batch instead of materialized up front
+    dataset = window_dataset(series, lookback, batch_size=batch_size)
+    samples = int(sum(max(len(values) - lookback, 0) for values in series))
+
+    name = job['name']
+    checkpoint = os.path.join(model_dir, name + '.ckpt.keras')
+    state_path = os.path.join(model_dir, name + '.state.json')
+    initial_epoch = 0
+    if os.path.exists(checkpoint) and os.path.exists(state_path):
+        with open(state_path) as f:
+            initial_epoch = json.load(f)['epoch']
+        model = load_model(checkpoint)
+    else:
+        model = build_model(lookback)
+
+    class SaveState(Callback):
+        # Written after ModelCheckpoint so the epoch count never runs ahead of the weights
+        def on_epoch_end(self, epoch, logs=None):
+            with open(state_path + '.tmp', 'w') as f:
+                json.dump({'epoch': epoch + 1}, f)
+            os.replace(state_path + '.tmp', state_path)
+
+    history = model.fit(dataset, epochs=epochs, initial_epoch=initial_epoch, shuffle=False,
+                        verbose=0, callbacks=[ModelCheckpoint(checkpoint), SaveState()])
+
+    model.save(os.path.join(model_dir, name + '.keras'))
+    export(model, os.path.join(model_dir, name + '.npz'))
+    # Inference reuses these instead of refitting on whatever range it is given
+    save_scalers(os.path.join(model_dir, name + '.keras'), scalers)
+    for path in (checkpoint, state_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    losses = history.history.get('loss') or [float('nan')]
+    return dict(job, status='done', keras=name + '.keras', npz=name + '.npz',
+                scalers=os.path.basename(scaler_path(name + '.keras')),
+                epochs=epochs, resumed_from=initial_epoch, loss=float(losses[-1]),
+                samples=samples, skipped=skipped,
+                # Only the symbols it was trained on; skipped ones fall back to the default model
+                symbols=list(scalers), start=str(start), end=str(end), lookback=lookback,
+                trained_at=pd.Timestamp.now().isoformat(timespec='seconds'),
+                seconds=time.perf_counter() - started)
+
+
+def read_manifest(model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'models': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def train_all(jobs, start, end, workers=None, threads_per_worker=None, epochs=50,
+              batch_size=32, lookback=100, model_dir=MODEL_DIR, force=False):
+    """Train every job in a process pool and record finished models in the manifest."""
+    os.makedirs(model_dir, exist_ok=True)
+    manifest = read_manifest(model_dir)
+    done = manifest['models']
+    pending = [job for job in jobs if force or done.get(job['name'], {}).get('epochs') != epochs]
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(pending) or 1))
+    threads = threads_per_worker or max(1, cpus // workers)
+    print('%d jobs (%d already trained), %d workers x %d threads'
+          % (len(jobs), len(jobs) - len(pending), workers, threads))
+
+    started = time.perf_counter()
+    # spawn, not fork: TensorFlow state must not be shared with the parent
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(threads,)) as pool:
+        futures = {pool.submit(train_job, job, start, end, epochs, batch_size, lookback, model_dir): job
+                   for job in pending}
+        for finished, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:
+                result = dict(job, status='failed', reason=repr(exc))
+            if result['status'] == 'done':
+                done[job['name']] = result
+                write_manifest(manifest, model_dir)
+            elapsed = time.perf_counter() - started
+            eta = elapsed / finished * (len(pending) - finished)
+            print('[%d/%d] %s %s%s | elapsed %.0fs, eta %.0fs'
+                  % (finished, len(pending), job['name'], result['status'],
+                     ' (%s)' % result['reason'] if 'reason' in result else '', elapsed, eta))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train one LSTM per symbol or per sector.')
+    parser.add_argument('--per', choices=['symbol', 'sector'], default='symbol')
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--start', default='2012-01-01')
+    parser.add_argument('--end', default='2022-12-21')
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, help='defaults to one per CPU core')
+    parser.add_argument('--threads-per-worker', type=int, help='defaults to cores / workers')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--force', action='store_true', help='retrain models already in the manifest')
+    args = parser.parse_args(argv)
+
+    train_all(make_jobs(args.per, args.symbols), args.start, args.end, args.workers,
+              args.threads_per_worker, args.epochs, args.batch_size, model_dir=args.model_dir,
+              force=args.force)
+
+
+if __name__ == '__main__':
+    main()
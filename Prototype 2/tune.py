@@ -0,0 +1,321 @@
+# Hyperparameter search for the stacked LSTM
+#
+#   python tune.py --symbols AAPL MSFT GOOG --trials 27 --workers 4
+#   python tune.py --show <study> [--query "lookback == 100 and status == 'done'"]
+#
+# Samples lookback, layer sizes and per-layer dropout, and trains the trials in
+# a process pool with asynchronous successive halving (ASHA): every trial first
+# trains for --min-epochs; whenever a trial is in the best 1/eta of those that
+# finished a rung, it is promoted and resumes from its checkpoint for eta times
+# as many epochs, up to --max-epochs. Trials that stopped early, diverged or
+# failed are never promoted and do not take the place of a live trial in that
+# ranking. Most trials therefore stop after a few epochs, and the pool never
+# waits for a whole rung to finish. Within a rung,
+# EarlyStopping on the validation loss ends trials that stopped improving.
+#
+# The training slices of all symbols are prepared once per (symbols, start,
+# end) and cached under tuning/datasets/ as a flat float32 .npy that workers
+# memory-map; windows are gathered per batch (dataset.window_dataset), so no
+# worker downloads or re-windows anything. The last --validation share of each
+# symbol's training slice is the validation set, and each symbol is scaled on
+# the rest only, as pipeline.prepare never fits on what it evaluates.
+#
+# Every finished rung adds a row to tuning/<study>/trials.parquet (trial,
+# settings, rung, epochs, train and validation loss, seconds, status), which
+# load_trials() reads back as a DataFrame for querying.
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from pipeline import split_train_test
+from price_store import load_many
+from scaling import MinMax
+from symbols import unique_symbols
+from train import _init_worker, build_model
+
+TUNE_DIR = os.environ.get('TUNE_DIR', 'tuning')
+
+LOOKBACKS = (50, 100, 150)
+UNITS = ((50,), (64, 32), (50, 60, 80), (50, 60, 80, 120), (32, 32, 32, 32))
+DROPOUT_BASE = (0.0, 0.1, 0.2, 0.3)
+DROPOUT_STEP = (0.0, 0.1)  # added per layer; the notebook is base 0.2, step 0.1
+
+
+def sample_configs(n, seed=0):
+    """`n` random settings from the search space."""
+    rng = np.random.default_rng(seed)
+    configs = []
+    for i in range(n):
+        units = UNITS[rng.integers(len(UNITS))]
+        base, step = DROPOUT_BASE[rng.integers(len(DROPOUT_BASE))], DROPOUT_STEP[rng.integers(len(DROPOUT_STEP))]
+        configs.append({'trial': 't%03d' % i, 'lookback': int(LOOKBACKS[rng.integers(len(LOOKBACKS))]),
+                        'units': list(units),
+                        'dropout': [round(min(base + step * k, 0.5), 2) for k in range(len(units))]})
+    return configs
+
+
+def rungs(min_epochs, max_epochs, eta):
+    """Epoch budgets of the rungs: min_epochs, min_epochs * eta, ... up to max_epochs."""
+    budgets = [min_epochs]
+    while budgets[-1] * eta <= max_epochs:
+        budgets.append(budgets[-1] * eta)
+    return budgets
+
+
+def cached_dataset(symbols, start, end, root=TUNE_DIR):
+    """Path of the cached training slices of `symbols`, building it on first use.
+
+    Returns (npy path, lengths): the unscaled series are stored back to back
+    in one float32 array, `lengths` gives their sizes in order. Symbols that
+    fail to download or lack history are skipped; the .json beside the array
+    lists the ones used.
+    """
+    key = hashlib.sha256(json.dumps(['raw', sorted(symbols), str(start), str(end)]).encode()).hexdigest()[:16]
+    path = os.path.join(root, 'datasets', key)
+    if os.path.exists(path + '.json'):
+        with open(path + '.json') as f:
+            return path + '.npy', json.load(f)['lengths']
+
+    frames, skipped = load_many(symbols, start, end)
+    series, names = [], []
+    for symbol, data in frames.items():
+        if 'Close' in data and len(data) > 2 * max(LOOKBACKS):
+            data_train, _ = split_train_test(data['Close'])
+            series.append(np.array(data_train.iloc[:, 0], dtype='float32'))
+            names.append(symbol)
+        else:
+            skipped[symbol] = 'not enough history (%d rows)' % len(data)
+    for symbol, reason in skipped.items():
+        print('skipped %s: %s' % (symbol, reason))
+    if not series:
+        raise ValueError('no symbol has enough history between %s and %s' % (start, end))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp.npy', 'wb') as f:
+        np.save(f, np.concatenate(series))
+    os.replace(path + '.tmp.npy', path + '.npy')
+    lengths = [len(values) for values in series]
+    with open(path + '.json', 'w') as f:
+        json.dump({'symbols': names, 'skipped': skipped, 'lengths': lengths, 'start': str(start), 'end': str(end)}, f)
+    return path + '.npy', lengths
+
+
+def split_series(buffer, lengths, lookback, validation=0.2):
+    """Scaled train and validation series per symbol; validation windows reach back `lookback` days.
+
+    Each symbol's scaler is fitted on its train part only.
+    """
+    train, valid = [], []
+    offset = 0
+    for n in lengths:
+        values = buffer[offset:offset + n]
+        cut = int(n * (1 - validation))
+        scaler = MinMax.fit(values[:cut])
+        train.append(scaler.transform(values[:cut]).astype('float32'))
+        valid.append(scaler.transform(values[cut - lookback:]).astype('float32'))
+        offset += n
+    return train, valid
+
+
+def train_trial(config, study_dir, dataset, lengths, initial_epoch, epochs, batch_size=32,
+                validation=0.2, patience=3):
+    """Train one trial from `initial_epoch` to `epochs`, resuming from its checkpoint."""
+    from keras.callbacks import EarlyStopping, TerminateOnNaN
+    from keras.models import load_model
+
+    from dataset import window_dataset
+
+    started = time.perf_counter()
+    lookback = config['lookback']
+    train, valid = split_series(np.load(dataset, mmap_mode='r'), lengths, lookback, validation)
+    checkpoint = os.path.join(study_dir, 'checkpoints', config['trial'] + '.keras')
+    if initial_epoch and os.path.exists(checkpoint):
+        model = load_model(checkpoint)
+    else:
+        model = build_model(lookback, config['units'], config['dropout'])
+
+    stopper = EarlyStopping(patience=patience, restore_best_weights=True)
+    history = model.fit(window_dataset(train, lookback, batch_size=batch_size),
+                        validation_data=window_dataset(valid, lookback, batch_size=1024, shuffle=False),
+                        epochs=epochs, initial_epoch=initial_epoch, verbose=0,
+                        callbacks=[stopper, TerminateOnNaN()])
+    os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+    model.save(checkpoint)
+
+    val_loss = np.asarray(history.history.get('val_loss') or [np.nan], dtype='float64')
+    if not np.isfinite(val_loss).all():
+        status = 'diverged'
+    else:
+        status = 'early_stopped' if stopper.stopped_epoch > 0 else 'done'
+    return dict(trial=config['trial'], epochs=initial_epoch + len(history.history['loss']),
+                loss=float(history.history['loss'][-1]),
+                val_loss=float(np.min(val_loss)) if status != 'diverged' else np.inf,
+                seconds=time.perf_counter() - started, status=status)
+
+
+class ASHA:
+    """Promotion bookkeeping for asynchronous successive halving."""
+
+    def __init__(self, configs, budgets, eta):
+        self.pending = list(configs)
+        self.configs = {config['trial']: config for config in configs}
+        self.budgets = budgets
+        self.eta = eta
+        self.results = [{} for _ in budgets]  # rung -> {trial: val_loss}
+        self.promoted = [set() for _ in budgets]
+        self.stopped = set()
+
+    def next_job(self):
+        """(config, rung) to train next, or None if nothing can start yet."""
+        # Promotions first, from the highest rung down, so good trials finish early.
+        # The best 1/eta of the rung's results are promoted, ranked among the
+        # trials still running so a stopped one does not hold a slot.
+        for rung in range(len(self.budgets) - 2, -1, -1):
+            results = self.results[rung]
+            live = sorted((item for item in results.items() if item[0] not in self.stopped),
+                          key=lambda item: item[1])
+            for trial, _ in live[:len(results) // self.eta]:
+                if trial not in self.promoted[rung]:
+                    self.promoted[rung].add(trial)
+                    return self.configs[trial], rung + 1
+        if self.pending:
+            return self.pending.pop(0), 0
+        return None
+
+    def report(self, rung, result):
+        self.results[rung][result['trial']] = result['val_loss']
+        if result['status'] != 'done':
+            self.stopped.add(result['trial'])
+
+
+def search(symbols, start, end, trials=27, min_epochs=2, max_epochs=18, eta=3, workers=None,
+           threads_per_worker=None, batch_size=32, validation=0.2, patience=3, study=None,
+           root=TUNE_DIR, seed=0):
+    """Run a search and return its trials table."""
+    dataset, lengths = cached_dataset(symbols, start, end, root)
+    study = study or pd.Timestamp.now().strftime('%Y%m%d-%H%M%S')
+    study_dir = os.path.join(root, study)
+    os.makedirs(study_dir, exist_ok=True)
+    budgets = rungs(min_epochs, max_epochs, eta)
+    scheduler = ASHA(sample_configs(trials, seed), budgets, eta)
+    with open(os.path.join(study_dir, 'study.json'), 'w') as f:
+        json.dump({'symbols': symbols, 'start': str(start), 'end': str(end), 'trials': trials,
+                   'rungs': budgets, 'eta': eta, 'batch_size': batch_size, 'validation': validation,
+                   'patience': patience, 'seed': seed, 'dataset': dataset}, f, indent=1)
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, trials))
+    threads = threads_per_worker or max(1, cpus // workers)
+    print('study %s: %d trials, rungs %s epochs, %d workers x %d threads'
+          % (study, trials, budgets, workers, threads))
+    rows, started = [], time.perf_counter()
+    # spawn, not fork: TensorFlow state must not be shared with the parent
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(threads,)) as pool:
+        running = {}
+        while True:
+            while len(running) < workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                config, rung = job
+                initial = budgets[rung - 1] if rung else 0
+                future = pool.submit(train_trial, config, study_dir, dataset, lengths, initial,
+                                     budgets[rung], batch_size, validation, patience)
+                running[future] = (config, rung)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                config, rung = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    result = dict(trial=config['trial'], epochs=0, loss=np.nan, val_loss=np.inf,
+                                  seconds=0.0, status='failed', reason=repr(exc))
+                    scheduler.stopped.add(config['trial'])
+                else:
+                    scheduler.report(rung, result)
+                rows.append(dict(result, rung=rung, lookback=config['lookback'],
+                                 units=json.dumps(config['units']), dropout=json.dumps(config['dropout'])))
+                save_trials(pd.DataFrame(rows), study_dir)
+                print('%s rung %d: %d epochs, val_loss %.6f, %.0fs, %s | elapsed %.0fs'
+                      % (config['trial'], rung, result['epochs'], result['val_loss'], result['seconds'],
+                         result['status'], time.perf_counter() - started))
+    # Checkpoints are only needed to resume promoted trials
+    shutil.rmtree(os.path.join(study_dir, 'checkpoints'), ignore_errors=True)
+    return load_trials(study, root)
+
+
+def save_trials(trials, study_dir):
+    path = os.path.join(study_dir, 'trials.parquet')
+    trials.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+
+def load_trials(study=None, root=TUNE_DIR):
+    """Trials of one study, or of every study with a `study` column."""
+    if study:
+        studies = [study]
+    else:
+        studies = sorted(name for name in os.listdir(root) if name != 'datasets') if os.path.isdir(root) else []
+    frames = []
+    for name in studies:
+        path = os.path.join(root, name, 'trials.parquet')
+        if os.path.exists(path):
+            frames.append(pd.read_parquet(path).assign(study=name))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def best(trials, top=5):
+    """Each trial's furthest rung, best validation loss first."""
+    if trials.empty:
+        return trials
+    last = trials.sort_values('epochs').groupby(['study', 'trial'], observed=True).tail(1)
+    return last.sort_values('val_loss').head(top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ASHA hyperparameter search for the LSTM.')
+    parser.add_argument('--symbols', nargs='*', help='defaults to the app symbol list')
+    parser.add_argument('--start', default='2012-01-01')
+    parser.add_argument('--end', default='2022-12-21')
+    parser.add_argument('--trials', type=int, default=27)
+    parser.add_argument('--min-epochs', type=int, default=2)
+    parser.add_argument('--max-epochs', type=int, default=18)
+    parser.add_argument('--eta', type=int, default=3, help='keep the best 1/eta of each rung')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--patience', type=int, default=3, help='early-stopping patience in epochs')
+    parser.add_argument('--workers', type=int, help='defaults to one per CPU core')
+    parser.add_argument('--threads-per-worker', type=int, help='defaults to cores / workers')
+    parser.add_argument('--study', help='study name, defaults to the start time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--show', metavar='STUDY', nargs='?', const='',
+                        help='print stored trials (of every study if no name is given) instead of searching')
+    parser.add_argument('--query', help='pandas query applied to the trials table')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.show is not None:
+        trials = load_trials(args.show or None)
+    else:
+        symbols = unique_symbols(args.symbols) if args.symbols else unique_symbols()
+        trials = search(symbols, args.start, args.end, args.trials, args.min_epochs, args.max_epochs,
+                        args.eta, args.workers, args.threads_per_worker, args.batch_size,
+                        patience=args.patience, study=args.study, seed=args.seed)
+    if args.query and not trials.empty:
+        trials = trials.query(args.query)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(best(trials, args.top))
+
+
+if __name__ == '__main__':
+    main()